@@ -1,43 +1,25 @@
 # app/agent/agent.py
 
-import os
-import importlib.util
-from langchain_core.messages import HumanMessage
+import asyncio
+import logging
+import random
+import threading
+import time
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import Runnable, RunnableConfig
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import END, START, StateGraph, MessagesState
-from langgraph.prebuilt import ToolNode
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langgraph.constants import END, START
 from app.core.config import settings
-from app.agent.tools.get_weather import get_weather
-from app.agent.tools.get_agriculture_predictions import get_agriculture_predictions
+from app.agent.deadline import DEADLINE_KEY, deadline_in, remaining_seconds, request_timeout
+from app.agent.history import HistoryManager
+from app.agent.profile import PROFILE_KEY, profile_prompt
+from app.agent.registry import tool_registry
+from app.agent.response_cache import ResponseCache
+from app.schemas.chat import UserProfile
+from app.utils.metrics import NODE_SECONDS, TokenUsageCallback
 from datetime import datetime
 
-# Ruta al directorio de herramientas
-TOOLS_DIR = os.path.join(os.path.dirname(__file__), 'tools')
-
-# Lista para almacenar las herramientas
-tools = [get_weather, get_agriculture_predictions]
-
-# Cargar dinámicamente las herramientas desde el directorio tools
-for filename in os.listdir(TOOLS_DIR):
-    if filename.endswith('.py') and not filename.startswith('__'):
-        module_name = filename[:-3]
-        module_path = os.path.join(TOOLS_DIR, filename)
-
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-
-        # Buscar todas las funciones decoradas con @tool en el módulo
-        for attr_name in dir(module):
-            attr = getattr(module, attr_name)
-            if callable(attr) and hasattr(attr, 'is_langchain_tool'):
-                tools.append(attr)
-
-# Crea el ToolNode
-tool_node = ToolNode(tools)
+logger = logging.getLogger(__name__)
 
 # Definir un prompt personalizado con personalidad para el agente
 primary_assistant_prompt = ChatPromptTemplate.from_messages(
@@ -51,7 +33,7 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
             "Siempre te aseguras de que los usuarios comprendan la información que les proporcionas, usando explicaciones simples y acompañando tus mensajes con emojis para que la experiencia sea más amigable. "
             "Además, debes resaltar las palabras clave importantes en *negrita* solo con un * al inicio y otro al final. "
             "Recuerda que los usuarios pueden no tener mucha experiencia en tecnología o ciencia, así que sé clara y ofrece recomendaciones fáciles de seguir. "
-            "\n\nCada vez que un usuario inicie una conversación, debes saludarlo cálidamente, presentarte como Don Pepe y mostrarle un menú con lo que puedes hacer."
+            "\n\nSi un usuario te saluda y todavía no ha visto el menú, salúdalo cálidamente, preséntate como Don Pepe y muéstrale un menú con lo que puedes hacer."
             "Este menú debe incluir lo siguiente:\n\n"
             "1. *Consultar el clima actual* 🌦️\n"
             "2. *Consultar predicciones de parametros meteorologicos* 📊 como:"
@@ -59,103 +41,472 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
             "- Precipitación total (mm/día) ☔\n"
             "- Velocidad del viento a 10 metros (m/s) 💨\n"
             "- Humedad relativa a 2 metros (%) 💧"
-            "\n\n🔍 *Explicaciones para los usuarios*:\n"
-            "Antes de proporcionar las predicciones es necesario que le preguntes a el usuario estas tres preguntas, obligatorio: *has pregunta por pregunta, es decir enviaras 3 mensajes distintos por cada pregunta*, espera que el usuario te conteste una por una." 
-            "\n1. que cultivos tiene o que cultivos esta interesado en cultivar."
-            "\n2. tambien pregunta cual predicción quiere consultar ('mañana', 'siguiente semana', 'siguiente mes', 'siguiente trimestre')"
+            "\n\n🔍 *Datos para las predicciones*:\n"
+            "Para una predicción se necesitan los cultivos del usuario, el periodo ('mañana', 'siguiente semana', 'siguiente mes', 'siguiente trimestre') y su ubicación. "
+            "Normalmente el menú y estas preguntas ya se hicieron antes de que te llegue el mensaje, y las herramientas ya se llamaron con las respuestas: no vuelvas a preguntarlas. "
+            "Si aun así falta alguno de estos datos, pregunta solo por el que falte, una pregunta por mensaje."
             "   *Nota: el api entiende ingles, asi que si el usuario te habla en español, dale las opciones en español pero al api se lo dices en ingles ('tomorrow','week','month', 'quarter')*"
-            "\n3. Luego de que te envien los interes es necesario que les solicites la ubicación para hacer la predicción en base a su ubicación."
+            "\nSi la *Información actual del usuario* o los *Intereses agricolas* ya incluyen los cultivos, el periodo preferido o una ubicación guardada, no vuelvas a preguntarlos y úsalos directamente: "
+            "la herramienta de predicciones usa la ubicación guardada y el periodo preferido cuando no le envías latitud, longitud o periodo, y guarda los cultivos que le envíes."
+            "\nPara analizar el efecto de una predicción sobre los cultivos usa la herramienta *score_crop_impact*: ya calcula el puntaje y los riesgos de cada cultivo. "
+            "No recalcules los riesgos; explícalos de forma breve y concreta (pocas líneas por cultivo)."
             "\nSiempre que proporciones predicciones de parametros meteorologicos*"
             "debes explicar de manera simple y con datos reales cómo estos parámetros afectan o benefician los cultivos, extiendete un poco en este analisis y razona como puede afectar o beneficiar esas predicciones a los cultivos de interes."
-            ", y al final ofrecer recomendaciones claras que los usuarios puedan seguir para cuidar sus cutivos deacuerdo al analisis. "
-            "\n\n*Información actual del usuario*:\n\n{user_info}\n"
+            ", y al final ofrecer recomendaciones claras que los usuarios puedan seguir para cuidar sus cutivos deacuerdo al analisis. ",
+        ),
+        # Lo que cambia entre turnos va después del prompt estático (y del historial) para que el
+        # proveedor pueda reutilizar el prefijo en caché (prompt caching)
+        ("system", "{summary}"),
+        ("placeholder", "{messages}"),
+        (
+            "system",
+            "*Información actual del usuario*:\n\n{user_info}\n"
             "\n\n*Intereses agricolas*:\n \n{user_interest}\n"
             "\n*Hora actual*: {time}.",
         ),
-        ("placeholder", "{messages}"),
     ]
-)#.partial(time=datetime.now())  # Proporcionar el tiempo actual
+)
+# Respuesta de respaldo cuando el modelo no logra contestar dentro del tiempo límite de la petición
+FALLBACK_REPLY = (
+    "Lo siento 🙏, en este momento estoy tardando más de lo normal en responder. "
+    "Por favor, intenta de nuevo en unos minutos. 🌾"
+)
+
 # Clase personalizada para el asistente con personalidad
 class Assistant:
-    def __init__(self, runnable: Runnable):
+    """
+    Nodo del agente. Si el modelo responde vacío o falla, reintenta hasta `max_retries`
+    veces con espera exponencial (con jitter), sin pasar el `deadline` de la petición
+    (ver `app.agent.deadline`). Si se agotan los intentos o el tiempo, responde con
+    `FALLBACK_REPLY` (marcado como `degraded` en el `response_metadata`).
+
+    El `deadline` viaja en el config de cada intento: el modelo construido por `build_agent`
+    (ver `with_deadline_timeout`) lo usa como `timeout` de la petición HTTP, así que en la
+    ruta síncrona un intento tampoco puede pasarse del tiempo que le queda a la petición.
+    """
+
+    def __init__(self, runnable: Runnable, *, max_retries: int = 2, backoff: float = 0.5):
         self.runnable = runnable
-        
-
-    def __call__(self, state: MessagesState, config: RunnableConfig):
-        while True:
-            configuration = config.get("configurable", {})
-            user_info = configuration.get("user_info", "Por favor, proporcione su nombre.")
-            user_interest = configuration.get("user_interest", "que cultivos tienes o que quieres cultivar? ")
-            time = configuration.get("time", datetime.now())
-            state = {**state, "user_info": user_info, "time": time, "user_interest": user_interest}
-            result = self.runnable.invoke(state)
-
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
-                # Si el modelo no da una respuesta adecuada, vuelve a preguntar
-                messages = state["messages"] + [("user", "Por favor, responde con una salida válida.")]
-                state = {**state, "messages": messages}
-            else:
-                break
-        return {"messages": result}
+        self.max_retries = max_retries
+        self.backoff = backoff
 
-# Configura el modelo con una temperatura ajustada para generar respuestas más creativas
-llm = ChatOpenAI(
-    model=settings.OPENAI_MODEL_NAME,
-    temperature=0.7,  # Ajusta la temperatura para respuestas más variadas y creativas
-    openai_api_key=settings.OPENAI_API_KEY
-).bind_tools(tools)
+    @staticmethod
+    def _prepare_state(state: dict, config: RunnableConfig):
+        configuration = config.get("configurable", {})
+        user_info = configuration.get("user_info", "Por favor, proporcione su nombre.")
+        user_interest = configuration.get("user_interest", "que cultivos tienes o que quieres cultivar? ")
+        time = configuration.get("time", datetime.now())
+        summary = state.get("summary")
+        summary = f"*Resumen de la conversación anterior*:\n{summary}" if summary else "Conversación nueva o sin resumen previo."
+        return {**state, "user_info": user_info, "time": time, "user_interest": user_interest, "summary": summary}
 
-# Conectar el prompt y el modelo con las herramientas
-assistant_runnable = primary_assistant_prompt | llm
+    @staticmethod
+    def _is_empty(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
+
+    @staticmethod
+    def _ask_again(state):
+        # Si el modelo no da una respuesta adecuada, vuelve a preguntar
+        messages = state["messages"] + [("user", "Por favor, responde con una salida válida.")]
+        return {**state, "messages": messages}
+
+    def _delay(self, attempt: int, config: RunnableConfig) -> float | None:
+        """
+        Espera antes del intento `attempt` (0 = primer intento), o None si ya no queda tiempo para intentarlo.
+        """
+        delay = random.uniform(0, self.backoff * 2 ** (attempt - 1)) if attempt else 0.0
+        remaining = remaining_seconds(config)
+        if remaining is not None and remaining <= delay:
+            return None
+        return delay
+
+    @staticmethod
+    def _fallback(reason: str):
+        logger.warning("El agente no pudo responder (%s); se envía la respuesta de respaldo", reason)
+        return {"messages": AIMessage(content=FALLBACK_REPLY, response_metadata={"degraded": reason})}
+
+    def __call__(self, state: dict, config: RunnableConfig):
+        state = self._prepare_state(state, config)
+        reason = "deadline"
+        for attempt in range(self.max_retries + 1):
+            delay = self._delay(attempt, config)
+            if delay is None:
+                reason = "deadline"
+                break
+            time.sleep(delay)
+            try:
+                result = self.runnable.invoke(state, config)
+            except Exception as e:
+                reason = f"error: {e}"
+                continue
+            if not self._is_empty(result):
+                return {"messages": result}
+            reason = "empty"
+            state = self._ask_again(state)
+        return self._fallback(reason)
+
+    async def acall(self, state: dict, config: RunnableConfig):
+        """
+        Versión asíncrona de `__call__`: la llamada al LLM no bloquea el event loop
+        y se cancela al llegar el `deadline`.
+        """
+        state = self._prepare_state(state, config)
+        reason = "deadline"
+        for attempt in range(self.max_retries + 1):
+            delay = self._delay(attempt, config)
+            if delay is None:
+                reason = "deadline"
+                break
+            await asyncio.sleep(delay)
+            try:
+                result = await asyncio.wait_for(self.runnable.ainvoke(state, config), remaining_seconds(config))
+            except asyncio.TimeoutError:
+                reason = "deadline"
+                break
+            except Exception as e:
+                reason = f"error: {e}"
+                continue
+            if not self._is_empty(result):
+                return {"messages": result}
+            reason = "empty"
+            state = self._ask_again(state)
+        return self._fallback(reason)
 
 # Define la función que determina si continuar o no
-def should_continue(state: MessagesState):
+def should_continue(state: dict):
     messages = state['messages']
     last_message = messages[-1]
     if last_message.tool_calls:
         return "tools"
     return END
 
-# Define la función que llama al modelo (utilizando el asistente personalizado)
-def call_model(state: MessagesState):
-    messages = state['messages']
-    assistant = Assistant(assistant_runnable)
-    response = assistant(state, config={"time": datetime.now()})
-    return response
+def timed_node(name: str, func, afunc) -> RunnableLambda:
+    """
+    Nodo del grafo que registra su duración en la métrica `chatbot_agent_node_seconds`.
+    """
+    histogram = NODE_SECONDS.labels(name)
+
+    def run(state: dict, config: RunnableConfig):
+        with histogram.time():
+            return func(state, config)
+
+    async def arun(state: dict, config: RunnableConfig):
+        with histogram.time():
+            return await afunc(state, config)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+def with_deadline_timeout(llm: Runnable, timeout: float) -> Runnable:
+    """
+    Modelo de chat que usa como `timeout` de cada petición el menor entre `timeout` y lo que le
+    queda al `deadline` de la ejecución (el cliente se reutiliza; solo cambia el límite de la petición).
+    """
+
+    def call(prompt, config: RunnableConfig):
+        return llm.invoke(prompt, config, timeout=request_timeout(timeout, config))
+
+    async def acall(prompt, config: RunnableConfig):
+        return await llm.ainvoke(prompt, config, timeout=request_timeout(timeout, config))
 
-# Define un nuevo grafo
-workflow = StateGraph(MessagesState)
+    return RunnableLambda(call, afunc=acall, name="llm")
 
-# Añade los nodos entre los que ciclaremos
-workflow.add_node("agent", call_model)
-workflow.add_node("tools", tool_node)
+def build_agent(llm: Runnable = None, summarizer: Runnable = None, checkpointer=None):
+    """
+    Construye el modelo, las herramientas y el grafo compilado del agente.
+    Las dependencias pesadas (cliente de OpenAI, LangGraph) se importan aquí y no al importar el módulo.
+    `llm` y `summarizer` permiten inyectar otros modelos (por ejemplo en pruebas).
+    """
+    from langgraph.graph import StateGraph, MessagesState
+    from app.agent.intake import Intake, route_intake
+    from app.agent.tool_executor import ParallelToolNode
 
-# Establece el punto de entrada como agente
-workflow.add_edge(START, "agent")
+    tools = tool_registry.tools()
 
-# Añade un borde condicional
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
+    # Duración y tokens de cada llamada al modelo
+    token_usage = TokenUsageCallback(settings.OPENAI_MODEL_NAME)
+
+    if llm is None or summarizer is None:
+        from langchain_openai import ChatOpenAI
+    if llm is None:
+        # Configura el modelo con una temperatura ajustada para generar respuestas más creativas
+        llm = ChatOpenAI(
+            model=settings.OPENAI_MODEL_NAME,
+            temperature=0.7,  # Ajusta la temperatura para respuestas más variadas y creativas
+            openai_api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.AGENT_LLM_TIMEOUT_SECONDS,
+            max_retries=0,  # Los reintentos los controla el Assistant, dentro del tiempo límite
+            stream_usage=settings.OPENAI_STREAM_USAGE,  # Tokens también en streaming (para TokenUsageCallback)
+            callbacks=[token_usage],
+        ).bind_tools(tools)
+        llm = with_deadline_timeout(llm, settings.AGENT_LLM_TIMEOUT_SECONDS)
+    if summarizer is None:
+        # Modelo sin herramientas para resumir los turnos antiguos
+        summarizer = ChatOpenAI(
+            model=settings.OPENAI_MODEL_NAME,
+            temperature=0,
+            max_tokens=400,
+            openai_api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.AGENT_LLM_TIMEOUT_SECONDS,
+            callbacks=[token_usage],
+        )
+    if checkpointer is None:
+        from app.db.session import SessionLocal
+        from app.agent.checkpointer import SQLCheckpointSaver
+
+        # Persiste el estado entre ejecuciones del grafo en la base de datos (con caché acotada en memoria)
+        checkpointer = SQLCheckpointSaver(
+            SessionLocal,
+            hot_threads=settings.CHECKPOINT_HOT_THREADS,
+            idle_ttl=settings.CHECKPOINT_IDLE_TTL_SECONDS,
+            keep_per_thread=settings.CHECKPOINT_KEEP_PER_THREAD,
+        )
+
+    # Conectar el prompt y el modelo con las herramientas
+    assistant = Assistant(
+        primary_assistant_prompt | llm,
+        max_retries=settings.AGENT_MAX_RETRIES,
+        backoff=settings.AGENT_RETRY_BACKOFF_SECONDS,
+    )
+
+    # Mantiene el historial dentro del presupuesto de tokens antes de cada turno del agente
+    history_manager = HistoryManager(
+        summarizer,
+        token_budget=settings.HISTORY_TOKEN_BUDGET,
+        tool_result_chars=settings.HISTORY_TOOL_RESULT_CHARS,
+    )
+
+    # Crea el nodo de herramientas: llamadas en paralelo, con tiempo límite y medición por herramienta
+    tool_node = ParallelToolNode(
+        tools,
+        default_timeout=settings.TOOL_TIMEOUT_SECONDS,
+        timeouts=settings.TOOL_TIMEOUTS,
+        max_workers=settings.TOOL_MAX_WORKERS,
+    )
+
+    # Estado del grafo: mensajes, el resumen acumulado de los turnos ya eliminados
+    # y el avance del flujo de preguntas previo a una predicción
+    class AgentState(MessagesState):
+        summary: str
+        intake: dict
+
+    # Define un nuevo grafo
+    workflow = StateGraph(AgentState)
+
+    # Añade los nodos entre los que ciclaremos
+    workflow.add_node("manage_history", timed_node("manage_history", history_manager, history_manager.acall))
+    workflow.add_node("agent", timed_node("agent", assistant, assistant.acall))
+    workflow.add_node("tools", timed_node("tools", tool_node, tool_node.acall))
+
+    # Cada turno del usuario pasa primero por el control del historial y luego al agente
+    workflow.add_edge(START, "manage_history")
+    if settings.AGENT_INTAKE_ENABLED:
+        # Menú y preguntas previas a una predicción por reglas, sin llamar al modelo
+        intake = Intake(max_retries=settings.AGENT_INTAKE_MAX_RETRIES)
+        workflow.add_node("intake", timed_node("intake", intake, intake.acall))
+        workflow.add_edge("manage_history", "intake")
+        workflow.add_conditional_edges("intake", route_intake)
+    else:
+        workflow.add_edge("manage_history", "agent")
+
+    # Añade un borde condicional
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+    )
+
+    # Añade un borde normal de tools a agent
+    workflow.add_edge("tools", 'agent')
+
+    # Compila el grafo
+    return workflow.compile(checkpointer=checkpointer)
+
+_agent_app = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    """
+    Grafo compilado del agente. Se construye una sola vez, en el arranque (lifespan)
+    o la primera vez que se usa.
+    """
+    global _agent_app
+    if _agent_app is None:
+        with _agent_lock:
+            if _agent_app is None:
+                _agent_app = build_agent()
+    return _agent_app
+
+def set_agent(agent_app):
+    """
+    Reemplaza el grafo del agente (por ejemplo, uno construido con `build_agent` y modelos falsos).
+    """
+    global _agent_app
+    _agent_app = agent_app
+
+# Limita cuántas ejecuciones del agente corren a la vez dentro del proceso
+agent_semaphore = asyncio.Semaphore(settings.AGENT_MAX_CONCURRENCY)
+
+def _run_config(thread_id: str = None, deadline: float = None, profile: UserProfile = None):
+    # La hora se redondea al minuto para no variar el prompt en cada llamada
+    # El deadline (reloj monotónico) acota toda la ejecución: agente, reintentos y herramientas
+    if deadline is None:
+        deadline = deadline_in(settings.AGENT_REPLY_DEADLINE_SECONDS)
+    user_info, user_interest = profile_prompt(profile)
+    return {"configurable": {"thread_id": thread_id, "user_info": user_info, "user_interest": user_interest, "time": datetime.now().strftime("%Y-%m-%d %H:%M"), DEADLINE_KEY: deadline, PROFILE_KEY: profile}}
+
+async def _acquire_slot(config: dict) -> bool:
+    """
+    Espera un cupo del agente sin pasar el deadline de la petición. Retorna False si no lo obtuvo a tiempo.
+    """
+    try:
+        await asyncio.wait_for(agent_semaphore.acquire(), remaining_seconds(config))
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+# Respuestas ya generadas para turnos repetidos (saludo, menú, elección del periodo) sin llamar al LLM
+response_cache = ResponseCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    max_messages=settings.RESPONSE_CACHE_MAX_MESSAGES,
 )
 
-# Añade un borde normal de tools a agent
-workflow.add_edge("tools", 'agent')
+def _cached_turn(input_message: str, response: str):
+    # El turno se registra como si lo hubiera respondido el nodo "agent" (sin herramientas -> END)
+    return {"messages": [HumanMessage(content=input_message), AIMessage(content=response)]}
 
-# Inicializa la memoria para persistir el estado entre ejecuciones del grafo
-checkpointer = MemorySaver()
+def _cache_key(input_message: str, state: dict, config: dict):
+    # El perfil cambia el prompt: usuarios con distinto perfil no comparten respuestas
+    configurable = config["configurable"]
+    return response_cache.key_for(input_message, state, context=f'{configurable["user_info"]}\x1f{configurable["user_interest"]}')
 
-# Compila el grafo
-agent_app = workflow.compile(checkpointer=checkpointer)
+def _new_messages(state: dict, final_state: dict):
+    return final_state["messages"][len(state.get("messages", [])):]
 
 # Función para procesar mensajes
-def process_message(input_message: str, thread_id: str = None):
+def process_message(input_message: str, thread_id: str = None, deadline: float = None, profile: UserProfile = None):
+    agent_app = get_agent()
+    config = _run_config(thread_id, deadline, profile)
+    state = agent_app.get_state(config).values
+    key = _cache_key(input_message, state, config)
+    cached = response_cache.get(key)
+    if cached is not None:
+        agent_app.update_state(config, _cached_turn(input_message, cached), as_node="agent")
+        return cached
+
     final_state = agent_app.invoke(
         {"messages": [HumanMessage(content=input_message)]},
-        config={"configurable": {"thread_id": thread_id, "user_info": "Campesino", "user_interest": " ", "time": datetime.now()}},
+        config=config,
+        durability=settings.CHECKPOINT_DURABILITY,
     )
-    return final_state["messages"][-1].content
\ No newline at end of file
+    response_cache.store(key, _new_messages(state, final_state))
+    return final_state["messages"][-1].content
+
+# Versión asíncrona para los canales (WhatsApp): no bloquea el event loop de uvicorn
+async def aprocess_message(input_message: str, thread_id: str = None, deadline: float = None, profile: UserProfile = None):
+    agent_app = get_agent()
+    config = _run_config(thread_id, deadline, profile)
+    state = (await agent_app.aget_state(config)).values
+    key = _cache_key(input_message, state, config)
+    cached = response_cache.get(key)
+    if cached is not None:
+        await agent_app.aupdate_state(config, _cached_turn(input_message, cached), as_node="agent")
+        return cached
+
+    if not await _acquire_slot(config):
+        return FALLBACK_REPLY
+    try:
+        final_state = await agent_app.ainvoke(
+            {"messages": [HumanMessage(content=input_message)]},
+            config=config,
+            durability=settings.CHECKPOINT_DURABILITY,
+        )
+    finally:
+        agent_semaphore.release()
+    response_cache.store(key, _new_messages(state, final_state))
+    return final_state["messages"][-1].content
+
+# Versión en streaming: emite eventos a medida que el grafo avanza
+async def astream_message(input_message: str, thread_id: str = None, deadline: float = None, profile: UserProfile = None):
+    """
+    Ejecuta el agente y produce tuplas (evento, datos):
+    - ("token", texto): fragmento de la respuesta del modelo.
+    - ("tool_start", {"name", "args"}): el modelo pidió ejecutar una herramienta.
+    - ("tool_end", {"name", "status", "elapsed_ms"}): la herramienta terminó.
+    - ("done", respuesta): respuesta final completa.
+    """
+    agent_app = get_agent()
+    config = _run_config(thread_id, deadline, profile)
+    state = (await agent_app.aget_state(config)).values
+    key = _cache_key(input_message, state, config)
+    cached = response_cache.get(key)
+    if cached is not None:
+        await agent_app.aupdate_state(config, _cached_turn(input_message, cached), as_node="agent")
+        yield "token", cached
+        yield "done", cached
+        return
+
+    if not await _acquire_slot(config):
+        yield "token", FALLBACK_REPLY
+        yield "done", FALLBACK_REPLY
+        return
+
+    final_response = ""
+    cacheable = True
+    streamed = False  # Ya se enviaron tokens del modelo para la respuesta en curso
+    try:
+        async for mode, chunk in agent_app.astream(
+            {"messages": [HumanMessage(content=input_message)]},
+            config=config,
+            durability=settings.CHECKPOINT_DURABILITY,
+            stream_mode=["messages", "updates"],
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "agent" and isinstance(message, AIMessageChunk) and message.content:
+                    streamed = True
+                    yield "token", message.content
+                continue
+
+            for node, update in chunk.items():
+                messages = (update or {}).get("messages", [])
+                if not isinstance(messages, list):
+                    messages = [messages]
+                for message in messages:
+                    if node == "intake":
+                        # Respuestas por reglas: no pasan por el modelo ni se guardan en la caché
+                        cacheable = False
+                        if message.tool_calls:
+                            for call in message.tool_calls:
+                                yield "tool_start", {"name": call["name"], "args": call["args"]}
+                        else:
+                            final_response = message.content
+                            yield "token", message.content
+                    elif node == "agent" and message.tool_calls:
+                        cacheable = False
+                        streamed = False
+                        for call in message.tool_calls:
+                            yield "tool_start", {"name": call["name"], "args": call["args"]}
+                    elif node == "agent":
+                        final_response = message.content
+                        degraded = message.response_metadata.get("degraded")
+                        cacheable = cacheable and not degraded
+                        # La respuesta de respaldo no sale del modelo: enviarla como token
+                        if degraded or not streamed:
+                            yield "token", message.content
+                    elif node == "tools":
+                        yield "tool_end", {
+                            "name": message.name,
+                            "status": message.status,
+                            "elapsed_ms": message.response_metadata.get("elapsed_ms"),
+                        }
+    finally:
+        agent_semaphore.release()
+    if cacheable and final_response:
+        response_cache.store(key, [HumanMessage(content=input_message), AIMessage(content=final_response)])
+    yield "done", final_response
@@ -0,0 +1,382 @@
+# app/agent/checkpointer.py
+
+import asyncio
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Iterator, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+
+from app.models.checkpoint import AgentCheckpoint, AgentCheckpointWrite
+from app.utils.cache import TTLCache
+
+# Los blobs más grandes que este umbral se comprimen con zlib
+COMPRESS_THRESHOLD = 1024
+ZLIB_SUFFIX = "+zlib"
+
+# Dialectos con INSERT ... ON CONFLICT (las escrituras de una tarea se guardan en una sola sentencia)
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class SQLCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpointer de LangGraph que persiste el estado de las conversaciones en la base de datos.
+
+    - Los checkpoints se guardan serializados con msgpack (y zlib si son grandes).
+    - Solo se conservan los `keep_per_thread` checkpoints más recientes de cada hilo.
+    - El último checkpoint de los hilos activos se mantiene en una caché en memoria
+      acotada (LRU) que expulsa los hilos inactivos después de `idle_ttl` segundos.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        *,
+        hot_threads: int = 1000,
+        idle_ttl: float = 1800,
+        keep_per_thread: int = 3,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.session_factory = session_factory
+        self.keep_per_thread = max(keep_per_thread, 1)
+        # thread_id -> {checkpoint_ns: entrada serializada del último checkpoint}
+        self._hot = TTLCache(maxsize=hot_threads, ttl=idle_ttl, sliding=True)
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    # -- Serialización ---------------------------------------------------
+
+    def _dumps(self, obj) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) > COMPRESS_THRESHOLD:
+            return type_ + ZLIB_SUFFIX, zlib.compress(data)
+        return type_, data
+
+    def _loads(self, typed: tuple[str, bytes]):
+        type_, data = typed
+        if type_.endswith(ZLIB_SUFFIX):
+            type_, data = type_[: -len(ZLIB_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # -- Caché en memoria ------------------------------------------------
+
+    def _hot_entry(self, thread_id: str, checkpoint_ns: str):
+        namespaces = self._hot.get(thread_id)
+        return namespaces.get(checkpoint_ns) if namespaces else None
+
+    def _set_hot_entry(self, thread_id: str, checkpoint_ns: str, entry: dict):
+        with self._lock:
+            namespaces = self._hot.get(thread_id) or {}
+            namespaces[checkpoint_ns] = entry
+            self._hot.set(thread_id, namespaces)
+
+    def invalidate(self, thread_id: str):
+        """
+        Descarta el estado en memoria del hilo: la próxima lectura va a la base de datos.
+        Se usa cuando otro proceso pudo haber escrito checkpoints más recientes.
+        """
+        self._hot.pop(thread_id)
+
+    def _sweep_idle(self):
+        # Libera periódicamente la memoria de los hilos inactivos
+        now = time.monotonic()
+        if now - self._last_sweep > 60:
+            self._last_sweep = now
+            self._hot.expire()
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, entry: dict) -> CheckpointTuple:
+        writes = sorted(entry["writes"].values(), key=lambda w: writes_sort_key(w[4], w[0], w[1]))
+        parent_id = entry["parent_checkpoint_id"]
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": entry["checkpoint_id"],
+                }
+            },
+            checkpoint=self._loads(entry["checkpoint"]),
+            metadata=self._loads(entry["metadata"]),
+            pending_writes=[(task_id, channel, self._loads(value)) for task_id, _, channel, value, _ in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+        )
+
+    # -- Acceso a la base de datos ---------------------------------------
+
+    def _load_entry(self, db, row: AgentCheckpoint) -> dict:
+        writes = db.execute(
+            select(AgentCheckpointWrite).where(
+                AgentCheckpointWrite.thread_id == row.thread_id,
+                AgentCheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                AgentCheckpointWrite.checkpoint_id == row.checkpoint_id,
+            )
+        ).scalars()
+        return {
+            "checkpoint_id": row.checkpoint_id,
+            "parent_checkpoint_id": row.parent_checkpoint_id,
+            "checkpoint": (row.type, row.checkpoint),
+            "metadata": (row.metadata_type, row.metadata_),
+            "writes": {
+                (w.task_id, w.idx): (w.task_id, w.idx, w.channel, (w.type, w.value), w.task_path or "")
+                for w in writes
+            },
+        }
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        entry = self._hot_entry(thread_id, checkpoint_ns)
+        if entry and (checkpoint_id is None or checkpoint_id == entry["checkpoint_id"]):
+            return self._to_tuple(thread_id, checkpoint_ns, entry)
+
+        with self.session_factory() as db:
+            query = select(AgentCheckpoint).where(
+                AgentCheckpoint.thread_id == thread_id,
+                AgentCheckpoint.checkpoint_ns == checkpoint_ns,
+            )
+            if checkpoint_id:
+                query = query.where(AgentCheckpoint.checkpoint_id == checkpoint_id)
+            else:
+                query = query.order_by(AgentCheckpoint.checkpoint_id.desc()).limit(1)
+            row = db.execute(query).scalars().first()
+            if row is None:
+                return None
+            entry = self._load_entry(db, row)
+
+        if checkpoint_id is None:
+            self._set_hot_entry(thread_id, checkpoint_ns, entry)
+        return self._to_tuple(thread_id, checkpoint_ns, entry)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = select(AgentCheckpoint).order_by(AgentCheckpoint.checkpoint_id.desc())
+        if config:
+            query = query.where(AgentCheckpoint.thread_id == config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query = query.where(AgentCheckpoint.checkpoint_ns == checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(AgentCheckpoint.checkpoint_id == checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query = query.where(AgentCheckpoint.checkpoint_id < before_id)
+
+        with self.session_factory() as db:
+            results = []
+            for row in db.execute(query).scalars():
+                if filter:
+                    metadata = self._loads((row.metadata_type, row.metadata_))
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                if limit is not None and len(results) >= limit:
+                    break
+                results.append((row.thread_id, row.checkpoint_ns, self._load_entry(db, row)))
+
+        for thread_id, checkpoint_ns, entry in results:
+            yield self._to_tuple(thread_id, checkpoint_ns, entry)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        entry = {
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "checkpoint": self._dumps(checkpoint),
+            "metadata": self._dumps(get_checkpoint_metadata(config, metadata)),
+            "writes": {},
+        }
+
+        with self.session_factory() as db:
+            db.merge(
+                AgentCheckpoint(
+                    thread_id=thread_id,
+                    checkpoint_ns=checkpoint_ns,
+                    checkpoint_id=entry["checkpoint_id"],
+                    parent_checkpoint_id=entry["parent_checkpoint_id"],
+                    type=entry["checkpoint"][0],
+                    checkpoint=entry["checkpoint"][1],
+                    metadata_type=entry["metadata"][0],
+                    metadata_=entry["metadata"][1],
+                )
+            )
+            self._prune(db, thread_id, checkpoint_ns)
+            db.commit()
+
+        self._set_hot_entry(thread_id, checkpoint_ns, entry)
+        self._sweep_idle()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _prune(self, db, thread_id: str, checkpoint_ns: str):
+        """
+        Borra los checkpoints (y sus escrituras) más antiguos que los `keep_per_thread` más recientes.
+        """
+        db.flush()
+        cutoff = (
+            select(AgentCheckpoint.checkpoint_id)
+            .where(AgentCheckpoint.thread_id == thread_id, AgentCheckpoint.checkpoint_ns == checkpoint_ns)
+            .order_by(AgentCheckpoint.checkpoint_id.desc())
+            .offset(self.keep_per_thread - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        for model in (AgentCheckpointWrite, AgentCheckpoint):
+            db.execute(
+                delete(model).where(
+                    model.thread_id == thread_id,
+                    model.checkpoint_ns == checkpoint_ns,
+                    model.checkpoint_id < cutoff,
+                )
+            )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            rows.append((task_id, WRITES_IDX_MAP.get(channel, idx), channel, self._dumps(value), task_path))
+
+        # Igual que en la base de datos: las escrituras especiales reemplazan, las normales no
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        values = [
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+                "task_id": task_id_,
+                "idx": idx,
+                "channel": channel,
+                "type": type_,
+                "value": data,
+                "task_path": path,
+            }
+            for task_id_, idx, channel, (type_, data), path in rows
+        ]
+        with self.session_factory() as db:
+            upsert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+            if upsert is None:
+                for row in values:
+                    db.merge(AgentCheckpointWrite(**row))
+            elif values:
+                stmt = upsert(AgentCheckpointWrite).values(values)
+                keys = ["thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx"]
+                if replace:
+                    # Escrituras especiales (errores, interrupciones): la última reemplaza a la anterior
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=keys,
+                        set_={column: stmt.excluded[column] for column in ("channel", "type", "value", "task_path")},
+                    )
+                else:
+                    # Escrituras normales de una tarea: se guardan una sola vez
+                    stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+                db.execute(stmt)
+            db.commit()
+
+        with self._lock:
+            entry = self._hot_entry(thread_id, checkpoint_ns)
+            if entry and entry["checkpoint_id"] == checkpoint_id:
+                for row in rows:
+                    if replace:
+                        entry["writes"][(row[0], row[1])] = row
+                    else:
+                        entry["writes"].setdefault((row[0], row[1]), row)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.session_factory() as db:
+            for model in (AgentCheckpointWrite, AgentCheckpoint):
+                db.execute(delete(model).where(model.thread_id == thread_id))
+            db.commit()
+        self._hot.pop(thread_id)
+
+    # -- Versiones asíncronas --------------------------------------------
+    # Las lecturas en caché se resuelven sin salir del event loop; el resto
+    # de operaciones de base de datos se ejecutan en un hilo aparte.
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        entry = self._hot_entry(thread_id, checkpoint_ns)
+        if entry and (checkpoint_id is None or checkpoint_id == entry["checkpoint_id"]):
+            return self._to_tuple(thread_id, checkpoint_ns, entry)
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
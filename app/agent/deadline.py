@@ -0,0 +1,47 @@
+# app/agent/deadline.py
+
+import time
+
+from langchain_core.runnables import RunnableConfig
+
+DEADLINE_KEY = "deadline"
+
+
+def deadline_in(seconds: float) -> float:
+    """
+    Instante límite (reloj monotónico del proceso) para una petición que empieza ahora.
+    """
+    return time.monotonic() + seconds
+
+
+def remaining_seconds(config: RunnableConfig | None) -> float | None:
+    """
+    Segundos que le quedan a la petición según el `deadline` de `configurable`,
+    o None si la ejecución no tiene límite.
+    """
+    deadline = ((config or {}).get("configurable") or {}).get(DEADLINE_KEY)
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def bounded(timeout: float | None, config: RunnableConfig | None) -> float | None:
+    """
+    El menor entre `timeout` y el tiempo restante de la petición.
+    """
+    remaining = remaining_seconds(config)
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+# requests y httpx no aceptan un timeout de 0
+MIN_REQUEST_TIMEOUT = 0.1
+
+
+def request_timeout(timeout: float, config: RunnableConfig | None) -> float:
+    """
+    Timeout de una petición HTTP dentro de una herramienta: `timeout` acotado por el tiempo
+    que le queda a la llamada (el nodo de herramientas pone el límite de cada una en `deadline`).
+    """
+    return max(bounded(timeout, config), MIN_REQUEST_TIMEOUT)
@@ -0,0 +1,147 @@
+# app/agent/history.py
+
+import asyncio
+import re
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+
+from app.agent.deadline import remaining_seconds
+
+SUMMARY_PROMPT = (
+    "Resume la siguiente conversación entre un agricultor y Don Pepe en máximo 8 viñetas cortas. "
+    "Conserva solo hechos útiles para continuar: nombre, cultivos, ubicación (latitud/longitud), "
+    "periodo de predicción elegido, predicciones ya entregadas (valores clave) y recomendaciones dadas. "
+    "Responde en el idioma de la conversación."
+)
+
+
+def compact_tool_content(content: str, max_chars: int) -> str:
+    """
+    Reduce el resultado de una herramienta a hechos cortos: una línea por dato,
+    sin adornos markdown ni emojis.
+    """
+    lines = []
+    for line in str(content).splitlines():
+        line = re.sub(r"[*_`]|[^\w\s.,:;%°/()\-+]", "", line).strip(" -")
+        if line:
+            lines.append(line)
+    facts = "; ".join(lines)
+    return facts if len(facts) <= max_chars else facts[: max_chars - 1] + "…"
+
+
+class HistoryManager:
+    """
+    Nodo que mantiene el historial de la conversación dentro de un presupuesto de tokens
+    antes de cada turno del agente:
+
+    1. Compacta los resultados de herramientas de turnos anteriores en hechos cortos.
+    2. Si el historial sigue superando `token_budget`, resume los turnos más antiguos
+       (acumulando en `summary`) y los elimina del estado, dejando el historial en
+       `target_ratio * token_budget` para no resumir en cada turno.
+    """
+
+    def __init__(self, summarizer: BaseChatModel, *, token_budget: int, tool_result_chars: int = 300, target_ratio: float = 0.6):
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.tool_result_chars = tool_result_chars
+        self.target_ratio = target_ratio
+
+    @staticmethod
+    def _last_turn_start(messages: list) -> int:
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], HumanMessage):
+                return i
+        return 0
+
+    def _compact(self, messages: list) -> tuple[list, list]:
+        """
+        Retorna (mensajes compactados, actualizaciones para el estado).
+        """
+        current_turn = self._last_turn_start(messages)
+        compacted, updates = [], []
+        for i, message in enumerate(messages):
+            if (
+                i < current_turn
+                and isinstance(message, ToolMessage)
+                and len(str(message.content)) > self.tool_result_chars
+            ):
+                # Mismo id: el reducer de mensajes reemplaza el original en el estado
+                message = message.model_copy(update={"content": compact_tool_content(message.content, self.tool_result_chars)})
+                updates.append(message)
+            compacted.append(message)
+        return compacted, updates
+
+    def _split_point(self, messages: list) -> int:
+        """
+        Índice desde el cual se conservan los mensajes: siempre al inicio de un turno del
+        usuario (para no separar una llamada a herramienta de su resultado) y nunca después
+        del turno actual.
+        """
+        target = self.token_budget * self.target_ratio
+        current_turn = self._last_turn_start(messages)
+        for i, message in enumerate(messages):
+            if i >= current_turn:
+                return current_turn
+            if isinstance(message, HumanMessage) and i > 0 and count_tokens_approximately(messages[i:]) <= target:
+                return i
+        return current_turn
+
+    def _summary_request(self, summary: str, old_messages: list) -> list:
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in old_messages if m.content)
+        previous = f"Resumen previo:\n{summary}\n\n" if summary else ""
+        return [SystemMessage(SUMMARY_PROMPT), HumanMessage(f"{previous}Conversación:\n{transcript}")]
+
+    def _plan(self, state: dict):
+        messages, updates = self._compact(state["messages"])
+        if count_tokens_approximately(messages) <= self.token_budget:
+            return updates, None
+        split = self._split_point(messages)
+        return updates, (messages[:split] if split > 0 else None)
+
+    def _result(self, updates: list, old_messages: list | None, summary: str | None) -> dict:
+        result = {}
+        if old_messages:
+            removed = {m.id for m in old_messages}
+            updates = [m for m in updates if m.id not in removed]
+            updates += [RemoveMessage(id=m.id) for m in old_messages]
+            result["summary"] = summary
+        if updates:
+            result["messages"] = updates
+        return result
+
+    def _fallback_summary(self, summary: str, old_messages: list) -> str:
+        # Si el modelo de resumen falla, se conserva un extracto de los turnos eliminados
+        transcript = "; ".join(f"{m.type}: {m.content}" for m in old_messages if m.content)
+        return "\n".join(filter(None, [summary, compact_tool_content(transcript, self.tool_result_chars * 4)]))
+
+    def __call__(self, state: dict, config: RunnableConfig):
+        updates, old_messages = self._plan(state)
+        summary = None
+        if old_messages:
+            previous = state.get("summary", "")
+            try:
+                if remaining_seconds(config) == 0:
+                    raise TimeoutError("Sin tiempo para resumir")
+                summary = self.summarizer.invoke(self._summary_request(previous, old_messages), config).content
+            except Exception:
+                summary = self._fallback_summary(previous, old_messages)
+        return self._result(updates, old_messages, summary)
+
+    async def acall(self, state: dict, config: RunnableConfig):
+        updates, old_messages = self._plan(state)
+        summary = None
+        if old_messages:
+            previous = state.get("summary", "")
+            try:
+                # El resumen no puede consumir el tiempo de respuesta más allá del deadline
+                response = await asyncio.wait_for(
+                    self.summarizer.ainvoke(self._summary_request(previous, old_messages), config),
+                    remaining_seconds(config),
+                )
+                summary = response.content
+            except Exception:
+                summary = self._fallback_summary(previous, old_messages)
+        return self._result(updates, old_messages, summary)
@@ -0,0 +1,307 @@
+# app/agent/intake.py
+
+import re
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.constants import END
+
+from app.agent.profile import profile_from
+from app.agent.response_cache import normalize_text
+from app.services.crop_scoring import parse_crops
+from app.services.gazetteer import gazetteer
+
+# Palabras (texto normalizado) -> periodo que entiende el API de predicciones
+PERIOD_KEYWORDS = {
+    "manana": "tomorrow", "tomorrow": "tomorrow", "diaria": "tomorrow", "diario": "tomorrow", "daily": "tomorrow",
+    "semana": "week", "semanal": "week", "week": "week", "weekly": "week",
+    "mes": "month", "mensual": "month", "month": "month", "monthly": "month",
+    "trimestre": "quarter", "trimestral": "quarter", "quarter": "quarter", "quarterly": "quarter",
+}
+# Opciones numeradas de la pregunta del periodo
+PERIOD_OPTIONS = {"1": "tomorrow", "2": "week", "3": "month", "4": "quarter"}
+
+GREETINGS = {"hola", "holi", "buenas", "buenos dias", "buenas tardes", "buenas noches", "hi", "hello", "hey", "good morning", "menu", "inicio", "start", "empezar"}
+WEATHER_WORDS = {"clima", "tiempo", "weather"}
+PREDICTION_WORDS = {"prediccion", "predicciones", "pronostico", "prediction", "predictions", "forecast"}
+ENGLISH_WORDS = {
+    "hi", "hello", "hey", "weather", "forecast", "prediction", "predictions", "tomorrow", "week", "month", "quarter",
+    "the", "i", "my", "have", "grow", "want", "what", "how", "for", "and", "in", "next", "crops", "please", "good", "morning",
+}
+
+WEATHER_CITY_RE = re.compile(r"\b(?:clima|weather)\b.*?\b(?:en|de|in|for|at)\s+([^\W\d_][\w .'-]*)", re.IGNORECASE)
+COORDINATE_RE = re.compile(r"-?\d{1,3}[.,]\d+")
+
+# Mensajes con pregunta o de más de estas palabras se dejan al modelo
+MAX_INTAKE_WORDS = 12
+
+MESSAGES = {
+    "es": {
+        "menu": (
+            "¡Hola! 👋 Soy *Don Pepe*, campesino y científico experto en agricultura 🌾. Puedo ayudarte con:\n\n"
+            "1. *Consultar el clima actual* 🌦️\n"
+            "2. *Consultar predicciones de parametros meteorologicos* 📊 como:\n"
+            "- Temperatura a 2 metros (°C) 🌡️\n"
+            "- Precipitación total (mm/día) ☔\n"
+            "- Velocidad del viento a 10 metros (m/s) 💨\n"
+            "- Humedad relativa a 2 metros (%) 💧\n\n"
+            "Respóndeme con el *número* de la opción 😊"
+        ),
+        "weather_city": "🌦️ ¿De qué *ciudad* quieres consultar el clima?",
+        "crops": "🌱 ¿Qué *cultivos* tienes o te gustaría cultivar?",
+        "period": (
+            "📅 ¿Qué predicción quieres consultar?\n"
+            "1. *Mañana*\n2. *Siguiente semana*\n3. *Siguiente mes*\n4. *Siguiente trimestre*"
+        ),
+        "location": (
+            "📍 Por favor, compárteme tu *ubicación* (📎 → Ubicación en WhatsApp) "
+            "o escríbeme tu latitud y longitud, por ejemplo: *4.60, -74.08*"
+        ),
+        "retry": "No te entendí bien 🤔. ",
+    },
+    "en": {
+        "menu": (
+            "Hi! 👋 I'm *Don Pepe*, a farmer and agricultural scientist 🌾. I can help you with:\n\n"
+            "1. *Current weather* 🌦️\n"
+            "2. *Weather parameter predictions* 📊 such as:\n"
+            "- Temperature at 2 meters (°C) 🌡️\n"
+            "- Total precipitation (mm/day) ☔\n"
+            "- Wind speed at 10 meters (m/s) 💨\n"
+            "- Relative humidity at 2 meters (%) 💧\n\n"
+            "Reply with the option *number* 😊"
+        ),
+        "weather_city": "🌦️ Which *city* would you like the weather for?",
+        "crops": "🌱 Which *crops* do you grow or would like to grow?",
+        "period": (
+            "📅 Which prediction would you like?\n"
+            "1. *Tomorrow*\n2. *Next week*\n3. *Next month*\n4. *Next quarter*"
+        ),
+        "location": (
+            "📍 Please share your *location* (📎 → Location in WhatsApp) "
+            "or type your latitude and longitude, for example: *4.60, -74.08*"
+        ),
+        "retry": "Sorry, I didn't quite get that 🤔. ",
+    },
+}
+
+
+def detect_language(text: str) -> str:
+    """
+    "en" si el mensaje (normalizado) parece estar en inglés, "es" en otro caso.
+    """
+    words = text.split()
+    english = sum(word in ENGLISH_WORDS for word in words)
+    return "en" if english and english * 2 >= len(words) else "es"
+
+
+def is_greeting(text: str) -> bool:
+    return text in GREETINGS or " ".join(text.split()[:2]) in GREETINGS and len(text.split()) <= 3
+
+
+def parse_period(text: str) -> str | None:
+    """
+    Periodo de predicción mencionado en el mensaje normalizado ("para la próxima semana" -> "week").
+    """
+    words = text.split()
+    if "3 meses" in text or "tres meses" in text or "3 months" in text or "three months" in text:
+        return "quarter"
+    for word in words:
+        if word in PERIOD_KEYWORDS:
+            return PERIOD_KEYWORDS[word]
+    return None
+
+
+def parse_free_crops(raw_text: str) -> list[str]:
+    """
+    Cultivos escritos libremente ("lulo, gulupa y chontaduro"): cada elemento de la lista del usuario.
+    """
+    items = re.split(r",|;|\by\b|\band\b|\be\b", raw_text.lower())
+    crops = []
+    for item in items:
+        item = re.sub(r"[^\w\s]|\d", "", item).strip()
+        item = re.sub(r"^(tengo|cultivo|siembro|i grow|i have|grow)\s+", "", item)
+        if item and len(item.split()) <= 3 and item not in crops:
+            crops.append(item)
+    return crops[:5]
+
+
+def parse_location(raw_text: str) -> tuple[float, float] | None:
+    """
+    Latitud y longitud escritas en el mensaje ("4.60, -74.08" o el texto de una ubicación de WhatsApp).
+    """
+    numbers = [float(n.replace(",", ".")) for n in COORDINATE_RE.findall(raw_text)]
+    if len(numbers) >= 2 and -90 <= numbers[0] <= 90 and -180 <= numbers[1] <= 180:
+        return numbers[0], numbers[1]
+    return None
+
+
+def parse_weather_city(raw_text: str) -> str | None:
+    """
+    Ciudad de un pedido del clima ("¿Cómo está el clima en Bogotá?" -> "Bogotá").
+    """
+    if match := WEATHER_CITY_RE.search(raw_text):
+        city = match.group(1).strip(" ?!.¿¡").strip()
+        # "el clima de la región ..." no es una ciudad
+        if city and len(city.split()) <= 3 and city.split()[0].lower() not in {"la", "el", "mi", "mis", "my", "the", "this", "esta", "este"}:
+            return city
+    return None
+
+
+class Intake:
+    """
+    Nodo de reglas delante del modelo para el menú y las preguntas previas a una predicción
+    (cultivos, periodo y ubicación), en español e inglés.
+
+    - Saludos -> menú. Opción 1 / "clima en <ciudad>" -> `get_weather` (la ciudad respondida a la
+      pregunta debe ser un municipio del índice local; si no, el mensaje pasa al modelo).
+      Opción 2 / "predicción" -> preguntas que falten según el perfil del usuario.
+    - Con los cuatro datos arma directamente las llamadas a `get_agriculture_predictions`
+      y `score_crop_impact`: el modelo solo interviene para redactar el análisis final.
+    - Preguntas abiertas, mensajes largos o respuestas que no entiende tras `max_retries`
+      intentos pasan al modelo sin cambios.
+
+    El progreso se guarda en el campo `intake` del estado del grafo.
+    """
+
+    def __init__(self, max_retries: int = 1):
+        self.max_retries = max_retries
+
+    @staticmethod
+    def _reply(intake: dict, key: str, prefix: str = ""):
+        lang = intake.get("lang", "es")
+        return {
+            "messages": AIMessage(content=prefix + MESSAGES[lang][key], response_metadata={"intake": key}),
+            "intake": intake,
+        }
+
+    @staticmethod
+    def _tool_call(intake: dict, name: str, args: dict, *extra: tuple[str, dict]):
+        calls = [
+            {"id": f"call_intake_{uuid.uuid4().hex[:12]}", "name": call_name, "args": call_args}
+            for call_name, call_args in ((name, args), *extra)
+        ]
+        return {
+            "messages": AIMessage(content="", tool_calls=calls, response_metadata={"intake": name}),
+            "intake": {"lang": intake.get("lang", "es")},
+        }
+
+    @staticmethod
+    def _to_model():
+        # El modelo atiende el mensaje; se abandona el flujo de preguntas
+        return {"intake": {}}
+
+    def _missing(self, intake: dict, config: RunnableConfig) -> str | None:
+        """
+        Próxima pregunta del flujo de predicción, o None si ya se tienen todos los datos.
+        Los cultivos, el periodo preferido y la ubicación guardados en el perfil no se vuelven a preguntar.
+        """
+        profile = profile_from(config)
+        if not intake.get("crops") and not (profile and profile.crops):
+            return "crops"
+        if not intake.get("period") and not (profile and profile.preferred_period):
+            return "period"
+        if not intake.get("location") and not (profile and profile.location):
+            return "location"
+        return None
+
+    def _prediction_call(self, intake: dict, config: RunnableConfig):
+        profile = profile_from(config)
+        args = {"period": intake.get("period") or profile.preferred_period}
+        if location := intake.get("location") or profile.location:
+            args["lat"], args["lon"] = location
+        args["crops"] = intake.get("crops") or list(profile.crops)
+        # Predicción y riesgos por cultivo en paralelo: el modelo solo redacta el análisis
+        return self._tool_call(intake, "get_agriculture_predictions", args, ("score_crop_impact", args))
+
+    def _advance(self, intake: dict, config: RunnableConfig, prefix: str = ""):
+        if (step := self._missing(intake, config)) is None:
+            return self._prediction_call(intake, config)
+        return self._reply({**intake, "step": step}, step, prefix)
+
+    def _retry(self, intake: dict, step: str):
+        retries = intake.get("retries", 0) + 1
+        if retries > self.max_retries:
+            return self._to_model()
+        return self._reply({**intake, "step": step, "retries": retries}, step, MESSAGES[intake.get("lang", "es")]["retry"])
+
+    def __call__(self, state: dict, config: RunnableConfig):
+        message = state["messages"][-1]
+        if not isinstance(message, HumanMessage) or not isinstance(message.content, str):
+            return self._to_model()
+
+        raw_text = message.content
+        text = normalize_text(raw_text)
+        intake = dict(state.get("intake") or {})
+        step = intake.get("step")
+        words = text.split()
+
+        if is_greeting(text):
+            return self._reply({"step": "menu", "lang": detect_language(text)}, "menu")
+        intake.setdefault("lang", detect_language(text))
+
+        # Datos que el usuario puede dar en cualquier momento del flujo
+        location = parse_location(raw_text)
+        period = parse_period(text) or (PERIOD_OPTIONS.get(text) if step == "period" else None)
+        crops = parse_crops(text)
+        question = "?" in raw_text or "¿" in raw_text
+        # El flujo de predicción solo empieza con un pedido explícito: mencionar un cultivo
+        # ("cuéntame algo sobre el café") es una conversación para el modelo
+        prediction_topic = any(word in PREDICTION_WORDS for word in words)
+
+        if step == "weather_city" and not question and len(words) <= 4:
+            # Solo municipios conocidos: "no sé", "gracias" o "menú" no son ciudades y pasan al modelo
+            if (place := gazetteer.find(raw_text.strip(" ?!.¿¡"))) is None:
+                return self._to_model()
+            return self._tool_call(intake, "get_weather", {"lat": place.latitude, "lon": place.longitude})
+        if (city := parse_weather_city(raw_text)) and not prediction_topic:
+            return self._tool_call(intake, "get_weather", {"city": city})
+
+        if step in ("crops", "period", "location"):
+            # Las preguntas ("y del maíz qué opinas?") las contesta el modelo
+            if question or len(words) > MAX_INTAKE_WORDS:
+                return self._to_model()
+            # Los cultivos solo se toman como respuesta a la pregunta de los cultivos
+            slot_crops = crops if step == "crops" else []
+            if step == "crops" and not crops and not (location or period):
+                slot_crops = parse_free_crops(raw_text)
+            found = False
+            for key, value in (("crops", slot_crops), ("period", period), ("location", location)):
+                if value:
+                    intake[key] = value
+                    found = True
+            if not found:
+                if crops:
+                    # Habla de un cultivo en lugar de responder: no es un reintento del flujo
+                    return self._to_model()
+                return self._retry(intake, step)
+            intake.pop("retries", None)
+            return self._advance(intake, config)
+
+        # Sin flujo en curso: opción del menú o pedido directo
+        if question or len(words) > MAX_INTAKE_WORDS:
+            return self._to_model()
+        if step == "menu" and text == "1" or words and set(words) <= WEATHER_WORDS | {"el", "the", "actual", "current", "consultar"}:
+            profile = profile_from(config)
+            if profile is not None and profile.location is not None:
+                # Con la ubicación guardada, `get_weather` consulta por coordenadas sin preguntar la ciudad
+                return self._tool_call(intake, "get_weather", {})
+            return self._reply({**intake, "step": "weather_city"}, "weather_city")
+        if step == "menu" and text == "2" or prediction_topic:
+            intake = {"lang": intake["lang"], "crops": crops, "period": period, "location": location}
+            return self._advance({k: v for k, v in intake.items() if v}, config)
+        return self._to_model()
+
+    async def acall(self, state: dict, config: RunnableConfig):
+        return self(state, config)
+
+
+def route_intake(state: dict):
+    """
+    Tras el nodo de reglas: terminar el turno con su respuesta, ejecutar la herramienta que armó
+    o pasar el mensaje al modelo.
+    """
+    message = state["messages"][-1]
+    if isinstance(message, AIMessage):
+        return "tools" if message.tool_calls else END
+    return "agent"
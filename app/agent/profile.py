@@ -0,0 +1,31 @@
+# app/agent/profile.py
+
+from langchain_core.runnables import RunnableConfig
+from app.schemas.chat import UserProfile
+from app.services.gazetteer import gazetteer
+
+# Clave de `configurable` con el `UserProfile` de la sesión
+PROFILE_KEY = "profile"
+
+
+def profile_from(config: RunnableConfig | None) -> UserProfile | None:
+    """
+    Perfil del usuario inyectado en la configuración de la ejecución, si lo hay.
+    """
+    return ((config or {}).get("configurable") or {}).get(PROFILE_KEY)
+
+
+def profile_prompt(profile: UserProfile | None) -> tuple[str, str]:
+    """
+    Textos `user_info` y `user_interest` del prompt a partir del perfil guardado.
+    """
+    if profile is None or profile.is_empty:
+        return "Campesino", " "
+    lines = ["Campesino"]
+    if profile.location is not None:
+        place = gazetteer.resolve(profile.latitude, profile.longitude).describe()
+        near = f"{place}; " if place else ""
+        lines.append(f"Ubicación guardada: latitud {profile.latitude}, longitud {profile.longitude} ({near}no es necesario pedirla)")
+    if profile.preferred_period:
+        lines.append(f"Periodo preferido: {profile.preferred_period}")
+    return "\n".join(lines), ", ".join(profile.crops) or " "
@@ -0,0 +1,50 @@
+# app/agent/registry.py
+
+import importlib
+import pkgutil
+import threading
+
+TOOLS_PACKAGE = "app.agent.tools"
+
+
+class ToolRegistry:
+    """
+    Registro de las herramientas del agente.
+
+    Descubre los módulos del paquete `tools` y los importa con `importlib.import_module`,
+    por lo que cada módulo se ejecuta una sola vez (queda en `sys.modules`) y cada
+    herramienta se registra una sola vez por nombre. La carga es perezosa: ocurre la
+    primera vez que se piden las herramientas.
+    """
+
+    def __init__(self, package: str = TOOLS_PACKAGE):
+        self.package = package
+        self._tools: dict | None = None
+        self._lock = threading.Lock()
+
+    def _discover(self) -> dict:
+        from langchain_core.tools import BaseTool
+
+        package = importlib.import_module(self.package)
+        tools = {}
+        for module_info in sorted(pkgutil.iter_modules(package.__path__), key=lambda m: m.name):
+            if module_info.name.startswith("_"):
+                continue
+            module = importlib.import_module(f"{self.package}.{module_info.name}")
+            for value in vars(module).values():
+                if isinstance(value, BaseTool):
+                    tools.setdefault(value.name, value)
+        return tools
+
+    def _load(self) -> dict:
+        if self._tools is None:
+            with self._lock:
+                if self._tools is None:
+                    self._tools = self._discover()
+        return self._tools
+
+    def tools(self) -> list:
+        return list(self._load().values())
+
+
+tool_registry = ToolRegistry()
@@ -0,0 +1,127 @@
+# app/agent/response_cache.py
+
+import hashlib
+import re
+import threading
+import unicodedata
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.utils.cache import TTLCache
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza el texto del usuario para usarlo como clave: minúsculas, sin tildes,
+    sin signos de puntuación ni emojis y con los espacios colapsados.
+    "¡Hola!  " y "hola" producen la misma clave.
+    """
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    """
+    Caché de respuestas del agente para turnos deterministas y sin herramientas
+    (saludo y menú inicial, "hola", "menu", elección del periodo, ...).
+
+    La clave es el texto normalizado más una huella del estado de la conversación
+    (el contenido de todos los mensajes previos), por lo que solo se reutiliza una
+    respuesta cuando la conversación hasta ese punto es la misma. Solo se consideran
+    conversaciones cortas (`max_messages`) y sin resumen, que es donde se repiten.
+
+    Nunca se guarda un turno en el que el modelo llamó a una herramienta: esas
+    respuestas dependen de datos externos (clima, predicciones).
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float | None = 3600, max_messages: int = 6, max_input_chars: int = 80):
+        self.enabled = maxsize > 0
+        self.max_messages = max_messages
+        self.max_input_chars = max_input_chars
+        self._cache = TTLCache(max(maxsize, 1), ttl=ttl)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._stored = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def fingerprint(messages: list) -> str:
+        if not messages:
+            return "new"
+        digest = hashlib.blake2b(digest_size=16)
+        for message in messages:
+            content = normalize_text(message.content) if isinstance(message, HumanMessage) else str(message.content)
+            digest.update(f"{message.type}\x1f{content}\x1e".encode())
+        return digest.hexdigest()
+
+    def key_for(self, input_message: str, state: dict | None, context: str = "") -> tuple | None:
+        """
+        Clave de caché para el turno, o None si el turno no es cacheable
+        (conversación larga o resumida, mensaje largo o vacío).
+        `context` es lo que el prompt sabe del usuario (perfil): respuestas con otro contexto no se mezclan.
+        """
+        if not self.enabled:
+            return None
+        state = state or {}
+        messages = state.get("messages", [])
+        text = normalize_text(input_message)
+        if (
+            not text
+            or len(input_message) > self.max_input_chars
+            or len(messages) > self.max_messages
+            or state.get("summary")
+        ):
+            self._count("_bypassed")
+            return None
+        return self.fingerprint(messages), text, context
+
+    def get(self, key: tuple | None) -> str | None:
+        if key is None:
+            return None
+        response = self._cache.get(key)
+        self._count("_hits" if response is not None else "_misses")
+        return response
+
+    def store(self, key: tuple | None, new_messages: list):
+        """
+        Guarda la respuesta del turno si el modelo contestó directamente, sin herramientas.
+        `new_messages` son los mensajes que el turno agregó al estado (desde el del usuario).
+        """
+        if key is None or not new_messages or not isinstance(new_messages[0], HumanMessage):
+            return
+        if normalize_text(new_messages[0].content) != key[1]:
+            return
+        replies = new_messages[1:]
+        if len(replies) != 1 or not isinstance(replies[0], AIMessage) or replies[0].tool_calls:
+            return
+        if replies[0].response_metadata.get("degraded"):
+            # Respuesta de respaldo por tiempo límite o error: no se reutiliza
+            return
+        if replies[0].response_metadata.get("intake"):
+            # Respuesta por reglas: es gratis y avanza el estado del flujo de preguntas
+            return
+        if isinstance(replies[0].content, str) and replies[0].content:
+            self._cache.set(key, replies[0].content)
+            self._count("_stored")
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "bypassed": self._bypassed,
+                "stored": self._stored,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,176 @@
+# app/agent/tool_executor.py
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import MessagesState
+
+from app.agent.deadline import DEADLINE_KEY, bounded, deadline_in
+from app.utils.metrics import TOOL_ABANDONED_CALLS, TOOL_ERRORS, TOOL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def record_tool_call(name: str, elapsed: float, status: str):
+    """
+    Publica la latencia de una llamada (y si terminó en error o timeout) en las métricas de Prometheus.
+    """
+    TOOL_SECONDS.labels(name, status).observe(elapsed)
+    if status != "success":
+        TOOL_ERRORS.labels(name, status).inc()
+
+
+class ParallelToolNode:
+    """
+    Nodo del grafo que ejecuta en paralelo todas las llamadas a herramientas de un turno.
+
+    - Cada herramienta tiene un tiempo límite (`timeouts[nombre]` o `default_timeout`),
+      acotado además por el `deadline` de la petición; si se excede, se responde con un
+      resultado estructurado de timeout en lugar de bloquear la conversación.
+    - La versión síncrona usa un pool de hilos acotado (`max_workers`). Un hilo no se puede
+      interrumpir: al vencer el límite el nodo solo deja de esperar y la llamada sigue
+      ocupando su hilo hasta terminar. Por eso cada llamada recibe su límite como `deadline`
+      en el config (las herramientas lo usan como timeout de sus peticiones HTTP) y las
+      llamadas abandonadas se cuentan en `abandoned` y en la métrica `TOOL_ABANDONED_CALLS`.
+    - El tiempo de cada llamada se registra en las métricas (`record_tool_call`) y en el `response_metadata`
+      del ToolMessage.
+    """
+
+    def __init__(self, tools: list, *, default_timeout: float, timeouts: dict | None = None, max_workers: int = 16):
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self.abandoned = 0  # Llamadas que vencieron y siguen corriendo en un hilo del pool
+        self._abandoned_lock = threading.Lock()
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    @staticmethod
+    def _tool_calls(state: MessagesState):
+        return state["messages"][-1].tool_calls
+
+    def _message(self, call: dict, content, status: str, elapsed: float) -> ToolMessage:
+        record_tool_call(call["name"], elapsed, status)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        return ToolMessage(
+            content=content,
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="success" if status == "success" else "error",
+            response_metadata={"elapsed_ms": round(elapsed * 1000, 1)},
+        )
+
+    def _timeout_result(self, call: dict, timeout: float) -> dict:
+        return {
+            "error": "timeout",
+            "tool": call["name"],
+            "timeout_seconds": round(timeout, 2),
+            "message": "La herramienta no respondió a tiempo. Informa al usuario e intenta más tarde.",
+        }
+
+    def _unknown_tool(self, call: dict) -> ToolMessage:
+        return self._message(
+            call, {"error": "unknown_tool", "tool": call["name"], "available": list(self.tools_by_name)}, "error", 0.0
+        )
+
+    # -- Versión síncrona ------------------------------------------------
+
+    @staticmethod
+    def _timed_invoke(tool, args: dict, config: RunnableConfig):
+        started = time.perf_counter()
+        try:
+            return tool.invoke(args, config), "success", time.perf_counter() - started
+        except Exception as e:
+            return {"error": type(e).__name__, "message": str(e)}, "error", time.perf_counter() - started
+
+    @staticmethod
+    def _with_deadline(config: RunnableConfig, timeout: float) -> RunnableConfig:
+        """
+        Config de una llamada con su propio límite como `deadline` (ver `app.agent.deadline`).
+        """
+        return {**config, "configurable": {**config.get("configurable", {}), DEADLINE_KEY: deadline_in(timeout)}}
+
+    def _abandon(self, call: dict, future):
+        """
+        Deja de esperar una llamada que venció. El hilo no se puede detener: se cuenta como
+        abandonada hasta que termine por su cuenta.
+        """
+        if future.cancel():  # Todavía no había empezado
+            return
+        with self._abandoned_lock:
+            self.abandoned += 1
+            abandoned = self.abandoned
+        TOOL_ABANDONED_CALLS.inc()
+        if abandoned >= self.max_workers // 2:
+            logger.warning(
+                "%d de %d hilos de herramientas ocupados por llamadas vencidas (última: %s)",
+                abandoned, self.max_workers, call["name"],
+            )
+
+        def release(_):
+            with self._abandoned_lock:
+                self.abandoned -= 1
+            TOOL_ABANDONED_CALLS.dec()
+
+        future.add_done_callback(release)
+
+    def __call__(self, state: MessagesState, config: RunnableConfig):
+        calls = self._tool_calls(state)
+        limits = {call["id"]: bounded(self.timeout_for(call["name"]), config) for call in calls}
+        started = time.perf_counter()
+        futures = [
+            self._executor.submit(
+                self._timed_invoke, self.tools_by_name[call["name"]], call["args"], self._with_deadline(config, limits[call["id"]])
+            )
+            if call["name"] in self.tools_by_name
+            else None
+            for call in calls
+        ]
+
+        messages = []
+        for call, future in zip(calls, futures):
+            if future is None:
+                messages.append(self._unknown_tool(call))
+                continue
+            # Todas las llamadas arrancaron a la vez: el límite se mide desde `started`
+            timeout = limits[call["id"]]
+            remaining = max(timeout - (time.perf_counter() - started), 0)
+            try:
+                content, status, elapsed = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                self._abandon(call, future)
+                content, status, elapsed = self._timeout_result(call, timeout), "timeout", time.perf_counter() - started
+            messages.append(self._message(call, content, status, elapsed))
+        return {"messages": messages}
+
+    # -- Versión asíncrona -----------------------------------------------
+
+    async def _arun(self, call: dict, config: RunnableConfig) -> ToolMessage:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return self._unknown_tool(call)
+        timeout = bounded(self.timeout_for(call["name"]), config)
+        started = time.perf_counter()
+        try:
+            content = await asyncio.wait_for(tool.ainvoke(call["args"], config), timeout)
+            status = "success"
+        except asyncio.TimeoutError:
+            content, status = self._timeout_result(call, timeout), "timeout"
+        except Exception as e:
+            content, status = {"error": type(e).__name__, "message": str(e)}, "error"
+        return self._message(call, content, status, time.perf_counter() - started)
+
+    async def acall(self, state: MessagesState, config: RunnableConfig):
+        calls = self._tool_calls(state)
+        messages = await asyncio.gather(*(self._arun(call, config) for call in calls))
+        return {"messages": list(messages)}
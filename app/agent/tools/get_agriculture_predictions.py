@@ -1,70 +1,116 @@
 # app/agent/tools/get_agriculture_predictions.py
 
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+import httpx
 import requests
+from app.agent.deadline import request_timeout
+from app.agent.profile import profile_from
+from app.core.config import settings
+from app.dao.profile import ProfileDAO
+from app.db.session import AsyncSessionLocal, SessionLocal
+from app.services.forecast import PERIOD_ENDPOINTS, Forecast, format_forecast, forecast_service
 
-# Mapeo de periodos en inglés a los endpoints correspondientes
-PERIOD_ENDPOINTS = {
-    "tomorrow": "/api/Prediction/tomorrowPrediction",
-    "week": "/api/Prediction/weekPrediction",
-    "month": "/api/Prediction/monthPrediction",
-    "quarter": "/api/Prediction/cuarterPrediction"
-}
 
-BASE_URL = "https://nasaanalisisapi-production.up.railway.app"
+def resolve_prediction_args(lat: float | None, lon: float | None, period: str | None, config: RunnableConfig):
+    """
+    Completa los argumentos que el modelo no envió con el perfil del usuario.
+    Retorna (lat, lon, period, error).
+    """
+    profile = profile_from(config)
+    if (lat is None or lon is None) and profile is not None and profile.location is not None:
+        lat, lon = profile.location
+    if not period and profile is not None:
+        period = profile.preferred_period
+    if lat is None or lon is None:
+        return lat, lon, period, "The user's location is unknown: ask the user to share their location."
+    if not period:
+        return lat, lon, period, "The prediction period is unknown: ask the user (tomorrow, week, month, quarter)."
+
+    # Determinar el endpoint basado en el período en inglés
+    period = period.lower()
+    if period not in PERIOD_ENDPOINTS:
+        return lat, lon, period, f"The period '{period}' is invalid. Valid periods are: tomorrow, week, month, quarter."
+    return lat, lon, period, None
 
-@tool
-def get_agriculture_predictions(lat: float, lon: float, period: str) -> str:
+
+def _profile_changes(lat: float, lon: float, forecast: Forecast | None, crops: list[str] | None, config: RunnableConfig) -> dict:
+    """
+    Datos de la consulta que vale la pena recordar en el perfil (vacío si no cambió nada):
+    la ubicación y el periodo consultados con éxito y los cultivos enviados por el modelo.
     """
-    Obtiene predicciones del clima basadas en latitud, longitud, y el periodo de tiempo (mañana, semana, mes, trimestre).
+    profile = profile_from(config)
+    changes = {}
+    if forecast is not None:
+        changes.update(latitude=lat, longitude=lon, preferred_period=forecast.period)
+    if crops:
+        changes["crops"] = [crop.strip().lower() for crop in crops if crop.strip()]
+    if profile is not None:
+        current = profile.model_dump()
+        changes = {k: v for k, v in changes.items() if current.get(k) != v}
+    return changes
+
+
+def _get_agriculture_predictions(
+    config: RunnableConfig,
+    period: str = None,
+    lat: float = None,
+    lon: float = None,
+    crops: list[str] = None,
+) -> str:
+    """
+    Obtiene predicciones del clima basadas en latitud, longitud, y el periodo de tiempo (tomorrow, week, month, quarter).
+    Si no se envían latitud, longitud o periodo, usa la ubicación guardada y el periodo preferido del usuario.
+    `crops` son los cultivos de interés del usuario, que se guardan en su perfil.
     Retorna la predicción sin realizar ningún análisis sobre los cultivos. Obtiene predicciones de:
     - **T2M**: Temperatura a 2 metros (°C) 🌡️
     - **PRECTOT**: Precipitación total (mm/día) ☔
     - **WS10M**: Velocidad del viento a 10 metros (m/s) 💨
     - **RH2M**: Humedad relativa a 2 metros (%)
     """
+    lat, lon, period, error = resolve_prediction_args(lat, lon, period, config)
+    forecast = None
+    if not error:
+        # Normalmente ya está precargada; si no, se descarga una sola vez por celda y periodo
+        try:
+            forecast = forecast_service.get(lat, lon, period, timeout=request_timeout(settings.TOOL_TIMEOUT_SECONDS, config))
+        except requests.exceptions.RequestException as e:
+            error = f"Error retrieving predictions: {str(e)}"
 
-    # Determinar el endpoint basado en el período en inglés
-    endpoint = PERIOD_ENDPOINTS.get(period.lower())
-    if not endpoint:
-        return f"The period '{period}' is invalid. Valid periods are: tomorrow, week, month, quarter."
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if thread_id and (changes := _profile_changes(lat, lon, forecast, crops, config)):
+        with SessionLocal() as db:
+            ProfileDAO.update_profile(db, thread_id, **changes)
+    return error or format_forecast(forecast)
 
-    # Construir la URL completa de la API
-    url = f"{BASE_URL}{endpoint}"
 
-    # Realizar la solicitud HTTP
-    try:
-        response = requests.get(url, params={"latitude": 4.8616, "longitude": -74.0321}, headers={"accept": "application/json"})
-        response.raise_for_status()  # Verificar que no haya errores de HTTP
-        data = response.json()
-        
-        # Procesar la respuesta según el formato de la API
-        if period.lower() == "tomorrow":
-            # La respuesta para mañana tiene 4 predicciones directas
-            t2m, prectot, ws10m, rh2m = data["predictions"]
-            prediction = (
-                f"Prediction for tomorrow:\n"
-                f"- **T2M**: {t2m:.2f}°C 🌡️\n"
-                f"- **PRECTOT**: {prectot:.2f} mm ☔\n"
-                f"- **WS10M**: {ws10m:.2f} m/s 💨\n"
-                f"- **RH2M**: {rh2m:.2f}% 💧"
-            )
-        else:
-            # Las respuestas para semana, mes, trimestre tienen min, max, average
-            t2m = data["predictions"][0]
-            prectot = data["predictions"][1]
-            ws10m = data["predictions"][2]
-            rh2m = data["predictions"][3]
-            
-            prediction = (
-                f"{period.capitalize()} prediction:\n"
-                f"- **T2M**: Min: {t2m['min']:.2f}°C, Max: {t2m['max']:.2f}°C, Average: {t2m['average']:.2f}°C 🌡️\n"
-                f"- **PRECTOT**: Min: {prectot['min']:.2f} mm, Max: {prectot['max']:.2f} mm, Average: {prectot['average']:.2f} mm ☔\n"
-                f"- **WS10M**: Min: {ws10m['min']:.2f} m/s, Max: {ws10m['max']:.2f} m/s, Average: {ws10m['average']:.2f} m/s 💨\n"
-                f"- **RH2M**: Min: {rh2m['min']:.2f}%, Max: {rh2m['max']:.2f}%, Average: {rh2m['average']:.2f}% 💧"
-            )
+async def _aget_agriculture_predictions(
+    config: RunnableConfig,
+    period: str = None,
+    lat: float = None,
+    lon: float = None,
+    crops: list[str] = None,
+) -> str:
+    """
+    Versión asíncrona de `_get_agriculture_predictions` (no bloquea el event loop).
+    """
+    lat, lon, period, error = resolve_prediction_args(lat, lon, period, config)
+    forecast = None
+    if not error:
+        try:
+            forecast = await forecast_service.aget(lat, lon, period)
+        except httpx.HTTPError as e:
+            error = f"Error retrieving predictions: {str(e)}"
+
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if thread_id and (changes := _profile_changes(lat, lon, forecast, crops, config)):
+        async with AsyncSessionLocal() as db:
+            await ProfileDAO.aupdate_profile(db, thread_id, **changes)
+    return error or format_forecast(forecast)
 
-        return prediction
 
-    except requests.exceptions.RequestException as e:
-        return f"Error retrieving predictions: {str(e)}"
+get_agriculture_predictions = StructuredTool.from_function(
+    func=_get_agriculture_predictions,
+    coroutine=_aget_agriculture_predictions,
+    name="get_agriculture_predictions",
+)
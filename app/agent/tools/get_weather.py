@@ -1,26 +1,78 @@
 # app/agent/tools/get_weather.py
 
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
 import requests
+from app.agent.deadline import request_timeout
+from app.agent.profile import profile_from
 from app.core.config import settings
+from app.services.gazetteer import gazetteer
+from app.utils.http import get_async_client
 
-@tool
-def get_weather(city: str) -> str:
-    """Obtiene el clima actual de una ciudad dada."""
-    api_key = settings.OPENWEATHER_API_KEY
-    if not api_key:
+WEATHER_URL = settings.OPENWEATHER_API_URL
+
+
+def _weather_query(city: str | None, lat: float | None, lon: float | None, config: RunnableConfig | None):
+    """
+    Parámetros de OpenWeather y nombre del lugar para la respuesta. Sin ciudad ni coordenadas
+    usa la ubicación guardada en el perfil; las coordenadas se nombran con el municipio más
+    cercano del índice local. Retorna (params, lugar) o (None, error).
+    """
+    params = {"appid": settings.OPENWEATHER_API_KEY, "units": "metric", "lang": "es"}
+    if city:
+        return {**params, "q": city}, city
+    if lat is None or lon is None:
+        profile = profile_from(config)
+        if profile is None or profile.location is None:
+            return None, "No se conoce la ubicación del usuario: pregúntale la ciudad o pídele que comparta su ubicación."
+        lat, lon = profile.location
+    place = gazetteer.resolve(lat, lon).describe() or f"latitud {lat}, longitud {lon}"
+    return {**params, "lat": lat, "lon": lon}, place
+
+
+def _format_weather(place: str, data: dict) -> str:
+    weather_desc = data['weather'][0]['description']
+    temp = data['main']['temp']
+    return f"En {place}, la temperatura es {temp}°C y el clima es {weather_desc}."
+
+
+def _get_weather(config: RunnableConfig, city: str = None, lat: float = None, lon: float = None) -> str:
+    """
+    Obtiene el clima actual de una ciudad dada o de unas coordenadas (latitud y longitud).
+    Sin ciudad ni coordenadas, usa la ubicación guardada del usuario.
+    """
+    if not settings.OPENWEATHER_API_KEY:
         return "La clave de API para el clima no está configurada."
 
-    url = (
-        f"http://api.openweathermap.org/data/2.5/weather"
-        f"?q={city}&appid={api_key}&units=metric&lang=es"
-    )
-    response = requests.get(url)
+    params, place = _weather_query(city, lat, lon, config)
+    if params is None:
+        return place
+
+    response = requests.get(WEATHER_URL, params=params, timeout=request_timeout(settings.TOOL_TIMEOUT_SECONDS, config))
     if response.status_code != 200:
         return "No se pudo obtener la información del clima."
 
-    data = response.json()
-    weather_desc = data['weather'][0]['description']
-    temp = data['main']['temp']
-    return f"En {city}, la temperatura es {temp}°C y el clima es {weather_desc}."
+    return _format_weather(place, response.json())
+
+
+async def _aget_weather(config: RunnableConfig, city: str = None, lat: float = None, lon: float = None) -> str:
+    """Versión asíncrona de `_get_weather` (no bloquea el event loop)."""
+    if not settings.OPENWEATHER_API_KEY:
+        return "La clave de API para el clima no está configurada."
+
+    params, place = _weather_query(city, lat, lon, config)
+    if params is None:
+        return place
+
+    response = await get_async_client().get(WEATHER_URL, params=params)
+    if response.status_code != 200:
+        return "No se pudo obtener la información del clima."
+
+    return _format_weather(place, response.json())
+
 
+get_weather = StructuredTool.from_function(
+    func=_get_weather,
+    coroutine=_aget_weather,
+    name="get_weather",
+)
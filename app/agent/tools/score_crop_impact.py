@@ -0,0 +1,120 @@
+# app/agent/tools/score_crop_impact.py
+
+import json
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+import httpx
+import requests
+from app.agent.deadline import request_timeout
+from app.agent.profile import profile_from
+from app.agent.response_cache import normalize_text
+from app.agent.tools.get_agriculture_predictions import resolve_prediction_args
+from app.core.config import settings
+from app.services.crop_scoring import RISK_UNITS, RISKS, CropImpact, crop_engine, parse_crops
+from app.services.forecast import Forecast, forecast_service
+
+# Cultivos sugeridos cuando el usuario no tiene cultivos de interés
+TOP_CROPS = 5
+
+
+def _canonical_crops(crops: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Nombres de la tabla de tolerancias para los cultivos pedidos ("corn" -> "maíz").
+    Retorna (cultivos conocidos, cultivos sin datos).
+    """
+    known, unknown = [], []
+    for crop in crops:
+        names = [name for name in parse_crops(normalize_text(crop)) if name in crop_engine.table.names]
+        if names:
+            known.extend(name for name in names if name not in known)
+        else:
+            unknown.append(crop)
+    return known, unknown
+
+
+def _flag_text(flag) -> str:
+    unit = RISK_UNITS[RISKS.index(flag.risk)]
+    sign = "<" if flag.value < flag.limit else ">"
+    return f"{flag.risk}:{flag.level} ({flag.value}{unit} {sign} {flag.limit}{unit})"
+
+
+def _result(forecast: Forecast, impacts: list[CropImpact], unknown: list[str], suggested: bool) -> str:
+    """
+    Resultado compacto para el modelo: puntaje (0-100) y riesgos por cultivo.
+    """
+    result = {
+        "period": forecast.period,
+        "crops": [
+            {"crop": i.crop, "stage": i.stage, "score": i.score, "risks": [_flag_text(flag) for flag in i.flags]}
+            for i in impacts
+        ],
+    }
+    if suggested:
+        result["note"] = "Best suited crops for this forecast (the user has no crops yet)."
+    if unknown:
+        result["no_data"] = unknown
+    return json.dumps(result, ensure_ascii=False)
+
+
+def _score(forecast: Forecast, crops: list[str] | None, stage: str | None, config: RunnableConfig) -> str:
+    profile = profile_from(config)
+    crops = crops or (list(profile.crops) if profile is not None else [])
+    known, unknown = _canonical_crops(crops)
+    if crops and not known:
+        return _result(forecast, [], unknown, False)
+    impacts = crop_engine.score(forecast, known or None, stage)
+    return _result(forecast, impacts if known else impacts[:TOP_CROPS], unknown, not known)
+
+
+def _score_crop_impact(
+    config: RunnableConfig,
+    period: str = None,
+    lat: float = None,
+    lon: float = None,
+    crops: list[str] = None,
+    stage: str = None,
+) -> str:
+    """
+    Evalúa la predicción del periodo contra las tolerancias de los cultivos (temperatura, lluvia,
+    viento y humedad) y retorna, por cultivo, un puntaje de 0 a 100 y los riesgos detectados
+    con su nivel (moderado/alto), el valor pronosticado y el umbral del cultivo.
+    Usa la ubicación, el periodo y los cultivos guardados del usuario si no se envían.
+    `stage` (opcional): 'vegetativo', 'floracion' o 'maduracion'. Sin cultivos, sugiere los más aptos.
+    Úsala para explicar cómo afecta la predicción a los cultivos, sin recalcular los riesgos.
+    """
+    lat, lon, period, error = resolve_prediction_args(lat, lon, period, config)
+    if error:
+        return error
+    try:
+        forecast = forecast_service.get(lat, lon, period, timeout=request_timeout(settings.TOOL_TIMEOUT_SECONDS, config))
+    except requests.exceptions.RequestException as e:
+        return f"Error retrieving predictions: {str(e)}"
+    return _score(forecast, crops, stage, config)
+
+
+async def _ascore_crop_impact(
+    config: RunnableConfig,
+    period: str = None,
+    lat: float = None,
+    lon: float = None,
+    crops: list[str] = None,
+    stage: str = None,
+) -> str:
+    """
+    Versión asíncrona de `_score_crop_impact` (no bloquea el event loop).
+    """
+    lat, lon, period, error = resolve_prediction_args(lat, lon, period, config)
+    if error:
+        return error
+    try:
+        forecast = await forecast_service.aget(lat, lon, period)
+    except httpx.HTTPError as e:
+        return f"Error retrieving predictions: {str(e)}"
+    return _score(forecast, crops, stage, config)
+
+
+score_crop_impact = StructuredTool.from_function(
+    func=_score_crop_impact,
+    coroutine=_ascore_crop_impact,
+    name="score_crop_impact",
+)
@@ -1,10 +1,16 @@
 # app/api/chat.py
 
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.schemas.chat import ChatMessageCreate, ChatMessage, ChatSession
+from app.db.session import AsyncSessionLocal, get_db
+from app.schemas.chat import ChatMessageCreate, ChatMessage, ChatSession, ChatHistoryPage
 from app.services.chat import ChatService
+from app.agent.agent import response_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -25,12 +31,51 @@ def send_chat_message(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
-@router.get("/history/", response_model=list[ChatMessage])
+@router.post("/message/stream/")
+async def stream_chat_message(message: ChatMessageCreate, session_id: str):
+    """
+    Streaming variant of `/message/` using Server-Sent Events.
+    Events: `token`, `tool_start`, `tool_end` and a final `done` with the saved bot message.
+    An unknown session is a regular 404 response; once the stream has started, a failure
+    ends it with a single `error` event (status 500).
+    """
+    # The response outlives the request dependencies, so the stream owns its DB session
+    db = AsyncSessionLocal()
+    try:
+        events = await ChatService.stream_message(db, session_id, message)
+    except ValueError as e:
+        await db.close()
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async def event_stream():
+        async with db:
+            try:
+                async for event, data in events:
+                    yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            except Exception:
+                logger.exception("Error streaming the reply for session %s", session_id)
+                yield f"event: error\ndata: {json.dumps({'status': 500, 'detail': 'Internal error'})}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/history/", response_model=ChatHistoryPage)
 def get_chat_history(
     session_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: str = None,
     db: Session = Depends(get_db)
 ):
+    """
+    Historial del más reciente al más antiguo. Para la página siguiente enviar `cursor=next_cursor`.
+    """
     try:
-        return ChatService.get_chat_history(db, session_id)
+        return ChatService.get_chat_history(db, session_id, limit=limit, cursor=cursor)
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/cache/stats/")
+def get_response_cache_stats():
+    """
+    Aciertos, fallos y tamaño de la caché de respuestas del agente.
+    """
+    return response_cache.stats()
@@ -1,10 +1,12 @@
 # app/api/whatsapp.py
 
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Depends, Query
-from sqlalchemy.orm import Session
+import time
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.whatsapp import WhatsAppService
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.core.config import settings
+from app.utils.metrics import WEBHOOK_SECONDS
 
 router = APIRouter()
 
@@ -23,13 +25,21 @@ async def verify_webhook(
         raise HTTPException(status_code=403, detail="Verification token mismatch")
 
 @router.post("/webhook/")
-async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def whatsapp_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Handle incoming WhatsApp webhook message.
     """
+    started = time.perf_counter()
+    outcome = "error"
     try:
         data = await request.json()
-        response = await WhatsAppService.handle_incoming_message(db, data, background_tasks)
+        response = await WhatsAppService.handle_incoming_message(db, data)
+        outcome = response.get("status", "received")
         return response
+    except HTTPException as e:
+        outcome = "busy" if e.status_code == 503 else "error"
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        WEBHOOK_SECONDS.labels(outcome).observe(time.perf_counter() - started)
@@ -5,14 +5,70 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     PROJECT_NAME: str = "ChatBot API"
     DATABASE_URL: str
+    DATABASE_ASYNC_URL: str | None = None  # Por defecto, DATABASE_URL con el driver asíncrono (asyncpg/aiosqlite)
+    DB_POOL_SIZE: int = 10  # Conexiones permanentes por engine y por proceso
+    DB_MAX_OVERFLOW: int = 20  # Conexiones extra en picos
+    DB_POOL_PRE_PING: bool = True  # Verifica la conexión antes de usarla (conexiones cortadas por el servidor)
+    DB_POOL_RECYCLE_SECONDS: int = 1800
     OPENAI_API_KEY: str
     OPENAI_MODEL_NAME: str = "gpt-3.5-turbo"  # Modelo por defecto
+    OPENAI_BASE_URL: str | None = None  # API compatible con OpenAI (None = api.openai.com)
+    OPENAI_STREAM_USAGE: bool = True  # Pedir el uso de tokens en streaming (desactivar si la API no acepta stream_options)
     OPENWEATHER_API_KEY: str = ""
+    OPENWEATHER_API_URL: str = "http://api.openweathermap.org/data/2.5/weather"
+    PREDICTIONS_API_URL: str = "https://nasaanalisisapi-production.up.railway.app"
     NEWS_API_KEY: str = ""
     WHATSAPP_API_TOKEN: str
     WHATSAPP_PHONE_ID: str
     VERIFY_TOKEN: str
-
+    WHATSAPP_API_URL: str = "https://graph.facebook.com/v20.0"
+    WHATSAPP_MESSAGES_PER_SECOND: float = 80  # Throughput permitido por número del negocio
+    WHATSAPP_SEND_WORKERS: int = 8
+    WHATSAPP_SEND_MAX_RETRIES: int = 4  # Reintentos ante 429/5xx
+    WHATSAPP_MAX_RETRY_AFTER_SECONDS: float = 30  # Espera máxima pedida con Retry-After; si piden más, el envío falla
+    WHATSAPP_MAX_CONNECTIONS: int = 20
+    WHATSAPP_SEND_QUEUE_SIZE: int = 1000
+    AGENT_MAX_CONCURRENCY: int = 20  # Ejecuciones simultáneas del agente por proceso
+    AGENT_REPLY_DEADLINE_SECONDS: float = 45  # Tiempo máximo para responder un mensaje (luego, respuesta de respaldo)
+    AGENT_MAX_RETRIES: int = 2  # Reintentos del modelo ante respuestas vacías o errores
+    AGENT_RETRY_BACKOFF_SECONDS: float = 0.5  # Espera base (exponencial con jitter) entre reintentos
+    AGENT_LLM_TIMEOUT_SECONDS: float = 30  # Tiempo límite de cada llamada HTTP al modelo
+    AGENT_INTAKE_ENABLED: bool = True  # Menú y preguntas previas a una predicción por reglas (sin LLM)
+    AGENT_INTAKE_MAX_RETRIES: int = 1  # Respuestas no entendidas antes de pasarle el mensaje al modelo
+    HISTORY_TOKEN_BUDGET: int = 3000  # Tokens máximos del historial enviado al modelo (sin el prompt del sistema)
+    HISTORY_TOOL_RESULT_CHARS: int = 300  # Largo máximo de resultados de herramientas de turnos anteriores
+    RESPONSE_CACHE_SIZE: int = 1000  # Respuestas de turnos sin herramientas en caché (0 = desactivado)
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_MESSAGES: int = 6  # Solo se cachean turnos de conversaciones con hasta N mensajes previos
+    CHECKPOINT_HOT_THREADS: int = 1000  # Conversaciones cuyo estado se mantiene en memoria
+    CHECKPOINT_IDLE_TTL_SECONDS: int = 1800  # Inactividad tras la cual se libera de memoria
+    CHECKPOINT_KEEP_PER_THREAD: int = 3  # Checkpoints que se conservan por conversación en la BD
+    CHECKPOINT_DURABILITY: str = "exit"  # "exit": un checkpoint por turno; "async"/"sync": uno por nodo del grafo
+    TOOL_TIMEOUT_SECONDS: float = 20  # Tiempo límite por defecto de cada herramienta
+    TOOL_TIMEOUTS: dict[str, float] = {"get_weather": 8}  # Tiempo límite por herramienta (JSON en el .env)
+    TOOL_MAX_WORKERS: int = 16  # Hilos para ejecutar herramientas en la ruta síncrona
+    SESSION_CACHE_SIZE: int = 10000  # Sesiones (usuario, canal) resueltas que se guardan en memoria
+    SESSION_CACHE_TTL_SECONDS: int = 3600
+    WHATSAPP_COALESCE_SECONDS: float = 2.0  # Espera para unir mensajes seguidos de un usuario (0 = desactivado)
+    WHATSAPP_COALESCE_MAX_SECONDS: float = 6.0  # Espera máxima desde el primer mensaje del grupo
+    SESSION_LEASE_ENABLED: bool = True  # Un solo worker procesa cada conversación a la vez (varios procesos)
+    SESSION_LEASE_TTL_SECONDS: float = 30  # Vencimiento del lease si el worker deja de renovarlo
+    SCHEDULER_WORKERS: int = 16  # Conversaciones procesadas en paralelo
+    SCHEDULER_MAX_QUEUE: int = 500  # Trabajos en espera antes de rechazar (load shedding)
+    WEBHOOK_DEDUP_TTL_SECONDS: int = 7 * 24 * 3600  # Meta reintenta la entrega hasta por 7 días
+    WEBHOOK_DEDUP_CACHE_SIZE: int = 50000  # Ids de mensajes recientes en memoria
+    CHAT_WRITE_BEHIND: bool = False  # True: guarda mensajes por lotes (menor latencia, menos durabilidad)
+    CHAT_WRITE_BATCH_SIZE: int = 50
+    CHAT_WRITE_FLUSH_SECONDS: float = 0.5
+    PREDICTIONS_CELL_DEGREES: float = 0.05  # Tamaño de celda (~5.5 km) para cachear predicciones
+    PREDICTIONS_CACHE_SIZE: int = 5000  # Entradas (celda, periodo) en caché
+    FORECAST_ACTIVE_CELLS: int = 2000  # Celdas de usuarios recientes que se mantienen precargadas
+    FORECAST_ACTIVE_TTL_SECONDS: int = 24 * 3600  # Una celda deja de refrescarse tras este tiempo sin consultas
+    FORECAST_REFRESH_SECONDS: float = 600  # Intervalo del refresco en segundo plano
+    FORECAST_REFRESH_CONCURRENCY: int = 8  # Celdas descargadas a la vez durante el refresco
+    GAZETTEER_PATH: str | None = None  # CSV de municipios (name, department, latitude, longitude); por defecto el incluido
+    GAZETTEER_MAX_KM: float = 20  # Más lejos del municipio más cercano, la ubicación queda sin nombre
+    METRICS_STATS_PUBLISH_SECONDS: float = 5  # Con varios workers, cada cuánto publica cada uno sus stats
 
     class Config:
         env_file = ".env"
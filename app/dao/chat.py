@@ -1,11 +1,154 @@
 # app/dao/chat.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.db.migrations import has_session_unique_index
+from app.db.session import SessionLocal
 from app.models.chat import ChatSession, ChatMessage
 from app.schemas.chat import ChatSessionCreate, ChatMessageCreate
+from app.utils.cache import TTLCache
+from app.utils.metrics import CHAT_MESSAGES_DROPPED
+import logging
+import threading
 import uuid
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBuffer:
+    """
+    Persistencia diferida (write-behind) de mensajes de chat.
+
+    Los mensajes se encolan en memoria y un hilo en segundo plano los inserta por lotes
+    cuando la cola llega a `batch_size` o cada `flush_interval` segundos. Los ids generados
+    por la base de datos se obtienen con RETURNING y se asignan a los objetos encolados.
+    """
+
+    def __init__(self, session_factory: sessionmaker, batch_size: int = 50, flush_interval: float = 0.5):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: list[ChatMessage] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, db_message: ChatMessage):
+        with self._lock:
+            self._pending.append(db_message)
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Inserta de inmediato todos los mensajes pendientes. Retorna cuántos se guardaron.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            rows = [
+                {
+                    "session_id": m.session_id,
+                    "sender": m.sender,
+                    "content": m.content,
+                    "message_type": m.message_type,
+                    "created_at": m.created_at,
+                }
+                for m in batch
+            ]
+            with self.session_factory() as db:
+                try:
+                    ids = db.execute(
+                        insert(ChatMessage).returning(ChatMessage.id, sort_by_parameter_order=True), rows
+                    ).scalars().all()
+                    db.commit()
+                except IntegrityError:
+                    # Alguna fila es inválida (p. ej. sesión inexistente): se reintenta fila por
+                    # fila para descartar solo esas y no todo el lote
+                    db.rollback()
+                    ids = self._insert_each(db, batch, rows)
+                except Exception as e:
+                    db.rollback()
+                    logger.warning("Error guardando %d mensajes, se reintentará: %s", len(batch), e)
+                    with self._lock:
+                        self._pending[:0] = batch
+                    return 0
+
+            saved = 0
+            for message, message_id in zip(batch, ids):
+                if message_id is not None:
+                    message.id = message_id
+                    saved += 1
+            return saved
+
+    def _insert_each(self, db: Session, batch: list[ChatMessage], rows: list[dict]) -> list[int | None]:
+        """
+        Inserta las filas una a una. Retorna los ids en orden, con None en las descartadas por
+        datos inválidos; si falla la conexión, las filas que faltan vuelven a la cola.
+        """
+        ids = []
+        for index, row in enumerate(rows):
+            try:
+                ids.append(db.execute(insert(ChatMessage).returning(ChatMessage.id), row).scalar_one())
+                db.commit()
+            except IntegrityError as e:
+                db.rollback()
+                ids.append(None)
+                CHAT_MESSAGES_DROPPED.inc()
+                logger.error("Mensaje inválido de la sesión %s, se descarta: %s", row["session_id"], e)
+            except Exception as e:
+                db.rollback()
+                logger.warning("Error guardando %d mensajes, se reintentará: %s", len(rows) - index, e)
+                with self._lock:
+                    self._pending[:0] = batch[index:]
+                break
+        return ids
+
+    def close(self):
+        """
+        Detiene el hilo de fondo y guarda lo pendiente (llamar al apagar la aplicación).
+        """
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+message_buffer = MessageWriteBuffer(
+    SessionLocal,
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    flush_interval=settings.CHAT_WRITE_FLUSH_SECONDS,
+)
+
+# (user_id, channel) -> session_id de las sesiones resueltas recientemente
+session_cache = TTLCache(maxsize=settings.SESSION_CACHE_SIZE, ttl=settings.SESSION_CACHE_TTL_SECONDS)
+
+# Dialectos con INSERT ... ON CONFLICT ... RETURNING
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
 class ChatDAO:
     @staticmethod
     def get_session_by_user_and_channel(db: Session, user_id: str, channel: str):
@@ -25,27 +168,146 @@ class ChatDAO:
         db.commit()
         return new_session
 
+    @staticmethod
+    async def aget_or_create_session(db: AsyncSession, user_id: str, channel: str) -> str:
+        """
+        Retorna el session_id del usuario en el canal, creando la sesión si no existe.
+
+        Es atómico gracias al índice único (user_id, channel): dos mensajes simultáneos de un
+        usuario nuevo obtienen la misma sesión. Cuesta un solo round-trip (upsert con
+        RETURNING) o ninguno si la sesión está en la caché en memoria.
+        """
+        key = (user_id, channel)
+        if (session_id := session_cache.get(key)) is not None:
+            return session_id
+
+        stmt = None
+        if await ChatDAO._asession_index_ready(db):
+            stmt = ChatDAO._upsert_session(db.get_bind().dialect.name, user_id, channel)
+        if stmt is not None:
+            session_id = (await db.execute(stmt)).scalar_one()
+            await db.commit()
+        else:
+            session_id = (await db.execute(ChatDAO._session_id_query(user_id, channel))).scalar()
+            if session_id is None:
+                try:
+                    session_id = str(uuid.uuid4())
+                    db.add(ChatSession(session_id=session_id, user_id=user_id, channel=channel))
+                    await db.commit()
+                except IntegrityError:
+                    # Otra petición la creó al mismo tiempo
+                    await db.rollback()
+                    session_id = (await db.execute(ChatDAO._session_id_query(user_id, channel))).scalar_one()
+
+        session_cache.set(key, session_id)
+        return session_id
+
+    # None hasta revisar el esquema; False si falta el índice único (base sin migrar)
+    _session_index: bool | None = None
+
+    @staticmethod
+    async def _asession_index_ready(db: AsyncSession) -> bool:
+        """
+        True si existe el índice único (user_id, channel) que necesita ON CONFLICT. Sin él
+        (base creada antes del índice y sin `upgrade_schema`) se usa SELECT y luego INSERT.
+        """
+        if ChatDAO._session_index is None:
+            ChatDAO._session_index = await db.run_sync(lambda sync_db: has_session_unique_index(sync_db.connection()))
+            if not ChatDAO._session_index:
+                logger.warning("Falta el índice único de chat_sessions: las sesiones se crean sin upsert")
+        return ChatDAO._session_index
+
+    @staticmethod
+    def _upsert_session(dialect: str, user_id: str, channel: str):
+        """
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING session_id, o None si el dialecto no lo soporta.
+        """
+        upsert = _UPSERT_INSERTS.get(dialect)
+        if upsert is None:
+            return None
+        stmt = upsert(ChatSession).values(session_id=str(uuid.uuid4()), user_id=user_id, channel=channel)
+        # DO UPDATE (y no DO NOTHING) para que RETURNING devuelva también la fila existente
+        return stmt.on_conflict_do_update(
+            index_elements=[ChatSession.user_id, ChatSession.channel],
+            set_={"channel": stmt.excluded.channel},
+        ).returning(ChatSession.session_id)
+
+    @staticmethod
+    def _session_id_query(user_id: str, channel: str):
+        return select(ChatSession.session_id).where(ChatSession.user_id == user_id, ChatSession.channel == channel)
+
     @staticmethod
     def get_session_by_id(db: Session, session_id: str):
         return db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
 
     @staticmethod
-    def create_message(db: Session, message: ChatMessageCreate, session_id: str):
+    async def aget_session_by_id(db: AsyncSession, session_id: str):
+        return (await db.execute(select(ChatSession).where(ChatSession.session_id == session_id))).scalar()
+
+    @staticmethod
+    def create_message(db: Session, message: ChatMessageCreate, session_id: str, durable: bool = None):
         """
         Crea un nuevo mensaje de chat y lo asocia a una sesión mediante session_id.
+
+        Con `durable=False` (o `CHAT_WRITE_BEHIND` activo y `durable` sin indicar) el mensaje
+        se encola para inserción por lotes y su `id` se asigna cuando el lote se guarda.
         """
-        db_message = ChatMessage(
+        if durable is None:
+            durable = not settings.CHAT_WRITE_BEHIND
+
+        db_message = ChatDAO._new_message(message, session_id)
+        if not durable:
+            message_buffer.add(db_message)
+            return db_message
+
+        db.add(db_message)
+        db.flush()  # El INSERT obtiene el id con RETURNING
+        db.expunge(db_message)  # Evita que el commit lo expire y obligue a un SELECT extra
+        db.commit()
+        return db_message  # Return the full ChatMessage, which includes the ID, session_id, and created_at
+
+    @staticmethod
+    async def acreate_message(db: AsyncSession, message: ChatMessageCreate, session_id: str, durable: bool = None):
+        """
+        Versión asíncrona de `create_message` (no bloquea el event loop).
+        """
+        if durable is None:
+            durable = not settings.CHAT_WRITE_BEHIND
+
+        db_message = ChatDAO._new_message(message, session_id)
+        if not durable:
+            message_buffer.add(db_message)
+            return db_message
+
+        db.add(db_message)
+        await db.flush()
+        db.expunge(db_message)
+        await db.commit()
+        return db_message
+
+    @staticmethod
+    def _new_message(message: ChatMessageCreate, session_id: str) -> ChatMessage:
+        return ChatMessage(
             sender=message.sender,
             content=message.content,
             message_type=message.message_type,
             session_id=session_id,  # Usar el session_id correcto
             created_at=datetime.utcnow()
         )
-        db.add(db_message)
-        db.commit()
-        db.refresh(db_message)
-        return db_message  # Return the full ChatMessage, which includes the ID, session_id, and created_at
 
     @staticmethod
-    def get_chat_history(db: Session, session: ChatSession, limit: int = 10):
-        return db.query(ChatMessage).filter(ChatMessage.session_id == session.session_id).order_by(ChatMessage.created_at.desc()).limit(limit).all()
\ No newline at end of file
+    def get_chat_history(db: Session, session_id: str, limit: int = 10, before: tuple[datetime, int] = None):
+        """
+        Retorna hasta `limit` mensajes de la sesión, del más reciente al más antiguo.
+
+        Paginación por cursor (keyset): `before` es el (created_at, id) del último mensaje de la
+        página anterior, así cada página cuesta lo mismo sin importar qué tan larga sea la conversación.
+        """
+        return db.execute(ChatDAO._history_query(session_id, limit, before)).scalars().all()
+
+    @staticmethod
+    def _history_query(session_id: str, limit: int, before: tuple[datetime, int] = None):
+        query = select(ChatMessage).where(ChatMessage.session_id == session_id)
+        if before is not None:
+            query = query.where(tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(*before))
+        return query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit)
@@ -0,0 +1,94 @@
+# app/dao/lease.py
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.lease import SessionLease
+
+# Dialectos con INSERT ... ON CONFLICT DO UPDATE ... WHERE ... RETURNING
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class LeaseDAO:
+    @staticmethod
+    async def aacquire(db: AsyncSession, session_id: str, owner: str, ttl_seconds: float) -> int | None:
+        """
+        Toma (o renueva) el lease de la sesión si está libre, vencido o ya es de `owner`.
+        Retorna la `generation` del lease si se obtuvo, o None si otro worker lo tiene.
+        Es un solo round-trip (upsert condicional con RETURNING).
+        """
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=ttl_seconds)
+
+        upsert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        if upsert is not None:
+            stmt = upsert(SessionLease).values(session_id=session_id, owner=owner, expires_at=expires_at, generation=1)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SessionLease.session_id],
+                set_={
+                    "owner": stmt.excluded.owner,
+                    "expires_at": stmt.excluded.expires_at,
+                    # Cambio de dueño: el estado en memoria de los demás workers puede estar desactualizado
+                    "generation": case(
+                        (SessionLease.owner == stmt.excluded.owner, SessionLease.generation),
+                        else_=SessionLease.generation + 1,
+                    ),
+                },
+                where=(SessionLease.expires_at < now) | (SessionLease.owner == stmt.excluded.owner),
+            ).returning(SessionLease.generation)
+            generation = (await db.execute(stmt)).scalar()
+            await db.commit()
+            return generation
+
+        # Otros dialectos: tomar un lease vencido o propio, o crearlo
+        result = await db.execute(
+            update(SessionLease)
+            .where(SessionLease.session_id == session_id)
+            .where((SessionLease.expires_at < now) | (SessionLease.owner == owner))
+            .values(
+                expires_at=expires_at,
+                generation=case((SessionLease.owner == owner, SessionLease.generation), else_=SessionLease.generation + 1),
+                owner=owner,
+            )
+            .returning(SessionLease.generation)
+        )
+        generation = result.scalar()
+        if generation is None:
+            db.add(SessionLease(session_id=session_id, owner=owner, expires_at=expires_at, generation=1))
+            generation = 1
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Otro worker lo creó al mismo tiempo
+            await db.rollback()
+            generation = None
+        return generation
+
+    @staticmethod
+    async def arenew(db: AsyncSession, session_id: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Extiende el lease mientras el worker sigue procesando. Retorna False si ya no es el dueño.
+        """
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        result = await db.execute(
+            update(SessionLease)
+            .where(SessionLease.session_id == session_id, SessionLease.owner == owner)
+            .values(expires_at=expires_at)
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def arelease(db: AsyncSession, session_id: str, owner: str):
+        """
+        Libera el lease marcándolo como vencido. La fila se conserva con su dueño y generación,
+        así el mismo worker puede retomarla sin invalidar su estado en memoria.
+        """
+        await db.execute(
+            update(SessionLease)
+            .where(SessionLease.session_id == session_id, SessionLease.owner == owner)
+            .values(expires_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
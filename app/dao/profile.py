@@ -0,0 +1,112 @@
+# app/dao/profile.py
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.chat import UserProfile as UserProfileModel
+from app.schemas.chat import UserProfile
+from app.utils.cache import TTLCache
+
+# session_id -> UserProfile de las sesiones usadas recientemente (también perfiles vacíos)
+profile_cache = TTLCache(maxsize=settings.SESSION_CACHE_SIZE, ttl=settings.SESSION_CACHE_TTL_SECONDS)
+
+# Dialectos con INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+EMPTY_PROFILE = UserProfile()
+
+
+class ProfileDAO:
+    @staticmethod
+    def _from_row(row: UserProfileModel | None) -> UserProfile:
+        if row is None:
+            return EMPTY_PROFILE
+        return UserProfile(
+            latitude=row.latitude,
+            longitude=row.longitude,
+            crops=[crop for crop in (row.crops or "").split(",") if crop],
+            preferred_period=row.preferred_period,
+        )
+
+    @staticmethod
+    def _values(profile: UserProfile) -> dict:
+        return {
+            "latitude": profile.latitude,
+            "longitude": profile.longitude,
+            "crops": ",".join(profile.crops) or None,
+            "preferred_period": profile.preferred_period,
+        }
+
+    @staticmethod
+    def get_profile(db: Session, session_id: str) -> UserProfile:
+        """
+        Perfil del usuario de la sesión (vacío si aún no tiene). Sin consulta si está en la caché.
+        """
+        if (profile := profile_cache.get(session_id)) is not None:
+            return profile
+        row = db.execute(select(UserProfileModel).where(UserProfileModel.session_id == session_id)).scalar()
+        profile = ProfileDAO._from_row(row)
+        profile_cache.set(session_id, profile)
+        return profile
+
+    @staticmethod
+    async def aget_profile(db: AsyncSession, session_id: str) -> UserProfile:
+        """
+        Versión asíncrona de `get_profile`.
+        """
+        if (profile := profile_cache.get(session_id)) is not None:
+            return profile
+        row = (await db.execute(select(UserProfileModel).where(UserProfileModel.session_id == session_id))).scalar()
+        profile = ProfileDAO._from_row(row)
+        profile_cache.set(session_id, profile)
+        return profile
+
+    @staticmethod
+    def _upsert(dialect: str, session_id: str, profile: UserProfile):
+        upsert = _UPSERT_INSERTS.get(dialect)
+        if upsert is None:
+            return None
+        values = ProfileDAO._values(profile)
+        stmt = upsert(UserProfileModel).values(session_id=session_id, **values)
+        return stmt.on_conflict_do_update(index_elements=[UserProfileModel.session_id], set_=values)
+
+    @staticmethod
+    def update_profile(db: Session, session_id: str, **changes) -> UserProfile:
+        """
+        Actualiza los campos dados del perfil (latitude, longitude, crops, preferred_period).
+        No escribe nada si los valores no cambian.
+        """
+        current = ProfileDAO.get_profile(db, session_id)
+        profile = current.model_copy(update=changes)
+        if profile == current:
+            return current
+
+        stmt = ProfileDAO._upsert(db.get_bind().dialect.name, session_id, profile)
+        if stmt is not None:
+            db.execute(stmt)
+        else:
+            db.merge(UserProfileModel(session_id=session_id, **ProfileDAO._values(profile)))
+        db.commit()
+        profile_cache.set(session_id, profile)
+        return profile
+
+    @staticmethod
+    async def aupdate_profile(db: AsyncSession, session_id: str, **changes) -> UserProfile:
+        """
+        Versión asíncrona de `update_profile`.
+        """
+        current = await ProfileDAO.aget_profile(db, session_id)
+        profile = current.model_copy(update=changes)
+        if profile == current:
+            return current
+
+        stmt = ProfileDAO._upsert(db.get_bind().dialect.name, session_id, profile)
+        if stmt is not None:
+            await db.execute(stmt)
+        else:
+            await db.merge(UserProfileModel(session_id=session_id, **ProfileDAO._values(profile)))
+        await db.commit()
+        profile_cache.set(session_id, profile)
+        return profile
@@ -0,0 +1,105 @@
+# app/dao/webhook.py
+
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.webhook import ProcessedWebhookMessage
+from app.utils.cache import TTLCache
+
+# Ids vistos recientemente: los reintentos inmediatos se descartan sin tocar la base de datos
+processed_cache = TTLCache(
+    maxsize=settings.WEBHOOK_DEDUP_CACHE_SIZE,
+    ttl=min(settings.WEBHOOK_DEDUP_TTL_SECONDS, 3600),
+)
+
+# Dialectos con INSERT ... ON CONFLICT DO NOTHING ... RETURNING
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+_PURGE_INTERVAL_SECONDS = 600
+_last_purge = 0.0
+
+
+class WebhookDAO:
+    @staticmethod
+    async def amark_processed(db: AsyncSession, message_id: str, channel: str = "whatsapp") -> bool:
+        """
+        Registra el id del mensaje entrante. Retorna True si es la primera vez que se recibe
+        y False si es un reenvío que ya fue (o está siendo) procesado.
+        """
+        if message_id in processed_cache:
+            return False
+
+        stmt = WebhookDAO._insert_new(db.get_bind().dialect.name, message_id, channel)
+        if stmt is not None:
+            is_new = (await db.execute(stmt)).scalar() is not None
+            await db.commit()
+        else:
+            try:
+                db.add(ProcessedWebhookMessage(message_id=message_id, channel=channel))
+                await db.commit()
+                is_new = True
+            except IntegrityError:
+                await db.rollback()
+                is_new = False
+
+        processed_cache.set(message_id, True)
+        await WebhookDAO._amaybe_purge(db)
+        return is_new
+
+    @staticmethod
+    def _insert_new(dialect: str, message_id: str, channel: str):
+        """
+        INSERT ... ON CONFLICT DO NOTHING ... RETURNING, o None si el dialecto no lo soporta.
+        """
+        upsert = _UPSERT_INSERTS.get(dialect)
+        if upsert is None:
+            return None
+        return (
+            upsert(ProcessedWebhookMessage)
+            .values(message_id=message_id, channel=channel)
+            .on_conflict_do_nothing(index_elements=[ProcessedWebhookMessage.message_id])
+            .returning(ProcessedWebhookMessage.message_id)
+        )
+
+    @staticmethod
+    async def aunmark_processed(db: AsyncSession, message_ids: list[str]):
+        """
+        Olvida los ids (p. ej. si los mensajes no se pudieron encolar) para que el reenvío sí se procese.
+        """
+        for message_id in message_ids:
+            processed_cache.pop(message_id)
+        await db.execute(delete(ProcessedWebhookMessage).where(ProcessedWebhookMessage.message_id.in_(message_ids)))
+        await db.commit()
+
+    @staticmethod
+    async def apurge_expired(db: AsyncSession, ttl_seconds: int = None) -> int:
+        """
+        Borra los ids más antiguos que el TTL configurado. Retorna cuántos se borraron.
+        """
+        result = await db.execute(WebhookDAO._purge_query(ttl_seconds))
+        await db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def _purge_query(ttl_seconds: int = None):
+        ttl_seconds = ttl_seconds or settings.WEBHOOK_DEDUP_TTL_SECONDS
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+        return delete(ProcessedWebhookMessage).where(ProcessedWebhookMessage.received_at < cutoff)
+
+    @staticmethod
+    def _purge_due() -> bool:
+        global _last_purge
+        now = time.monotonic()
+        if now - _last_purge > _PURGE_INTERVAL_SECONDS:
+            _last_purge = now
+            return True
+        return False
+
+    @staticmethod
+    async def _amaybe_purge(db: AsyncSession):
+        if WebhookDAO._purge_due():
+            await WebhookDAO.apurge_expired(db)
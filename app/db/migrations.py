@@ -0,0 +1,67 @@
+# app/db/migrations.py
+
+import logging
+from sqlalchemy import delete, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+from app.models.chat import ChatMessage, ChatSession, UserProfile
+
+logger = logging.getLogger(__name__)
+
+SESSION_INDEX = next(i for i in ChatSession.__table__.indexes if i.name == "ix_chat_sessions_user_channel")
+
+
+def has_session_unique_index(connection: Connection) -> bool:
+    """
+    True si chat_sessions tiene el índice (o restricción) único sobre (user_id, channel)
+    que necesita el upsert de sesiones.
+    """
+    inspector = inspect(connection)
+    columns = set(SESSION_INDEX.columns.keys())
+    indexes = [i["column_names"] for i in inspector.get_indexes(ChatSession.__tablename__) if i.get("unique")]
+    constraints = [c["column_names"] for c in inspector.get_unique_constraints(ChatSession.__tablename__)]
+    return any(set(names) == columns for names in indexes + constraints)
+
+
+def _merge_duplicate_sessions(connection: Connection) -> int:
+    """
+    Deja una sola sesión por (user_id, channel): conserva la más antigua y le pasa los mensajes
+    (y el perfil, si no tiene uno) de las demás antes de borrarlas. Retorna cuántas se borraron.
+    """
+    rows = connection.execute(
+        select(ChatSession.user_id, ChatSession.channel, ChatSession.session_id)
+        .order_by(ChatSession.user_id, ChatSession.channel, ChatSession.created_at, ChatSession.session_id)
+    ).all()
+    survivors: dict[tuple[str, str], str] = {}
+    duplicates: dict[str, list[str]] = {}
+    for user_id, channel, session_id in rows:
+        keep = survivors.setdefault((user_id, channel), session_id)
+        if keep != session_id:
+            duplicates.setdefault(keep, []).append(session_id)
+
+    for keep, others in duplicates.items():
+        connection.execute(update(ChatMessage).where(ChatMessage.session_id.in_(others)).values(session_id=keep))
+        profiles = connection.execute(
+            select(UserProfile.session_id).where(UserProfile.session_id.in_([keep, *others]))
+            .order_by(UserProfile.updated_at.desc())
+        ).scalars().all()
+        if profiles and keep not in profiles:
+            # El perfil más reciente de las sesiones duplicadas pasa a la que se conserva
+            connection.execute(update(UserProfile).where(UserProfile.session_id == profiles[0]).values(session_id=keep))
+        connection.execute(delete(UserProfile).where(UserProfile.session_id.in_(others)))
+        connection.execute(delete(ChatSession).where(ChatSession.session_id.in_(others)))
+    return sum(len(others) for others in duplicates.values())
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Cambios de esquema que `create_all` no aplica a tablas existentes (llamar después de create_all).
+
+    Bases creadas antes del índice único (user_id, channel) pueden tener sesiones duplicadas:
+    se fusionan y luego se crea el índice, en una sola transacción.
+    """
+    with engine.begin() as connection:
+        if has_session_unique_index(connection):
+            return
+        merged = _merge_duplicate_sessions(connection)
+        SESSION_INDEX.create(connection)
+    logger.info("Índice único de sesiones creado (%d sesiones duplicadas fusionadas)", merged)
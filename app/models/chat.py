@@ -1,21 +1,30 @@
 # app/models/chat.py
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, func, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, func, Integer, Index, Float
 from sqlalchemy.orm import relationship
 from app.db.base_class import Base
 
 class ChatSession(Base):
     __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        # Una sola sesión por usuario y canal; también sirve para buscar por user_id
+        Index('ix_chat_sessions_user_channel', 'user_id', 'channel', unique=True),
+    )
     session_id = Column(String, primary_key=True, index=True, unique=True, nullable=False)  # Clave primaria
-    user_id = Column(String, index=True, nullable=False)  # ID único por canal (número para WhatsApp, ID de usuario para web)
+    user_id = Column(String, nullable=False)  # ID único por canal (número para WhatsApp, ID de usuario para web)
     channel = Column(String, nullable=False)  # Canal de comunicación (ej: "whatsapp", "web")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     messages = relationship("ChatMessage", back_populates="session")
+    profile = relationship("UserProfile", back_populates="session", uselist=False)
 
 
 class ChatMessage(Base):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        # Historial por sesión ordenado y paginado por (created_at, id) sin ordenar en memoria
+        Index('ix_chat_messages_session_created_id', 'session_id', 'created_at', 'id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, ForeignKey('chat_sessions.session_id'), nullable=False)  # Relación con ChatSession
     sender = Column(String, index=True)
@@ -24,3 +33,18 @@ class ChatMessage(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     session = relationship("ChatSession", back_populates="messages")
+
+
+class UserProfile(Base):
+    """
+    Datos del agricultor que el agente recuerda entre conversaciones (uno por sesión).
+    """
+    __tablename__ = 'user_profiles'
+    session_id = Column(String, ForeignKey('chat_sessions.session_id'), primary_key=True)
+    latitude = Column(Float)  # Última ubicación compartida
+    longitude = Column(Float)
+    crops = Column(String)  # Cultivos separados por coma
+    preferred_period = Column(String)  # 'tomorrow', 'week', 'month' o 'quarter'
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    session = relationship("ChatSession", back_populates="profile")
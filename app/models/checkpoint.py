@@ -0,0 +1,35 @@
+# app/models/checkpoint.py
+
+from sqlalchemy import Column, String, Integer, LargeBinary
+from app.db.base_class import Base
+
+
+class AgentCheckpoint(Base):
+    """
+    Estado del grafo de LangGraph (checkpoint) de una conversación, serializado en binario.
+    """
+    __tablename__ = 'agent_checkpoints'
+    thread_id = Column(String, primary_key=True)  # Igual al session_id de ChatSession
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)  # uuid6: el orden lexicográfico es cronológico
+    parent_checkpoint_id = Column(String, nullable=True)
+    type = Column(String)
+    checkpoint = Column(LargeBinary)
+    metadata_type = Column(String)
+    metadata_ = Column("metadata", LargeBinary)
+
+
+class AgentCheckpointWrite(Base):
+    """
+    Escrituras pendientes (resultados de tareas) asociadas a un checkpoint.
+    """
+    __tablename__ = 'agent_checkpoint_writes'
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    task_id = Column(String, primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)
+    type = Column(String)
+    value = Column(LargeBinary)
+    task_path = Column(String, default="")
@@ -0,0 +1,16 @@
+# app/models/lease.py
+
+from sqlalchemy import Column, String, DateTime, Integer
+from app.db.base_class import Base
+
+
+class SessionLease(Base):
+    """
+    Lease por conversación: solo el worker dueño (`owner`) procesa turnos de la sesión hasta `expires_at`.
+    `generation` aumenta cada vez que la sesión cambia de dueño.
+    """
+    __tablename__ = 'session_leases'
+    session_id = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)  # host:pid:id del worker
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    generation = Column(Integer, nullable=False, default=1)
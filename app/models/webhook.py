@@ -0,0 +1,14 @@
+# app/models/webhook.py
+
+from sqlalchemy import Column, String, DateTime, func
+from app.db.base_class import Base
+
+
+class ProcessedWebhookMessage(Base):
+    """
+    Ids de mensajes entrantes ya procesados (para ignorar reenvíos del webhook).
+    """
+    __tablename__ = 'processed_webhook_messages'
+    message_id = Column(String, primary_key=True)  # id del mensaje de WhatsApp (wamid...)
+    channel = Column(String, nullable=False)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
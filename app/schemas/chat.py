@@ -1,7 +1,7 @@
 # app/schemas/chat.py
 
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 class ChatMessageBase(BaseModel):
@@ -20,6 +20,10 @@ class ChatMessage(ChatMessageBase):
     class Config:
         from_attributes = True  # Use this instead of 'orm_mode = True'
 
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatMessage]
+    next_cursor: Optional[str] = None  # Enviar como `cursor` para obtener la página siguiente
+
 class ChatSessionBase(BaseModel):
     pass
 
@@ -33,3 +37,25 @@ class ChatSession(ChatSessionBase):
 
     class Config:
         from_attributes = True  # Use this instead of 'orm_mode = True'
+
+class UserProfile(BaseModel):
+    """
+    Perfil del usuario que se inyecta en la configuración del agente (ver `app.agent.agent`).
+    """
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    crops: List[str] = []
+    preferred_period: Optional[str] = None
+
+    @property
+    def location(self) -> Optional[tuple[float, float]]:
+        if self.latitude is None or self.longitude is None:
+            return None
+        return self.latitude, self.longitude
+
+    @property
+    def is_empty(self) -> bool:
+        return self.location is None and not self.crops and self.preferred_period is None
+
+    class Config:
+        frozen = True  # Se comparte entre peticiones desde la caché de perfiles
@@ -1,14 +1,20 @@
 # app/services/chat.py
 
+import base64
+import uuid
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.dao.chat import ChatDAO
-from app.schemas.chat import ChatMessageCreate, ChatSessionCreate
-from app.agent.agent import process_message
+from app.dao.profile import ProfileDAO
+from app.schemas.chat import ChatMessage, ChatMessageCreate, ChatSessionCreate, ChatHistoryPage
+from app.agent.agent import astream_message, process_message
 
 class ChatService:
     @staticmethod
-    def create_session(db: Session):
-        return ChatDAO.create_session(db)
+    def create_session(db: Session, user_id: str = None):
+        # Web sessions are anonymous unless the caller identifies the user
+        return ChatDAO.create_session(db, user_id or str(uuid.uuid4()), "web")
 
     @staticmethod
     def send_message(db: Session, session_id: str, message: ChatMessageCreate):
@@ -16,7 +22,8 @@ class ChatService:
         user_message = ChatDAO.create_message(db, message, session_id)
         
         # Process the message with the agent and get a bot response
-        bot_response_content = process_message(message.content)
+        profile = ProfileDAO.get_profile(db, session_id)
+        bot_response_content = process_message(message.content, session_id, profile=profile)
         
         # Create a bot message
         bot_message = ChatMessageCreate(
@@ -25,12 +32,58 @@ class ChatService:
             message_type="bot"
         )
         
-        # Save the bot message in the database (or simulate the saving process)
-        bot_message_record = ChatDAO.create_message(db, bot_message)
+        # Save the bot message in the database (durable: the response needs its id)
+        bot_message_record = ChatDAO.create_message(db, bot_message, session_id, durable=True)
         
         # Return the bot message (complete ChatMessage schema)
         return bot_message_record  # This now includes the id, session_id, and created_at fields
 
     @staticmethod
-    def get_chat_history(db: Session, session_id: str):
-        return ChatDAO.get_chat_history(db, session_id)
+    async def stream_message(db: AsyncSession, session_id: str, message: ChatMessageCreate):
+        """
+        Like `send_message`, but returns an async iterator of the agent events (tokens, tool
+        progress) as they happen; the final "done" event carries the persisted bot message.
+        The session is checked before anything is streamed, so an unknown session raises
+        ValueError and can still be answered with a regular HTTP error.
+        """
+        if await ChatDAO.aget_session_by_id(db, session_id) is None:
+            raise ValueError("Chat session not found")
+        return ChatService._stream_events(db, session_id, message)
+
+    @staticmethod
+    async def _stream_events(db: AsyncSession, session_id: str, message: ChatMessageCreate):
+        await ChatDAO.acreate_message(db, message, session_id)
+
+        profile = await ProfileDAO.aget_profile(db, session_id)
+        async for event, data in astream_message(message.content, session_id, profile=profile):
+            if event == "done":
+                bot_message = ChatMessageCreate(
+                    sender="bot",
+                    content=data,
+                    message_type="bot"
+                )
+                bot_message_record = await ChatDAO.acreate_message(db, bot_message, session_id, durable=True)
+                data = ChatMessage.model_validate(bot_message_record).model_dump(mode="json")
+            yield event, data
+
+    @staticmethod
+    def encode_cursor(created_at: datetime, message_id: int) -> str:
+        return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{message_id}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime, int]:
+        try:
+            created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.fromisoformat(created_at), int(message_id)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def get_chat_history(db: Session, session_id: str, limit: int = 10, cursor: str = None) -> ChatHistoryPage:
+        before = ChatService.decode_cursor(cursor) if cursor else None
+        messages = ChatDAO.get_chat_history(db, session_id, limit=limit, before=before)
+        next_cursor = None
+        if len(messages) == limit:
+            last = messages[-1]
+            next_cursor = ChatService.encode_cursor(last.created_at, last.id)
+        return ChatHistoryPage(messages=messages, next_cursor=next_cursor)
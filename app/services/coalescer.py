@@ -0,0 +1,88 @@
+# app/services/coalescer.py
+
+import asyncio
+
+
+def merge_messages(messages: list[dict]) -> dict:
+    """
+    Une varios mensajes de WhatsApp de un mismo usuario en uno solo:
+    los textos se concatenan en orden y se conserva la última ubicación enviada.
+    `ids` guarda los ids de todos los mensajes del grupo.
+    """
+    if len(messages) == 1:
+        return messages[0]
+
+    texts = [m['text']['body'] for m in messages if m.get('text', {}).get('body')]
+    locations = [m['location'] for m in messages if 'location' in m]
+    merged = {
+        "from": messages[-1].get("from"),
+        "id": messages[-1].get("id"),
+        "ids": [m["id"] for m in messages if m.get("id")],
+        "type": "text",
+        "text": {"body": "\n".join(texts)},
+    }
+    if locations:
+        merged["location"] = locations[-1]
+    return merged
+
+
+class MessageCoalescer:
+    """
+    Agrupa los mensajes que un usuario envía seguidos para procesarlos en un solo turno del agente.
+
+    Cada mensaje nuevo reinicia la espera de `window` segundos; el grupo se despacha cuando
+    el usuario deja de escribir, al llegar a `max_messages` o tras `max_delay` segundos
+    desde el primer mensaje. Con `window=0` cada mensaje se despacha de inmediato.
+    """
+
+    def __init__(self, window: float = 2.0, max_delay: float = 6.0, max_messages: int = 10):
+        self.window = window
+        self.max_delay = max_delay
+        self.max_messages = max_messages
+        self._pending: dict = {}  # key -> {"messages", "first_at", "handle", "dispatch"}
+        self._tasks: set[asyncio.Task] = set()
+
+    def add(self, key, message: dict, dispatch):
+        """
+        Agrega un mensaje; `dispatch(mensaje_unido)` es una corrutina que procesa el grupo.
+        """
+        if self.window <= 0:
+            self._run(dispatch, message)
+            return
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = {"messages": [], "first_at": loop.time(), "handle": None, "dispatch": dispatch}
+        pending["messages"].append(message)
+
+        if pending["handle"] is not None:
+            pending["handle"].cancel()
+        if len(pending["messages"]) >= self.max_messages:
+            self._flush(key)
+            return
+        delay = min(self.window, pending["first_at"] + self.max_delay - loop.time())
+        pending["handle"] = loop.call_later(max(delay, 0), self._flush, key)
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending["handle"] is not None:
+            pending["handle"].cancel()
+        self._run(pending["dispatch"], merge_messages(pending["messages"]))
+
+    def _run(self, dispatch, message: dict):
+        task = asyncio.create_task(dispatch(message))
+        # Mantener una referencia para que la tarea no sea recolectada antes de terminar
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self, timeout: float = 10):
+        """
+        Despacha los grupos pendientes y espera (hasta `timeout`) a las tareas en curso.
+        """
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
@@ -0,0 +1,211 @@
+# app/services/crop_scoring.py
+
+import csv
+from dataclasses import dataclass
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+from app.services.forecast import Forecast
+
+# Tabla de tolerancias por cultivo y etapa: temperatura (°C), lluvia (mm/día), viento (m/s), humedad (%)
+TOLERANCES_PATH = Path(__file__).resolve().parent.parent / "data" / "crop_tolerances.csv"
+
+# Riesgos evaluados, en el orden de las columnas de la matriz de severidad
+RISKS = ("frio", "calor", "temperatura_suboptima", "sequia", "exceso_lluvia", "viento", "humedad_alta", "humedad_baja")
+# Unidad del valor pronosticado que dispara cada riesgo
+RISK_UNITS = ("°C", "°C", "°C", "mm", "mm", "m/s", "%", "%")
+# Puntos (de 100) que resta cada riesgo con severidad máxima
+RISK_WEIGHTS = np.array([30, 30, 10, 25, 25, 20, 20, 10], dtype=np.float32)
+# Severidad desde la que un riesgo se considera "alto" (0-1: moderado)
+HIGH_SEVERITY = 0.5
+
+# Índices de los parámetros y estadísticos en la matriz de pronósticos (F, 4, 3)
+T2M, PRECTOT, WS10M, RH2M = range(4)
+MIN, MAX, AVG = range(3)
+
+# Cultivos reconocidos (texto normalizado, sin tildes) -> nombre que se guarda en el perfil
+CROP_KEYWORDS = {
+    "maiz": "maíz", "corn": "maíz", "maize": "maíz",
+    "frijol": "fríjol", "frijoles": "fríjol", "frisol": "fríjol", "beans": "fríjol", "bean": "fríjol",
+    "cafe": "café", "coffee": "café",
+    "papa": "papa", "papas": "papa", "potato": "papa", "potatoes": "papa",
+    "arroz": "arroz", "rice": "arroz",
+    "platano": "plátano", "banano": "plátano", "banana": "plátano", "plantain": "plátano",
+    "yuca": "yuca", "cassava": "yuca",
+    "cana": "caña de azúcar", "sugarcane": "caña de azúcar",
+    "cacao": "cacao", "cocoa": "cacao",
+    "tomate": "tomate", "tomates": "tomate", "tomato": "tomate", "tomatoes": "tomate",
+    "aguacate": "aguacate", "avocado": "aguacate",
+    "trigo": "trigo", "wheat": "trigo",
+    "cebolla": "cebolla", "onion": "cebolla",
+    "zanahoria": "zanahoria", "carrot": "zanahoria",
+    "soya": "soya", "soja": "soya", "soy": "soya", "soybean": "soya",
+    "sorgo": "sorgo", "sorghum": "sorgo",
+    "algodon": "algodón", "cotton": "algodón",
+    "palma": "palma de aceite",
+    "mango": "mango", "naranja": "naranja", "orange": "naranja", "limon": "limón", "lemon": "limón",
+    "fresa": "fresa", "strawberry": "fresa", "mora": "mora", "blackberry": "mora",
+    "lechuga": "lechuga", "lettuce": "lechuga", "arveja": "arveja", "peas": "arveja",
+}
+
+
+def parse_crops(text: str) -> list[str]:
+    """
+    Cultivos conocidos mencionados en el mensaje normalizado, sin repetir y en orden.
+    """
+    crops = []
+    for word in text.split():
+        crop = CROP_KEYWORDS.get(word)
+        if crop and crop not in crops:
+            crops.append(crop)
+    return crops
+
+
+class RiskFlag(NamedTuple):
+    risk: str
+    level: str  # "moderado" o "alto"
+    value: float  # Valor pronosticado que dispara el riesgo
+    limit: float  # Umbral del cultivo
+
+
+@dataclass(frozen=True, slots=True)
+class CropImpact:
+    crop: str
+    stage: str  # Etapa evaluada, o "todas" si se tomó la peor de cada riesgo
+    score: int  # 0 (muy desfavorable) a 100 (condiciones ideales)
+    flags: tuple[RiskFlag, ...]
+
+
+class CropTable:
+    """
+    Tolerancias de la tabla CSV como columnas de NumPy (una fila por cultivo y etapa),
+    ordenadas por cultivo para agrupar las etapas de un mismo cultivo.
+    """
+
+    COLUMNS = ("t_min", "t_opt_min", "t_opt_max", "t_max", "rain_min", "rain_max", "wind_max", "rh_min", "rh_max")
+
+    def __init__(self, rows: list[dict]):
+        rows = sorted(rows, key=lambda row: row["crop"])
+        self.crops = np.array([row["crop"] for row in rows])
+        self.stages = np.array([row["stage"] for row in rows])
+        for column in self.COLUMNS:
+            setattr(self, column, np.array([float(row[column]) for row in rows], dtype=np.float32))
+        self.names = sorted(set(self.crops.tolist()))
+
+    @classmethod
+    def from_csv(cls, path: Path = TOLERANCES_PATH) -> "CropTable":
+        with open(path, encoding="utf-8", newline="") as file:
+            return cls(list(csv.DictReader(file)))
+
+    def __len__(self):
+        return len(self.crops)
+
+
+def forecast_matrix(forecasts: list[Forecast]) -> np.ndarray:
+    """
+    Pronósticos como matriz (F, parámetro, estadístico) con parámetros T2M, PRECTOT, WS10M, RH2M
+    y estadísticos min, max, average.
+    """
+    return np.array(
+        [[f.t2m, f.prectot, f.ws10m, f.rh2m] for f in forecasts],
+        dtype=np.float32,
+    ).reshape(len(forecasts), 4, 3)
+
+
+class CropImpactEngine:
+    """
+    Evalúa pronósticos contra las tolerancias de todos los cultivos en una sola pasada vectorizada:
+    la severidad de cada riesgo es una matriz (pronósticos, filas de la tabla, riesgos).
+
+    La severidad es 0 dentro de la tolerancia y crece con la distancia al umbral, relativa al
+    ancho del rango del cultivo (1 = el doble de lejos). El puntaje resta `RISK_WEIGHTS` según
+    la severidad de cada riesgo.
+    """
+
+    def __init__(self, table: CropTable):
+        self.table = table
+
+    def severities(self, forecasts: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Para una matriz de pronósticos (F, 4, 3) retorna tres matrices (F, N, riesgos):
+        la severidad de cada riesgo, el valor pronosticado que la produce y el umbral del cultivo.
+        """
+        t = self.table
+        # Columnas (F, 1) contra filas de la tabla (N,) -> (F, N) por broadcasting
+        temp_min, temp_max, temp_avg = (forecasts[:, T2M, i, None] for i in (MIN, MAX, AVG))
+        rain_max, rain_avg = forecasts[:, PRECTOT, MAX, None], forecasts[:, PRECTOT, AVG, None]
+        wind_max = forecasts[:, WS10M, MAX, None]
+        rh_avg = forecasts[:, RH2M, AVG, None]
+
+        cold_side = temp_avg < t.t_opt_min
+        suboptimal = np.where(cold_side, t.t_opt_min - temp_avg, np.maximum(temp_avg - t.t_opt_max, 0))
+        risks = (  # (severidad sin acotar, valor, umbral)
+            ((t.t_min - temp_min) / np.maximum(t.t_opt_min - t.t_min, 1), temp_min, t.t_min),
+            ((temp_max - t.t_max) / np.maximum(t.t_max - t.t_opt_max, 1), temp_max, t.t_max),
+            (suboptimal / np.maximum(t.t_opt_max - t.t_opt_min, 1), temp_avg, np.where(cold_side, t.t_opt_min, t.t_opt_max)),
+            ((t.rain_min - rain_avg) / np.maximum(t.rain_min, 0.1), rain_avg, t.rain_min),
+            ((rain_max - t.rain_max) / t.rain_max, rain_max, t.rain_max),
+            ((wind_max - t.wind_max) / t.wind_max, wind_max, t.wind_max),
+            ((rh_avg - t.rh_max) / np.maximum(100 - t.rh_max, 1), rh_avg, t.rh_max),
+            ((t.rh_min - rh_avg) / t.rh_min, rh_avg, t.rh_min),
+        )
+        shape = (len(forecasts), len(t))
+        severity, values, limits = (
+            np.stack([np.broadcast_to(risk[i], shape) for risk in risks], axis=-1) for i in range(3)
+        )
+        return np.clip(severity, 0, 1), values, limits
+
+    def _rows(self, crops: list[str] | None, stage: str | None) -> np.ndarray:
+        mask = np.ones(len(self.table), dtype=bool)
+        if crops:
+            mask &= np.isin(self.table.crops, crops)
+        if stage:
+            # Cultivos sin etapas en la tabla se evalúan con su fila "general"
+            mask &= (self.table.stages == stage) | (self.table.stages == "general")
+        return np.flatnonzero(mask)
+
+    def score_many(self, forecasts: list[Forecast], crops: list[str] | None = None, stage: str | None = None) -> list[list[CropImpact]]:
+        """
+        Impacto de cada pronóstico sobre los `crops` (todos si es None) ordenado del más
+        al menos favorable. Sin `stage` se toma, por cultivo, la peor severidad de cada riesgo
+        entre sus etapas.
+        """
+        rows = self._rows(crops, stage)
+        if not forecasts or not len(rows):
+            return [[] for _ in forecasts]
+
+        severity, values, limits = (m[:, rows] for m in self.severities(forecast_matrix(forecasts)))
+        names, stages = self.table.crops[rows], self.table.stages[rows]
+
+        # Las etapas de un cultivo son filas contiguas: por grupo, la peor severidad de cada
+        # riesgo y la fila (etapa) que la produce
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(rows)]
+        group_severity = np.maximum.reduceat(severity, starts, axis=1)
+        worst_row = np.stack([start + severity[:, start:end].argmax(axis=1) for start, end in zip(starts, ends)], axis=1)
+        scores = np.clip(100 - (group_severity * RISK_WEIGHTS).sum(axis=-1), 0, 100).round().astype(int)
+
+        results = []
+        for f in range(len(forecasts)):
+            impacts = []
+            for g, start in enumerate(starts):
+                single_stage = bool(stage) or ends[g] - start == 1
+                flags = []
+                for k in np.flatnonzero(group_severity[f, g]):
+                    row = worst_row[f, g, k]
+                    flags.append(RiskFlag(
+                        RISKS[k],
+                        "alto" if group_severity[f, g, k] >= HIGH_SEVERITY else "moderado",
+                        round(float(values[f, row, k]), 1),
+                        round(float(limits[f, row, k]), 1),
+                    ))
+                impacts.append(CropImpact(str(names[start]), str(stages[start]) if single_stage else "todas", int(scores[f, g]), tuple(flags)))
+            results.append(sorted(impacts, key=lambda impact: -impact.score))
+        return results
+
+    def score(self, forecast: Forecast, crops: list[str] | None = None, stage: str | None = None) -> list[CropImpact]:
+        return self.score_many([forecast], crops, stage)[0]
+
+
+# Motor compartido por el proceso (la tabla se carga una sola vez)
+crop_engine = CropImpactEngine(CropTable.from_csv())
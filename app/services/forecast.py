@@ -0,0 +1,293 @@
+# app/services/forecast.py
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import NamedTuple
+import requests
+from app.core.config import settings
+from app.utils.cache import SingleFlight, TTLCache
+from app.utils.http import get_async_client
+
+# Mapeo de periodos en inglés a los endpoints correspondientes
+PERIOD_ENDPOINTS = {
+    "tomorrow": "/api/Prediction/tomorrowPrediction",
+    "week": "/api/Prediction/weekPrediction",
+    "month": "/api/Prediction/monthPrediction",
+    "quarter": "/api/Prediction/cuarterPrediction"
+}
+
+# Tiempo (segundos) que una predicción se considera vigente según su periodo
+PERIOD_TTL_SECONDS = {
+    "tomorrow": 60 * 60,
+    "week": 3 * 60 * 60,
+    "month": 12 * 60 * 60,
+    "quarter": 24 * 60 * 60
+}
+
+Cell = tuple[int, int]
+
+
+class Stat(NamedTuple):
+    min: float
+    max: float
+    average: float
+
+
+@dataclass(frozen=True, slots=True)
+class Forecast:
+    """
+    Predicción de una celda para un periodo. Para "tomorrow" el API da un solo valor
+    por parámetro (min = max = average).
+    """
+    period: str
+    t2m: Stat  # Temperatura a 2 metros (°C)
+    prectot: Stat  # Precipitación total (mm/día)
+    ws10m: Stat  # Velocidad del viento a 10 metros (m/s)
+    rh2m: Stat  # Humedad relativa a 2 metros (%)
+    fetched_at: float  # time.monotonic() de la descarga
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+def grid_cell(lat: float, lon: float) -> Cell:
+    """
+    Cuantiza las coordenadas a una celda de `PREDICTIONS_CELL_DEGREES` grados.
+    """
+    size = settings.PREDICTIONS_CELL_DEGREES
+    return round(lat / size), round(lon / size)
+
+
+def cell_center(cell: Cell) -> dict:
+    size = settings.PREDICTIONS_CELL_DEGREES
+    return {"latitude": round(cell[0] * size, 6), "longitude": round(cell[1] * size, 6)}
+
+
+def parse_forecast(period: str, data: dict) -> Forecast:
+    """
+    Convierte la respuesta del API de predicciones (T2M, PRECTOT, WS10M, RH2M) en un `Forecast`.
+    """
+    if period == "tomorrow":
+        # La respuesta para mañana tiene 4 predicciones directas
+        stats = [Stat(float(v), float(v), float(v)) for v in data["predictions"]]
+    else:
+        # Las respuestas para semana, mes, trimestre tienen min, max, average
+        stats = [Stat(float(p["min"]), float(p["max"]), float(p["average"])) for p in data["predictions"]]
+    t2m, prectot, ws10m, rh2m = stats
+    return Forecast(period, t2m, prectot, ws10m, rh2m, time.monotonic())
+
+
+def format_forecast(forecast: Forecast) -> str:
+    """
+    Texto que recibe el agente para una predicción.
+    """
+    t2m, prectot, ws10m, rh2m = forecast.t2m, forecast.prectot, forecast.ws10m, forecast.rh2m
+    if forecast.period == "tomorrow":
+        return (
+            f"Prediction for tomorrow:\n"
+            f"- **T2M**: {t2m.average:.2f}°C 🌡️\n"
+            f"- **PRECTOT**: {prectot.average:.2f} mm ☔\n"
+            f"- **WS10M**: {ws10m.average:.2f} m/s 💨\n"
+            f"- **RH2M**: {rh2m.average:.2f}% 💧"
+        )
+
+    return (
+        f"{forecast.period.capitalize()} prediction:\n"
+        f"- **T2M**: Min: {t2m.min:.2f}°C, Max: {t2m.max:.2f}°C, Average: {t2m.average:.2f}°C 🌡️\n"
+        f"- **PRECTOT**: Min: {prectot.min:.2f} mm, Max: {prectot.max:.2f} mm, Average: {prectot.average:.2f} mm ☔\n"
+        f"- **WS10M**: Min: {ws10m.min:.2f} m/s, Max: {ws10m.max:.2f} m/s, Average: {ws10m.average:.2f} m/s 💨\n"
+        f"- **RH2M**: Min: {rh2m.min:.2f}%, Max: {rh2m.max:.2f}%, Average: {rh2m.average:.2f}% 💧"
+    )
+
+
+class ForecastService:
+    """
+    Predicciones por celda de la grilla lat/lon, descargadas antes de que el agricultor las pida.
+
+    - `aget_cell` descarga los cuatro periodos de una celda en paralelo (una sola vez aunque
+      lleguen varias peticiones a la vez) y los guarda en `store`, con el TTL de cada periodo.
+    - Las celdas consultadas recientemente (`track`) quedan activas durante `active_ttl` segundos;
+      una tarea en segundo plano las refresca cada `refresh_seconds`, antes de que venzan.
+    - La herramienta del agente solo consulta el store: la llamada HTTP queda fuera del turno.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        maxsize: int = 5000,
+        active_cells: int = 2000,
+        active_ttl: float = 24 * 3600,
+        refresh_seconds: float = 600,
+        concurrency: int = 8,
+    ):
+        self.base_url = base_url
+        self.refresh_seconds = refresh_seconds
+        self.concurrency = concurrency
+        self.store = TTLCache(maxsize=maxsize)  # (celda, periodo) -> Forecast
+        self._active = TTLCache(maxsize=active_cells, ttl=active_ttl)  # celda -> None
+        self._inflight = SingleFlight()
+        self._task: asyncio.Task | None = None
+        self._pending: set[asyncio.Task] = set()  # Descargas lanzadas por `track`
+        self._fetches = 0
+        self._errors = 0
+        self._refreshes = 0
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self.started:
+            return
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        tasks = [*self._pending, *([self._task] if self._task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def track(self, lat: float, lon: float) -> Cell:
+        """
+        Marca la celda de las coordenadas como activa y, si hay event loop, empieza a descargarla.
+        """
+        cell = grid_cell(lat, lon)
+        self._active.set(cell, None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return cell
+        if any(self.store.get((cell, period)) is None for period in PERIOD_ENDPOINTS):
+            task = loop.create_task(self._refresh_cell(cell))
+            # Mantener una referencia para que la tarea no sea recolectada antes de terminar
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        return cell
+
+    # -- Descarga ----------------------------------------------------------
+
+    def _url(self, period: str) -> str:
+        return f"{self.base_url}{PERIOD_ENDPOINTS[period]}"
+
+    def _store(self, cell: Cell, forecast: Forecast):
+        self._fetches += 1
+        self.store.set((cell, forecast.period), forecast, ttl=PERIOD_TTL_SECONDS[forecast.period])
+
+    async def _afetch(self, period: str, cell: Cell) -> Forecast:
+        response = await get_async_client().get(self._url(period), params=cell_center(cell), headers={"accept": "application/json"})
+        response.raise_for_status()
+        return parse_forecast(period, response.json())
+
+    async def _afetch_cell(self, cell: Cell, periods: tuple[str, ...]) -> dict[str, Forecast | Exception]:
+        results = await asyncio.gather(*(self._afetch(period, cell) for period in periods), return_exceptions=True)
+        forecasts = {}
+        for period, result in zip(periods, results):
+            if isinstance(result, Forecast):
+                self._store(cell, result)
+            else:
+                self._errors += 1
+            forecasts[period] = result
+        return forecasts
+
+    async def aget_cell(self, cell: Cell, periods: tuple[str, ...] = tuple(PERIOD_ENDPOINTS)) -> dict[str, Forecast | Exception]:
+        """
+        Descarga en paralelo los `periods` de la celda y los guarda en el store.
+        Retorna un `Forecast` o la excepción de la descarga por cada periodo.
+        """
+        return await self._inflight.ado((cell, periods), lambda: self._afetch_cell(cell, periods))
+
+    def _fetch(self, period: str, cell: Cell, timeout: float | None = None) -> Forecast:
+        response = requests.get(self._url(period), params=cell_center(cell), headers={"accept": "application/json"}, timeout=timeout or settings.TOOL_TIMEOUT_SECONDS)
+        response.raise_for_status()  # Verificar que no haya errores de HTTP
+        forecast = parse_forecast(period, response.json())
+        self._store(cell, forecast)
+        return forecast
+
+    # -- Consulta ----------------------------------------------------------
+
+    def get(self, lat: float, lon: float, period: str, timeout: float | None = None) -> Forecast:
+        """
+        Predicción del store o, si aún no está, descargada en este momento (ruta síncrona) con
+        `timeout` segundos como límite de la petición HTTP (por defecto `TOOL_TIMEOUT_SECONDS`).
+        Lanza `requests.exceptions.RequestException` si falla la descarga.
+        """
+        cell = self.track(lat, lon)
+        if (forecast := self.store.get((cell, period))) is not None:
+            return forecast
+        return self._inflight.do((cell, period), lambda: self._fetch(period, cell, timeout))
+
+    async def aget(self, lat: float, lon: float, period: str) -> Forecast:
+        """
+        Predicción del store o, si aún no está, descargada junto con los demás periodos de la celda.
+        Lanza `httpx.HTTPError` si falla la descarga.
+        """
+        cell = grid_cell(lat, lon)
+        self._active.set(cell, None)
+        if (forecast := self.store.get((cell, period))) is not None:
+            return forecast
+        result = (await self.aget_cell(cell))[period]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    # -- Refresco en segundo plano ---------------------------------------
+
+    def _due(self, cell: Cell) -> tuple[str, ...]:
+        """
+        Periodos de la celda que faltan o vencen antes del próximo refresco.
+        """
+        due = []
+        for period, ttl in PERIOD_TTL_SECONDS.items():
+            forecast = self.store.get((cell, period))
+            if forecast is None or forecast.age + self.refresh_seconds >= ttl:
+                due.append(period)
+        return tuple(due)
+
+    async def _refresh_cell(self, cell: Cell, semaphore: asyncio.Semaphore | None = None):
+        if not (periods := self._due(cell)):
+            return
+        try:
+            if semaphore is None:
+                await self.aget_cell(cell, periods)
+            else:
+                async with semaphore:
+                    await self.aget_cell(cell, periods)
+            self._refreshes += 1
+        except Exception as e:
+            print(f"Error refreshing forecast for cell {cell}: {e}")
+
+    async def refresh_active(self):
+        """
+        Refresca las celdas activas, hasta `concurrency` celdas a la vez.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._refresh_cell(cell, semaphore) for cell in self._active.keys()))
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh_active()
+            await asyncio.sleep(self.refresh_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "active_cells": len(self._active),
+            "stored": len(self.store),
+            "fetches": self._fetches,
+            "errors": self._errors,
+            "refreshes": self._refreshes,
+        }
+
+
+# Instancia compartida por el proceso (el refresco se inicia/detiene en el lifespan de main.py)
+forecast_service = ForecastService(
+    settings.PREDICTIONS_API_URL,
+    maxsize=settings.PREDICTIONS_CACHE_SIZE,
+    active_cells=settings.FORECAST_ACTIVE_CELLS,
+    active_ttl=settings.FORECAST_ACTIVE_TTL_SECONDS,
+    refresh_seconds=settings.FORECAST_REFRESH_SECONDS,
+    concurrency=settings.FORECAST_REFRESH_CONCURRENCY,
+)
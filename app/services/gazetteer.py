@@ -0,0 +1,161 @@
+# app/services/gazetteer.py
+
+import csv
+import math
+from pathlib import Path
+from typing import NamedTuple
+from app.agent.response_cache import normalize_text
+from app.core.config import settings
+from app.services.forecast import Cell, grid_cell
+
+# Municipios de Colombia (nombre, departamento y coordenadas de la cabecera municipal): capitales
+# y municipios principales. `GAZETTEER_PATH` permite usar el listado completo del DANE (DIVIPOLA)
+# con las mismas columnas; con este listado parcial, `GAZETTEER_MAX_KM` evita nombrar una
+# ubicación rural con un municipio lejano.
+MUNICIPALITIES_PATH = Path(__file__).resolve().parent.parent / "data" / "co_municipalities.csv"
+
+EARTH_RADIUS_KM = 6371.0
+# Kilómetros por grado de latitud (el de longitud se reduce con el coseno de la latitud)
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+class Place(NamedTuple):
+    name: str
+    department: str
+    latitude: float
+    longitude: float
+
+    @property
+    def label(self) -> str:
+        # "Bogotá D.C." y "Arauca" en lugar de repetir el municipio en el departamento
+        if self.department.startswith(self.name):
+            return self.department
+        return f"{self.name}, {self.department}"
+
+
+class ResolvedLocation(NamedTuple):
+    latitude: float
+    longitude: float
+    place: Place | None  # Municipio más cercano, o None si está a más de `max_km`
+    distance_km: float | None
+    cell: Cell  # Celda de la grilla de predicciones
+
+    def describe(self) -> str:
+        """
+        Texto corto del lugar para los mensajes ("Chía, Cundinamarca" o "a 12 km de Chía, Cundinamarca").
+        """
+        if self.place is None:
+            return ""
+        if self.distance_km < 5:
+            return self.place.label
+        return f"a {self.distance_km:.0f} km de {self.place.label}"
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+    """
+    Índice en memoria de municipios para geocodificación inversa sin llamadas externas.
+
+    Los municipios se agrupan en celdas de `cell_degrees` grados; `nearest` revisa anillos de
+    celdas alrededor del punto y se detiene cuando ningún anillo más lejano puede contener un
+    municipio más cercano que el mejor encontrado, así que cada consulta evalúa unas pocas
+    distancias en lugar de toda la tabla.
+    """
+
+    def __init__(self, places: list[Place], cell_degrees: float = 0.5):
+        self.places = places
+        self.cell_degrees = cell_degrees
+        self._cells: dict[Cell, list[Place]] = {}
+        self._names: dict[str, list[Place]] = {}  # Nombre normalizado -> municipios con ese nombre
+        for place in places:
+            self._cells.setdefault(self._cell(place.latitude, place.longitude), []).append(place)
+            self._names.setdefault(normalize_text(place.name), []).append(place)
+        rows, cols = zip(*self._cells) if self._cells else ((0,), (0,))
+        self._row_bounds, self._col_bounds = (min(rows), max(rows)), (min(cols), max(cols))
+        # Lado menor de una celda en km: el de longitud se encoge hacia los polos, así que se toma
+        # el de la latitud más alejada del ecuador que cubre el índice
+        max_lat = min(max(abs(b) + 1 for b in self._row_bounds) * cell_degrees, 89.0)
+        self._cell_km = cell_degrees * KM_PER_DEGREE * math.cos(math.radians(max_lat))
+
+    @classmethod
+    def from_csv(cls, path: Path = MUNICIPALITIES_PATH, **kwargs) -> "Gazetteer":
+        with open(path, encoding="utf-8", newline="") as file:
+            places = [
+                Place(row["name"], row["department"], float(row["latitude"]), float(row["longitude"]))
+                for row in csv.DictReader(file)
+            ]
+        return cls(places, **kwargs)
+
+    def __len__(self):
+        return len(self.places)
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def _ring(self, center: Cell, radius: int):
+        """
+        Celdas a distancia (Chebyshev) exactamente `radius` de `center`.
+        """
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, col + d
+            yield row + radius, col + d
+        for d in range(-radius + 1, radius):
+            yield row + d, col - radius
+            yield row + d, col + radius
+
+    def nearest(self, lat: float, lon: float, max_km: float | None = None) -> tuple[Place, float] | None:
+        """
+        Municipio más cercano a las coordenadas y su distancia en km,
+        o None si no hay ninguno a menos de `max_km`.
+        """
+        if not self.places:
+            return None
+        center = self._cell(lat, lon)
+        limit = max_km if max_km is not None else math.inf
+        # Anillo más lejano que todavía toca alguna celda con municipios
+        last_radius = max(abs(center[i] - b) for i, bounds in enumerate((self._row_bounds, self._col_bounds)) for b in bounds)
+        best, best_km = None, math.inf
+        for radius in range(last_radius + 1):
+            # Cualquier municipio del anillo `radius` está al menos a (radius - 1) celdas del punto
+            if (radius - 1) * self._cell_km > min(best_km, limit):
+                break
+            for cell in self._ring(center, radius):
+                for place in self._cells.get(cell, ()):
+                    distance = haversine_km(lat, lon, place.latitude, place.longitude)
+                    if distance < best_km:
+                        best, best_km = place, distance
+        if best is None or best_km > limit:
+            return None
+        return best, best_km
+
+    def find(self, name: str) -> Place | None:
+        """
+        Municipio por nombre, sin importar mayúsculas ni tildes ("bogota", "Chía, Cundinamarca").
+        Si varios municipios se llaman igual y no se indica el departamento, retorna el primero.
+        """
+        municipality, _, department = name.partition(",")
+        places = self._names.get(normalize_text(municipality), [])
+        if department := normalize_text(department):
+            places = [p for p in places if normalize_text(p.department).startswith(department)]
+        return places[0] if places else None
+
+    def resolve(self, lat: float, lon: float) -> ResolvedLocation:
+        """
+        Municipio más cercano (hasta `GAZETTEER_MAX_KM`) y celda de predicciones de las coordenadas.
+        """
+        found = self.nearest(lat, lon, settings.GAZETTEER_MAX_KM)
+        place, distance = found if found else (None, None)
+        return ResolvedLocation(lat, lon, place, distance, grid_cell(lat, lon))
+
+
+# Índice compartido por el proceso (el CSV se carga una sola vez)
+gazetteer = Gazetteer.from_csv(Path(settings.GAZETTEER_PATH) if settings.GAZETTEER_PATH else MUNICIPALITIES_PATH)
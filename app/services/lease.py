@@ -0,0 +1,110 @@
+# app/services/lease.py
+
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from app.core.config import settings
+from app.dao.lease import LeaseDAO
+from app.dao.profile import profile_cache
+from app.db.session import AsyncSessionLocal
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseUnavailable(Exception):
+    """
+    Otro worker tiene el lease de la sesión y no se liberó antes del `deadline`.
+    """
+
+
+def _invalidate_session_state(session_id: str):
+    # El perfil pudo cambiar en otro worker
+    profile_cache.pop(session_id)
+    # Import diferido: el agente se construye de forma perezosa
+    from app.agent.agent import get_agent
+    checkpointer = get_agent().checkpointer
+    if hasattr(checkpointer, "invalidate"):
+        checkpointer.invalidate(session_id)
+
+
+class SessionLeaseManager:
+    """
+    Garantiza que una conversación se procese en un solo worker a la vez cuando la aplicación
+    corre con varios procesos (uvicorn --workers, varias réplicas).
+
+    - El lease vive en la base de datos (`session_leases`) y vence tras `ttl` segundos:
+      si un worker muere, otro retoma sus sesiones.
+    - Mientras se procesa el turno, una tarea renueva el lease cada `ttl / 3` segundos.
+    - Si la sesión cambió de dueño desde el último turno que vio este proceso (`generation`),
+      se llama a `on_takeover` para descartar el estado en memoria, que puede estar desactualizado.
+    """
+
+    def __init__(self, ttl: float = 30, *, enabled: bool = True, poll_seconds: float = 0.2, on_takeover=_invalidate_session_state):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.poll_seconds = poll_seconds
+        self.on_takeover = on_takeover
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Última generación vista por sesión; dura lo mismo que el estado en memoria del checkpointer
+        self._generations = TTLCache(
+            maxsize=settings.CHECKPOINT_HOT_THREADS, ttl=settings.CHECKPOINT_IDLE_TTL_SECONDS, sliding=True
+        )
+
+    async def _acquire(self, session_id: str) -> int | None:
+        async with AsyncSessionLocal() as db:
+            return await LeaseDAO.aacquire(db, session_id, self.owner, self.ttl)
+
+    async def _release(self, session_id: str):
+        async with AsyncSessionLocal() as db:
+            await LeaseDAO.arelease(db, session_id, self.owner)
+
+    async def _heartbeat(self, session_id: str):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            async with AsyncSessionLocal() as db:
+                if not await LeaseDAO.arenew(db, session_id, self.owner, self.ttl):
+                    logger.warning("Lease de la sesión %s perdido por el worker %s", session_id, self.owner)
+                    return
+
+    def _track(self, session_id: str, generation: int):
+        # Sin generación conocida tampoco hay garantía de que el estado en memoria esté al día
+        if self._generations.get(session_id) != generation and self.on_takeover:
+            self.on_takeover(session_id)
+        self._generations.set(session_id, generation)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, session_id: str, deadline: float = None):
+        """
+        Toma el lease de la sesión durante el bloque. Si otro worker lo tiene, reintenta
+        (con backoff y jitter) hasta `deadline` (reloj monotónico) y luego lanza `LeaseUnavailable`.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        delay = self.poll_seconds
+        while (generation := await self._acquire(session_id)) is None:
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise LeaseUnavailable(session_id)
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, 2.0)
+
+        self._track(session_id, generation)
+        heartbeat = asyncio.create_task(self._heartbeat(session_id))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+            await asyncio.shield(self._release(session_id))
+
+
+# Instancia compartida por el proceso
+session_leases = SessionLeaseManager(settings.SESSION_LEASE_TTL_SECONDS, enabled=settings.SESSION_LEASE_ENABLED)
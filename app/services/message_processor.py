@@ -1,27 +1,73 @@
 # app/services/message_processor.py
 
 from app.dao.chat import ChatDAO
+from app.dao.profile import ProfileDAO
+from app.dao.webhook import WebhookDAO
 from app.schemas.chat import ChatMessageCreate
-from sqlalchemy.orm import Session
-from app.agent.agent import process_message
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.agent.agent import FALLBACK_REPLY, aprocess_message
+from app.db.session import AsyncSessionLocal
+from app.services.forecast import forecast_service
+from app.services.gazetteer import ResolvedLocation, gazetteer
+from app.services.lease import LeaseUnavailable, session_leases
 
 
-async def process_message_from_channel(db: Session, user_id: str, message: dict, channel: str, send_response_func):
+def message_text_from(message: dict, location: ResolvedLocation | None = None) -> str:
     """
-    Procesa el mensaje de cualquier canal (WhatsApp, web, etc.), guarda el mensaje en la base de datos y gestiona la sesión.
+    Texto que recibe el agente para un mensaje del canal (texto y/o ubicación).
+    La ubicación se acompaña del municipio más cercano (`location`, o resuelto aquí si no se pasa).
     """
-    # Verificar si ya existe una sesión para este usuario en el canal
-    session = ChatDAO.get_session_by_user_and_channel(db, user_id, channel)
-    if session is None:  # Si no hay sesión, es un nuevo usuario en este canal
-        session = ChatDAO.create_session(db, user_id, channel)
-    
-    # Manejar el tipo de mensaje (texto o ubicación)
+    parts = []
+    if body := message.get('text', {}).get('body'):
+        parts.append(body)
     if 'location' in message:
         latitude = message['location']['latitude']
         longitude = message['location']['longitude']
-        message_text = f"Ubicación recibida: latitud {latitude}, longitud {longitude}"
+        location = location or gazetteer.resolve(float(latitude), float(longitude))
+        place = f" ({location.describe()})" if location.place else ""
+        parts.append(f"Ubicación recibida: latitud {latitude}, longitud {longitude}{place}")
+    return "\n".join(parts)
+
+
+def message_ids(message: dict) -> list[str]:
+    """
+    Ids de WhatsApp del mensaje (varios si el coalescer agrupó mensajes seguidos).
+    """
+    return message.get('ids') or ([message['id']] if message.get('id') else [])
+
+
+async def process_message_from_channel(db: AsyncSession, user_id: str, message: dict, channel: str, send_response_func, deadline: float = None):
+    """
+    Procesa el mensaje de cualquier canal (WhatsApp, web, etc.), guarda el mensaje en la base de datos y gestiona la sesión.
+    `deadline` (ver `app.agent.deadline`) acota el tiempo total de respuesta desde que se recibió el mensaje.
+    """
+    # Obtener (o crear, si es un nuevo usuario en este canal) la sesión del usuario
+    session_id = await ChatDAO.aget_or_create_session(db, user_id, channel)
+
+    # Con varios workers, solo el dueño del lease procesa turnos de la sesión
+    try:
+        async with session_leases.hold(session_id, deadline):
+            await _process_turn(db, session_id, user_id, message, send_response_func, deadline)
+    except LeaseUnavailable:
+        # El turno no se procesó: olvidar sus ids para que un reenvío no se descarte como duplicado
+        if ids := message_ids(message):
+            await WebhookDAO.aunmark_processed(db, ids)
+        await send_response_func(user_id, FALLBACK_REPLY)
+
+
+async def _process_turn(db: AsyncSession, session_id: str, user_id: str, message: dict, send_response_func, deadline: float = None):
+    # Manejar el tipo de mensaje (texto o ubicación)
+    if 'location' in message:
+        # Municipio y celda de predicciones resueltos en el proceso (sin geocodificación externa)
+        location = gazetteer.resolve(float(message['location']['latitude']), float(message['location']['longitude']))
+        message_text = message_text_from(message, location)
+        # La ubicación se guarda estructurada en el perfil: las herramientas la toman de ahí
+        profile = await ProfileDAO.aupdate_profile(db, session_id, latitude=location.latitude, longitude=location.longitude)
+        # Empezar a descargar las predicciones de la zona mientras el agente procesa el turno
+        forecast_service.track(location.latitude, location.longitude)
     else:
-        message_text = message.get('text', {}).get('body', '')
+        message_text = message_text_from(message)
+        profile = await ProfileDAO.aget_profile(db, session_id)
 
     # Guardar el mensaje del usuario en la base de datos
     incoming_message = ChatMessageCreate(
@@ -29,10 +75,10 @@ async def process_message_from_channel(db: Session, user_id: str, message: dict,
         content=message_text,
         message_type="user"
     )
-    ChatDAO.create_message(db, incoming_message, session_id=session.session_id)
+    await ChatDAO.acreate_message(db, incoming_message, session_id=session_id)
 
     # Procesar el mensaje con el agente
-    bot_response = process_message(message_text, session.session_id)
+    bot_response = await aprocess_message(message_text, session_id, deadline=deadline, profile=profile)
 
     # Guardar la respuesta del bot en la base de datos
     bot_message = ChatMessageCreate(
@@ -40,12 +86,21 @@ async def process_message_from_channel(db: Session, user_id: str, message: dict,
         content=bot_response,
         message_type="bot"
     )
-    ChatDAO.create_message(db, bot_message, session_id=session.session_id)
+    await ChatDAO.acreate_message(db, bot_message, session_id=session_id)
 
     # Usar la función de respuesta que fue pasada como argumento
     await send_response_func(user_id, bot_response)
 
 
+async def process_message_in_new_session(user_id: str, message: dict, channel: str, send_response_func, deadline: float = None):
+    """
+    Igual que `process_message_from_channel`, pero con una sesión de base de datos propia:
+    para trabajos que siguen corriendo después de que termina la petición HTTP.
+    """
+    async with AsyncSessionLocal() as db:
+        await process_message_from_channel(db, user_id, message, channel, send_response_func, deadline=deadline)
+
+
 async def send_message_to_web(user_id: str, message_text: str):
     """
     Envía un mensaje de respuesta al canal web.
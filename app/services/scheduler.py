@@ -0,0 +1,120 @@
+# app/services/scheduler.py
+
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class SessionScheduler:
+    """
+    Cola de trabajo en proceso con orden por sesión y un número fijo de workers.
+
+    - Los trabajos de una misma sesión se ejecutan uno a la vez y en orden de llegada.
+    - Sesiones distintas se ejecutan en paralelo, hasta `workers` a la vez.
+    - La cola total está acotada a `max_queue` trabajos: al llenarse, `submit` rechaza
+      el trabajo (load shedding) en lugar de acumular latencia sin límite.
+    """
+
+    def __init__(self, workers: int = 16, max_queue: int = 500):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._sessions: dict[str, deque] = {}  # sesión -> trabajos pendientes (en cola o en ejecución)
+        self._ready: asyncio.Queue | None = None  # sesiones con trabajo listo para un worker
+        self._tasks: list[asyncio.Task] = []
+        self._depth = 0
+        self._running = 0
+        self._processed = 0
+        self._rejected = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        if self.started:
+            return
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def is_saturated(self) -> bool:
+        return self._depth >= self.max_queue
+
+    def submit(self, session_id: str, job) -> bool:
+        """
+        Encola `job` (una función sin argumentos que retorna una corrutina) para la sesión.
+        Retorna False si la cola está llena y el trabajo fue rechazado.
+        """
+        if not self.started:
+            self.start()
+        if self.is_saturated():
+            self._rejected += 1
+            return False
+
+        pending = self._sessions.get(session_id)
+        if pending is None:
+            # La sesión no tiene trabajo en curso: queda lista para el próximo worker
+            pending = self._sessions[session_id] = deque()
+            self._ready.put_nowait(session_id)
+        pending.append((asyncio.get_running_loop().time(), job))
+        self._depth += 1
+        return True
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            session_id = await self._ready.get()
+            pending = self._sessions[session_id]
+            enqueued_at, job = pending.popleft()
+            self._depth -= 1
+
+            wait = loop.time() - enqueued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._running += 1
+            try:
+                await job()
+            except Exception:
+                self._failed += 1
+                logger.exception("Error procesando trabajo de la sesión %s", session_id)
+            finally:
+                self._running -= 1
+                self._processed += 1
+                # Siguiente trabajo de la misma sesión al final de la fila (reparto justo)
+                if pending:
+                    self._ready.put_nowait(session_id)
+                else:
+                    del self._sessions[session_id]
+                self._ready.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._depth,
+            "running": self._running,
+            "sessions": len(self._sessions),
+            "processed": self._processed,
+            "rejected": self._rejected,
+            "failed": self._failed,
+            "wait_seconds_avg": self._wait_total / self._processed if self._processed else 0.0,
+            "wait_seconds_max": self._wait_max,
+        }
+
+    async def stop(self, timeout: float = 30):
+        """
+        Espera (hasta `timeout` segundos) a que terminen los trabajos encolados y detiene los workers.
+        """
+        if not self.started:
+            return
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -1,42 +1,106 @@
 # app/services/whatsapp.py
 
-from fastapi import BackgroundTasks
+import logging
+from fastapi import HTTPException
 from app.services.chat import ChatService
 from app.dao.chat import ChatDAO
-from sqlalchemy.orm import Session
+from app.dao.webhook import WebhookDAO
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.chat import ChatMessageCreate
-from app.agent.agent import process_message
-import httpx
+from app.agent.agent import aprocess_message
+from app.agent.deadline import deadline_in
+from app.services.whatsapp_sender import whatsapp_sender
+from app.services.coalescer import MessageCoalescer
+from app.services.message_processor import message_ids, process_message_in_new_session
+from app.services.scheduler import SessionScheduler
+from app.db.session import AsyncSessionLocal
 from app.core.config import settings
-from app.services.message_processor import process_message_from_channel
+
+logger = logging.getLogger(__name__)
+
+# Agrupa los mensajes seguidos de un mismo número en un solo turno del agente
+message_coalescer = MessageCoalescer(
+    window=settings.WHATSAPP_COALESCE_SECONDS,
+    max_delay=settings.WHATSAPP_COALESCE_MAX_SECONDS,
+)
+
+# Ejecuta el trabajo en orden por sesión con un número acotado de workers
+session_scheduler = SessionScheduler(
+    workers=settings.SCHEDULER_WORKERS,
+    max_queue=settings.SCHEDULER_MAX_QUEUE,
+)
+
+BUSY_MESSAGE = "Estoy atendiendo a muchas personas en este momento 🙏. Por favor, escríbeme de nuevo en unos minutos."
 
 class WhatsAppService:
     @staticmethod
-    async def handle_incoming_message(db: Session, data: dict, background_tasks: BackgroundTasks):
+    async def handle_incoming_message(db: AsyncSession, data: dict):
         """
-        Handle incoming message from WhatsApp, save it, and process it in the background.
+        Handle incoming messages from WhatsApp and process them in the background.
+        Every message of every entry/change in the payload is handled; messages that a user
+        sends in quick succession are merged into a single agent turn.
         """
-        print(data)
-        # Extraemos el número y el contenido del mensaje o la ubicación
+        logger.debug("Webhook de WhatsApp: %s", data)
+        # Load shedding: con la cola llena respondemos 503 y Meta reintentará la entrega más tarde
+        if session_scheduler.is_saturated():
+            raise HTTPException(status_code=503, detail="Busy, retry later", headers={"Retry-After": "30"})
+
+        # Extraemos todos los mensajes (texto o ubicación) del payload
         try:
-            phone_number = data['entry'][0]['changes'][0]['value']['messages'][0]['from']
-            message = data['entry'][0]['changes'][0]['value']['messages'][0]
-        except KeyError:
+            messages = [
+                message
+                for entry in data['entry']
+                for change in entry['changes']
+                for message in change['value'].get('messages', [])
+            ]
+        except (KeyError, TypeError):
             return {"status": "error", "message": "Invalid payload structure"}
 
-        # Enviar el procesamiento del mensaje a la función común
-        background_tasks.add_task(process_message_from_channel, db, phone_number, message, "whatsapp", WhatsAppService.send_message_to_whatsapp)
+        received = 0
+        for message in messages:
+            # Meta reenvía el webhook si tardamos en responder: procesar cada mensaje una sola vez
+            message_id = message.get('id')
+            if message_id and not await WebhookDAO.amark_processed(db, message_id, "whatsapp"):
+                continue
+
+            # Enviar el procesamiento del mensaje a la función común (agrupando ráfagas por usuario)
+            message_coalescer.add(message['from'], message, WhatsAppService._dispatch)
+            received += 1
 
         # 4. Return immediate response
-        return {"status": "received", "message": "Received and processing"}
+        if messages and not received:
+            return {"status": "duplicate", "message": "Already received"}
+        return {"status": "received", "message": "Received and processing", "count": received}
+
+    @staticmethod
+    async def _dispatch(message: dict):
+        phone_number = message['from']
+        # El tiempo de respuesta se cuenta desde aquí: incluye la espera en la cola del scheduler
+        deadline = deadline_in(settings.AGENT_REPLY_DEADLINE_SECONDS)
+        # Tarea en segundo plano: usa su propia sesión, no la de la petición del webhook
+        async with AsyncSessionLocal() as db:
+            session_id = await ChatDAO.aget_or_create_session(db, phone_number, "whatsapp")
+
+        accepted = session_scheduler.submit(
+            session_id,
+            lambda: process_message_in_new_session(
+                phone_number, message, "whatsapp", WhatsAppService.send_message_to_whatsapp, deadline=deadline
+            ),
+        )
+        if not accepted:
+            # El mensaje no se procesará: olvidar sus ids para que un reenvío de Meta no se descarte como duplicado
+            if ids := message_ids(message):
+                async with AsyncSessionLocal() as db:
+                    await WebhookDAO.aunmark_processed(db, ids)
+            await WhatsAppService.send_message_to_whatsapp(phone_number, BUSY_MESSAGE)
 
     @staticmethod
-    async def process_agent_response(db: Session, session_id: str, phone_number: str, message_text: str):
+    async def process_agent_response(db: AsyncSession, session_id: str, phone_number: str, message_text: str):
         """
         Process the agent response and send the reply back to WhatsApp.
         """
         # Call the agent to process the message
-        bot_response = process_message(message_text)  # Get response from the agent
+        bot_response = await aprocess_message(message_text, session_id)  # Get response from the agent
 
         # Save the bot response in the chat system
         bot_message = ChatMessageCreate(
@@ -44,7 +108,7 @@ class WhatsAppService:
             content=bot_response,
             message_type="bot"
         )
-        ChatDAO.create_message(db, bot_message)
+        await ChatDAO.acreate_message(db, bot_message, session_id)
 
         # 5. Send the bot response back to the user via WhatsApp API
         await WhatsAppService.send_message_to_whatsapp(phone_number, bot_response)
@@ -52,30 +116,7 @@ class WhatsAppService:
     @staticmethod
     async def send_message_to_whatsapp(phone_number: str, message_text: str):
         """
-        Send the message back to the user via WhatsApp API.
+        Send the message back to the user via WhatsApp API (pooled, rate-limited sender).
         """
-        
-        whatsapp_url = f"https://graph.facebook.com/v20.0/{settings.WHATSAPP_PHONE_ID}/messages"
-        headers = {
-            "Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "text",
-            "text": {
-                "body": message_text
-            }
-        }
-
-        async with httpx.AsyncClient() as client:
-            print(f"Sending message to {phone_number}: {message_text}")
-            print(f"Payload: {payload}")
-            print(f"url: {whatsapp_url}")
-            print(f"headers: {headers}")
-            response = await client.post(whatsapp_url, headers=headers, json=payload)
-            if response.status_code == 200:
-                return {"status": "success"}
-            else:
-                return {"status": "error", "message": response.json()}
+        logger.debug("Sending message to %s: %s", phone_number, message_text)
+        return await whatsapp_sender.send_text(phone_number, message_text)
@@ -0,0 +1,226 @@
+# app/services/whatsapp_sender.py
+
+import asyncio
+import random
+import time
+import httpx
+from app.core.config import settings
+from app.utils.metrics import WHATSAPP_SEND_RETRIES, WHATSAPP_SEND_SECONDS
+
+try:  # HTTP/2 requiere el paquete `h2` (httpx[http2] en requirements.txt); sin él se usa HTTP/1.1
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Códigos de respuesta del Graph API que vale la pena reintentar
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class SenderStopped(Exception):
+    """
+    El sender se detuvo antes de enviar el mensaje.
+    """
+
+
+class TokenBucket:
+    """
+    Limitador de tasa asíncrono: permite `rate` envíos por segundo con ráfagas de hasta `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(int(rate), 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class WhatsAppSender:
+    """
+    Envía mensajes al Graph API de WhatsApp durante toda la vida de la aplicación.
+
+    - Un único cliente httpx con conexiones keep-alive (y HTTP/2 si está disponible).
+    - Una cola de envíos atendida por `workers` tareas, limitada a `messages_per_second`
+      (el throughput permitido para el número de teléfono del negocio).
+    - Reintentos con backoff exponencial y jitter para respuestas 429/5xx y errores de red.
+    """
+
+    def __init__(
+        self,
+        phone_id: str,
+        token: str,
+        *,
+        api_url: str = "https://graph.facebook.com/v20.0",
+        messages_per_second: float = 80,
+        workers: int = 8,
+        max_retries: int = 4,
+        max_retry_after: float = 30,
+        max_connections: int = 20,
+        queue_size: int = 1000,
+    ):
+        self.url = f"{api_url}/{phone_id}/messages"
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self.rate_limiter = TokenBucket(messages_per_second)
+        self._client: httpx.AsyncClient | None = None
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self.started:
+            return
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            headers=self.headers,
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=60,
+            ),
+        )
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """
+        Espera (hasta `timeout` segundos) a que se vacíe la cola y libera las conexiones.
+        """
+        if not self.started:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Los mensajes que quedaron en la cola no se enviarán: no dejar a nadie esperando
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(SenderStopped("WhatsApp sender stopped before sending the message"))
+            self._queue.task_done()
+        await self._client.aclose()
+        self._client = None
+
+    async def send(self, payload: dict) -> dict:
+        """
+        Encola un mensaje y espera el resultado del envío.
+        """
+        if not self.started:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future))
+        return await future
+
+    async def send_text(self, phone_number: str, message_text: str) -> dict:
+        return await self.send({
+            "messaging_product": "whatsapp",
+            "to": phone_number,
+            "type": "text",
+            "text": {
+                "body": message_text
+            }
+        })
+
+    async def _worker(self):
+        while True:
+            payload, future = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                result = await self._post(payload)
+                WHATSAPP_SEND_SECONDS.labels(result["status"]).observe(time.perf_counter() - started)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                WHATSAPP_SEND_SECONDS.labels("error").observe(time.perf_counter() - started)
+                if not future.done():
+                    future.set_exception(e)
+            except asyncio.CancelledError:
+                # `stop()` canceló el worker con un envío en curso
+                if not future.done():
+                    future.set_exception(SenderStopped("WhatsApp sender stopped while sending the message"))
+                raise
+            finally:
+                self._queue.task_done()
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float | None:
+        """
+        Segundos a esperar antes del reintento, o None si el servidor pide (con Retry-After)
+        esperar más de `max_retry_after`: el worker no se queda bloqueado tanto tiempo.
+        """
+        if retry_after:
+            try:
+                delay = max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+            else:
+                return delay if delay <= self.max_retry_after else None
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+    async def _post(self, payload: dict) -> dict:
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                WHATSAPP_SEND_RETRIES.inc()
+            await self.rate_limiter.acquire()
+            try:
+                response = await self._client.post(self.url, json=payload)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    return {"status": "error", "message": str(e)}
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                return {"status": "success"}
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                retry_after = response.headers.get("Retry-After")
+                delay = self._backoff(attempt, retry_after)
+                if delay is None:
+                    return {"status": "error", "message": f"Retry-After of {retry_after}s exceeds the {self.max_retry_after}s limit"}
+                await asyncio.sleep(delay)
+                continue
+            try:
+                return {"status": "error", "message": response.json()}
+            except ValueError:
+                return {"status": "error", "message": response.text}
+
+
+# Instancia compartida por toda la aplicación (se inicia/detiene en el lifespan de main.py)
+whatsapp_sender = WhatsAppSender(
+    settings.WHATSAPP_PHONE_ID,
+    settings.WHATSAPP_API_TOKEN,
+    api_url=settings.WHATSAPP_API_URL,
+    messages_per_second=settings.WHATSAPP_MESSAGES_PER_SECOND,
+    workers=settings.WHATSAPP_SEND_WORKERS,
+    max_retries=settings.WHATSAPP_SEND_MAX_RETRIES,
+    max_retry_after=settings.WHATSAPP_MAX_RETRY_AFTER_SECONDS,
+    max_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+    queue_size=settings.WHATSAPP_SEND_QUEUE_SIZE,
+)
@@ -0,0 +1,130 @@
+# app/utils/cache.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Caché en memoria acotada por tamaño (LRU) y por tiempo (TTL).
+
+    - `maxsize`: número máximo de entradas; al superarlo se expulsa la menos usada.
+    - `ttl`: segundos que vive una entrada (None = sin expiración); `set` acepta un TTL propio.
+    - `sliding`: si es True, cada lectura renueva el TTL (expira por inactividad).
+
+    Es segura para usarse desde varios hilos.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None, sliding: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sliding = sliding
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _expires_at(self, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        return time.monotonic() + ttl if ttl is not None else None
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            if self.sliding:
+                self._data[key] = (self._expires_at(), value)
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        with self._lock:
+            self._data[key] = (self._expires_at(ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            return default if item is _MISSING else item[1]
+
+    def expire(self) -> int:
+        """
+        Elimina las entradas vencidas y retorna cuántas se eliminaron.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (exp, _) in self._data.items() if exp is not None and exp <= now]
+            for key in expired:
+                del self._data[key]
+            return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def keys(self) -> list:
+        """
+        Claves vigentes (copia: se puede iterar mientras otros hilos modifican la caché).
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [k for k, (exp, _) in self._data.items() if exp is None or exp > now]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución:
+    la primera llamada ejecuta la función y las demás esperan su resultado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict = {}  # key -> [threading.Event, resultado, excepción]
+        self._tasks: dict = {}  # key -> asyncio.Task
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+
+        if leader:
+            try:
+                call[1] = func()
+            except Exception as e:
+                call[2] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call[0].set()
+        else:
+            call[0].wait()
+
+        if call[2] is not None:
+            raise call[2]
+        return call[1]
+
+    async def ado(self, key, coro_func):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # shield: si un llamador se cancela, la petición compartida sigue para los demás
+        return await asyncio.shield(task)
@@ -0,0 +1,26 @@
+# app/utils/http.py
+
+import httpx
+
+# Cliente HTTP asíncrono compartido por las herramientas del agente (reutiliza conexiones)
+_async_client: httpx.AsyncClient | None = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Retorna el cliente httpx asíncrono compartido, creándolo en el primer uso.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+    return _async_client
+
+
+async def close_async_client():
+    """
+    Cierra el cliente compartido (usar al apagar la aplicación).
+    """
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -0,0 +1,206 @@
+# app/utils/metrics.py
+
+import asyncio
+import os
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import Counter, Gauge, Histogram, multiprocess
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Buckets pensados para respuestas de segundos (LLM, herramientas, webhook)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 12, 20, 30, 60)
+# Buckets para consultas a la base de datos
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+WEBHOOK_SECONDS = Histogram(
+    "chatbot_webhook_seconds", "Tiempo de atención del webhook de WhatsApp", ["outcome"], buckets=SLOW_BUCKETS
+)
+NODE_SECONDS = Histogram(
+    "chatbot_agent_node_seconds", "Tiempo en cada nodo del grafo del agente", ["node"], buckets=SLOW_BUCKETS
+)
+TOOL_SECONDS = Histogram(
+    "chatbot_tool_seconds", "Latencia de cada herramienta del agente", ["tool", "status"], buckets=SLOW_BUCKETS
+)
+TOOL_ERRORS = Counter(
+    "chatbot_tool_errors_total", "Llamadas a herramientas con error o timeout", ["tool", "status"]
+)
+LLM_SECONDS = Histogram(
+    "chatbot_llm_request_seconds", "Duración de cada llamada al modelo de lenguaje", ["model"], buckets=SLOW_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "chatbot_llm_tokens_total", "Tokens consumidos por el modelo de lenguaje", ["model", "type"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "chatbot_db_query_seconds", "Duración de las consultas SQL", ["operation"], buckets=DB_BUCKETS
+)
+WHATSAPP_SEND_SECONDS = Histogram(
+    "chatbot_whatsapp_send_seconds", "Latencia de envío al Graph API de WhatsApp (incluye reintentos)", ["status"], buckets=SLOW_BUCKETS
+)
+WHATSAPP_SEND_RETRIES = Counter(
+    "chatbot_whatsapp_send_retries_total", "Reintentos de envío al Graph API de WhatsApp"
+)
+TOOL_ABANDONED_CALLS = Gauge(
+    "chatbot_tool_abandoned_calls", "Llamadas síncronas a herramientas que vencieron y siguen ocupando un hilo",
+    multiprocess_mode="livesum",
+)
+CHAT_MESSAGES_DROPPED = Counter(
+    "chatbot_chat_messages_dropped_total", "Mensajes de chat descartados por la escritura diferida (datos inválidos)"
+)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Callback de LangChain que registra la duración y los tokens de cada llamada al modelo.
+    En streaming los tokens solo llegan si el modelo los pide (`stream_usage=True` en ChatOpenAI):
+    vienen en el último chunk y LangChain los deja en el mensaje agregado que recibe `on_llm_end`.
+    """
+
+    run_inline = True  # Trabajo mínimo: no hace falta enviarlo a un hilo en la ruta asíncrona
+
+    def __init__(self, default_model: str):
+        self.default_model = default_model
+        self._started: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def _model(self, response) -> str:
+        if model := (response.llm_output or {}).get("model_name"):
+            return model
+        # En streaming no hay llm_output: el nombre viene en la metadata del mensaje
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+                if model := metadata.get("model_name"):
+                    return model
+        return self.default_model
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model = self._model(response)
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_SECONDS.labels(model).observe(time.perf_counter() - started)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.labels(model, "prompt").inc(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(model, "completion").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+
+def instrument_engine(engine: Engine):
+    """
+    Registra la duración de cada consulta SQL del engine, agrupada por operación (SELECT, INSERT, ...).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # La consulta falló: after_cursor_execute no se llamará
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+
+def multiprocess_enabled() -> bool:
+    """
+    True si las métricas se agregan entre varios workers (`PROMETHEUS_MULTIPROC_DIR`).
+    """
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class StatsCollector:
+    """
+    Expone como gauges los valores numéricos de un `stats()` existente
+    (scheduler, caché de respuestas, ...), leídos en cada scrape.
+
+    Con varios workers el scrape no pasa por el registro de cada proceso: `publish` copia los
+    valores a gauges respaldados por archivos, con una etiqueta `pid` por worker.
+    """
+
+    def __init__(self, prefix: str, stats_func, description: str):
+        self.prefix = prefix
+        self.stats_func = stats_func
+        self.description = description
+        self._gauges: dict[str, Gauge] = {}
+
+    def _values(self):
+        for name, value in self.stats_func().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield name, value
+
+    def collect(self):
+        for name, value in self._values():
+            yield GaugeMetricFamily(f"{self.prefix}_{name}", f"{self.description}: {name}", value=value)
+
+    def publish(self):
+        for name, value in self._values():
+            if (gauge := self._gauges.get(name)) is None:
+                # Sin registro: en modo multiproceso el valor se lee de los archivos de cada worker
+                gauge = self._gauges[name] = Gauge(
+                    f"{self.prefix}_{name}", f"{self.description}: {name}", multiprocess_mode="liveall", registry=None
+                )
+            gauge.set(value)
+
+
+# Colectores registrados, para publicarlos en modo multiproceso
+_stats_collectors: list[StatsCollector] = []
+
+
+def register_stats(prefix: str, stats_func, description: str):
+    collector = StatsCollector(prefix, stats_func, description)
+    _stats_collectors.append(collector)
+    REGISTRY.register(collector)
+
+
+def publish_stats():
+    for collector in _stats_collectors:
+        collector.publish()
+
+
+class StatsPublisher:
+    """
+    En modo multiproceso, publica periódicamente los `stats()` registrados de este worker
+    (ver `StatsCollector.publish`). Sin `PROMETHEUS_MULTIPROC_DIR` no hace nada: el scrape
+    lee los colectores directamente.
+    """
+
+    def __init__(self, interval: float = 5):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is not None or not multiprocess_enabled():
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Los gauges "liveall" de este pid dejan de exponerse al terminar el worker
+        multiprocess.mark_process_dead(os.getpid())
+
+    async def _loop(self):
+        while True:
+            publish_stats()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,196 @@
+# benchmarks/fake_services.py
+"""
+Servicios externos falsos para medir la aplicación sin red, servidos por una sola app FastAPI local:
+
+- /v1/chat/completions              API compatible con OpenAI con respuestas guionadas (incluye llamadas a herramientas).
+- /graph/{version}/{phone}/messages  Receptor de la Graph API de WhatsApp: registra cada respuesta enviada.
+- /predictions/api/Prediction/...   Stub del API de predicciones (nasaanalisisapi).
+- /weather                          Stub de OpenWeather.
+"""
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LOCATION_RE = re.compile(r"latitud\s*(-?\d+(?:\.\d+)?),\s*longitud\s*(-?\d+(?:\.\d+)?)", re.IGNORECASE)
+
+PERIOD_WORDS = {
+    "tomorrow": ("mañana", "tomorrow"),
+    "week": ("semana", "week"),
+    "month": ("mes", "month"),
+    "quarter": ("trimestre", "quarter"),
+}
+
+
+class GraphSink:
+    """
+    Registra los mensajes que la aplicación envía a WhatsApp y despierta a quien espera
+    la respuesta para un número.
+    """
+
+    def __init__(self):
+        self.delivered = 0
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+
+    def expect(self, phone: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(phone, []).append(future)
+        return future
+
+    def deliver(self, phone: str, text: str):
+        self.delivered += 1
+        waiters = self._waiters.get(phone)
+        if waiters:
+            future = waiters.pop(0)
+            if not waiters:
+                del self._waiters[phone]
+            if not future.done():
+                future.set_result((time.perf_counter(), text))
+
+
+class FakeServices:
+    """
+    Estado y configuración de los servicios falsos.
+
+    - `llm_latency`: segundos que tarda cada respuesta del modelo falso.
+    - `api_latency`: segundos que tardan los APIs de predicciones y clima.
+    """
+
+    def __init__(self, llm_latency: float = 0.2, api_latency: float = 0.05):
+        self.llm_latency = llm_latency
+        self.api_latency = api_latency
+        self.sink = GraphSink()
+        self.calls = Counter()
+        self.app = self._build_app()
+
+    # -- Modelo de lenguaje ----------------------------------------------
+
+    @staticmethod
+    def _period(messages: list) -> str:
+        text = " ".join(str(m.get("content") or "") for m in messages if m["role"] == "user").lower()
+        for period, words in reversed(PERIOD_WORDS.items()):
+            if any(word in text for word in words):
+                return period
+        return "tomorrow"
+
+    def script(self, body: dict) -> tuple[str, list]:
+        """
+        Respuesta guionada según el último mensaje de la conversación: (texto, llamadas a herramientas).
+        """
+        messages = body["messages"]
+        if not body.get("tools"):
+            # Modelo sin herramientas: el resumidor del historial
+            return "- Cultivos: maíz y fríjol\n- Ubicación compartida\n- Periodo: mañana", []
+
+        last = next((m for m in reversed(messages) if m["role"] != "system"), {"role": "user", "content": ""})
+        if last["role"] == "tool":
+            return (
+                "🌾 Con estas predicciones te recomiendo *regar temprano* y revisar el drenaje. "
+                f"Datos recibidos: {str(last.get('content'))[:120]}",
+                [],
+            )
+
+        text = str(last.get("content") or "")
+        if match := LOCATION_RE.search(text):
+            args = {"lat": float(match.group(1)), "lon": float(match.group(2)), "period": self._period(messages)}
+            return "", [("get_agriculture_predictions", args)]
+        saved_location = any("Ubicación guardada" in str(m.get("content")) for m in messages if m["role"] == "system")
+        if saved_location and any(word in text.lower() for words in PERIOD_WORDS.values() for word in words):
+            # Perfil con ubicación: predicción directa, sin pedir la ubicación otra vez
+            return "", [("get_agriculture_predictions", {"period": self._period(messages)})]
+        if "clima" in text.lower() or "weather" in text.lower():
+            return "", [("get_weather", {"city": "Bogotá"})]
+        if len([m for m in messages if m["role"] == "user"]) <= 1:
+            return (
+                "¡Hola! 👋 Soy *Don Pepe*. Puedo ayudarte con:\n1. *Consultar el clima actual* 🌦️\n"
+                "2. *Consultar predicciones de parametros meteorologicos* 📊",
+                [],
+            )
+        return "¡Muy bien! 😊 ¿Para qué periodo quieres la predicción o me compartes tu ubicación? 📍", []
+
+    @staticmethod
+    def _usage(body: dict, content: str) -> dict:
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in body["messages"]) // 4
+        completion_tokens = max(len(content) // 4, 1)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _completion(self, body: dict, content: str, calls: list) -> dict:
+        message = {"role": "assistant", "content": content or None}
+        if calls:
+            message["tool_calls"] = [
+                {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+                for name, args in calls
+            ]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if calls else "stop"}],
+            "usage": self._usage(body, content),
+        }
+
+    def _stream(self, body: dict, content: str, calls: list):
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            return f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]})}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for word in re.findall(r"\S+\s*", content):
+            yield chunk({"content": word})
+        for index, (name, args) in enumerate(calls):
+            yield chunk({"tool_calls": [{"index": index, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}]})
+        yield chunk({}, "tool_calls" if calls else "stop")
+        yield "data: [DONE]\n\n"
+
+    # -- Aplicación ------------------------------------------------------
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake external services")
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            self.calls["llm"] += 1
+            await asyncio.sleep(self.llm_latency)
+            content, calls = self.script(body)
+            if body.get("stream"):
+                return StreamingResponse(self._stream(body, content, calls), media_type="text/event-stream")
+            return self._completion(body, content, calls)
+
+        @app.post("/graph/{version}/{phone_id}/messages")
+        async def graph_messages(request: Request):
+            payload = await request.json()
+            self.calls["graph"] += 1
+            self.sink.deliver(payload.get("to"), payload.get("text", {}).get("body", ""))
+            return {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+
+        @app.get("/predictions/api/Prediction/{endpoint}")
+        async def prediction(endpoint: str, latitude: float, longitude: float):
+            self.calls["predictions"] += 1
+            await asyncio.sleep(self.api_latency)
+            if endpoint == "tomorrowPrediction":
+                return {"predictions": [21.4, 3.2, 2.1, 78.0]}
+            return {
+                "predictions": [
+                    {"min": 14.0, "max": 26.5, "average": 20.1},
+                    {"min": 0.0, "max": 12.3, "average": 4.4},
+                    {"min": 0.8, "max": 5.2, "average": 2.3},
+                    {"min": 60.0, "max": 92.0, "average": 77.5},
+                ]
+            }
+
+        @app.get("/weather")
+        async def weather(q: str = "", lat: float = None, lon: float = None):
+            self.calls["weather"] += 1
+            await asyncio.sleep(self.api_latency)
+            return {"weather": [{"description": "nubes dispersas"}], "main": {"temp": 19.5}}
+
+        return app
@@ -0,0 +1,300 @@
+# benchmarks/load.py
+"""
+Benchmark de carga sin red: levanta la aplicación real (`main.app`) con uvicorn y la conecta a
+los servicios falsos de `fake_services.py` (OpenAI, Graph API de WhatsApp, predicciones, clima).
+
+Cada usuario virtual conversa con el guion de `CONVERSATION` por el webhook de WhatsApp
+(la latencia de un turno va desde el POST del webhook hasta que la respuesta llega a la
+Graph API falsa) y/o por `/api/chat/message/`. Se reporta throughput, latencias p50/p95/p99
+y round-trips a la base de datos por turno.
+
+Uso:
+
+    python benchmarks/load.py --users 20 --rounds 2 --llm-latency 0.2
+    python benchmarks/load.py --scenario chat --database-url postgresql://localhost/bench
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from fake_services import FakeServices  # noqa: E402
+
+# Guion de cada conversación: saludo, cultivos, periodo, ubicación y una consulta del clima
+CONVERSATION = [
+    {"text": "Hola"},
+    {"text": "Tengo maíz y fríjol"},
+    {"text": "Para mañana"},
+    {"location": True},
+    {"text": "¿Cómo está el clima en Bogotá?"},
+]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list = field(default_factory=list)
+    acks: list = field(default_factory=list)  # solo WhatsApp: tiempo de respuesta del webhook
+    errors: int = 0
+    duration: float = 0.0
+    db_round_trips: int = 0
+    llm_calls: int = 0
+
+    @property
+    def turns(self) -> int:
+        return len(self.latencies)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def configure_environment(args, fakes_url: str):
+    """
+    Apunta la aplicación a los servicios falsos. Debe llamarse antes de importar `main`.
+    """
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')}"
+    os.environ.update(
+        {
+            "DATABASE_URL": database_url,
+            "OPENAI_BASE_URL": f"{fakes_url}/v1",
+            "WHATSAPP_API_URL": f"{fakes_url}/graph/v20.0",
+            "PREDICTIONS_API_URL": f"{fakes_url}/predictions",
+            "OPENWEATHER_API_URL": f"{fakes_url}/weather",
+            "WHATSAPP_COALESCE_SECONDS": str(args.coalesce),
+        }
+    )
+    for name, value in {
+        "OPENAI_API_KEY": "bench",
+        "OPENWEATHER_API_KEY": "bench",
+        "WHATSAPP_API_TOKEN": "bench",
+        "WHATSAPP_PHONE_ID": "100000",
+        "VERIFY_TOKEN": "bench",
+    }.items():
+        os.environ.setdefault(name, value)
+    return database_url
+
+
+class AppServer:
+    """
+    La aplicación real corriendo con uvicorn en un hilo propio (su propio event loop).
+    """
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="bench-app", daemon=True)
+
+    def start(self, timeout: float = 60):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("La aplicación no arrancó")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+def webhook_payload(phone: str, turn: dict) -> dict:
+    message = {"from": phone, "id": f"wamid.{uuid.uuid4().hex}", "timestamp": str(int(time.time()))}
+    if turn.get("location"):
+        message.update(type="location", location={"latitude": 4.6 + random.uniform(-1, 1), "longitude": -74.08 + random.uniform(-1, 1)})
+    else:
+        message.update(type="text", text={"body": turn["text"]})
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "id": "bench",
+                "changes": [
+                    {"field": "messages", "value": {"messaging_product": "whatsapp", "metadata": {"phone_number_id": "100000"}, "messages": [message]}}
+                ],
+            }
+        ],
+    }
+
+
+def chat_content(turn: dict) -> str:
+    if turn.get("location"):
+        return f"Ubicación recibida: latitud {4.6 + random.uniform(-1, 1):.5f}, longitud {-74.08 + random.uniform(-1, 1):.5f}"
+    return turn["text"]
+
+
+async def whatsapp_user(client: httpx.AsyncClient, fakes: FakeServices, result: ScenarioResult, rounds: int, timeout: float):
+    for _ in range(rounds):
+        phone = f"57{random.randint(10**9, 10**10 - 1)}"
+        for turn in CONVERSATION:
+            reply = fakes.sink.expect(phone)
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/whatsapp/webhook/", json=webhook_payload(phone, turn))
+                result.acks.append(time.perf_counter() - started)
+                response.raise_for_status()
+                delivered_at, _ = await asyncio.wait_for(reply, timeout)
+                result.latencies.append(delivered_at - started)
+            except (httpx.HTTPError, asyncio.TimeoutError):
+                result.errors += 1
+                break
+
+
+async def chat_user(client: httpx.AsyncClient, result: ScenarioResult, rounds: int, timeout: float):
+    for _ in range(rounds):
+        try:
+            response = await client.post("/api/chat/session/")
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+        except httpx.HTTPError:
+            result.errors += 1
+            continue
+        for turn in CONVERSATION:
+            message = {"sender": "bench-user", "content": chat_content(turn), "message_type": "user"}
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/chat/message/", params={"session_id": session_id}, json=message, timeout=timeout)
+                response.raise_for_status()
+                result.latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                result.errors += 1
+                break
+
+
+async def run_scenario(name: str, user_factory, args, fakes: FakeServices, db_counter: dict) -> ScenarioResult:
+    result = ScenarioResult(name)
+    db_counter["queries"] = 0
+    llm_before = fakes.calls["llm"]
+    started = time.perf_counter()
+    await asyncio.gather(*(user_factory(result) for _ in range(args.users)))
+    result.duration = time.perf_counter() - started
+    result.db_round_trips = db_counter["queries"]
+    result.llm_calls = fakes.calls["llm"] - llm_before
+    return result
+
+
+def report(results: list[ScenarioResult]):
+    header = f"{'escenario':<10} {'turnos':>7} {'errores':>8} {'turnos/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'BD/turno':>9} {'LLM/turno':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        per_turn = r.turns or 1
+        print(
+            f"{r.name:<10} {r.turns:>7} {r.errors:>8} {r.turns / r.duration if r.duration else 0:>9.2f} "
+            f"{percentile(r.latencies, 50) * 1000:>8.1f} {percentile(r.latencies, 95) * 1000:>8.1f} "
+            f"{percentile(r.latencies, 99) * 1000:>8.1f} {r.db_round_trips / per_turn:>9.1f} {r.llm_calls / per_turn:>10.2f}"
+        )
+        if r.acks:
+            print(f"{'':<10} ack del webhook: p50 {percentile(r.acks, 50) * 1000:.1f} ms, p99 {percentile(r.acks, 99) * 1000:.1f} ms")
+
+
+def as_dict(r: ScenarioResult) -> dict:
+    return {
+        "scenario": r.name,
+        "turns": r.turns,
+        "errors": r.errors,
+        "duration_seconds": r.duration,
+        "throughput_turns_per_second": r.turns / r.duration if r.duration else 0.0,
+        "latency_ms": {f"p{q}": percentile(r.latencies, q) * 1000 for q in (50, 95, 99)},
+        "latency_ms_mean": statistics.fmean(r.latencies) * 1000 if r.latencies else 0.0,
+        "webhook_ack_ms": {f"p{q}": percentile(r.acks, q) * 1000 for q in (50, 99)} if r.acks else None,
+        "db_round_trips_per_turn": r.db_round_trips / (r.turns or 1),
+        "llm_calls_per_turn": r.llm_calls / (r.turns or 1),
+    }
+
+
+async def main_async(args):
+    fakes = FakeServices(llm_latency=args.llm_latency, api_latency=args.api_latency)
+    fakes_port = free_port()
+    fakes_server = uvicorn.Server(uvicorn.Config(fakes.app, host="127.0.0.1", port=fakes_port, log_level="warning"))
+    fakes_task = asyncio.create_task(fakes_server.serve())
+    while not fakes_server.started:
+        await asyncio.sleep(0.05)
+
+    database_url = configure_environment(args, f"http://127.0.0.1:{fakes_port}")
+
+    # La aplicación se importa después de configurar el entorno
+    from sqlalchemy import event
+    import main
+    from app.db.session import async_engine, engine
+
+    db_counter = {"queries": 0}
+
+    def count_query(*_):
+        db_counter["queries"] += 1
+
+    for counted_engine in (engine, async_engine.sync_engine):
+        event.listen(counted_engine, "before_cursor_execute", count_query)
+
+    app_port = free_port()
+    app_server = AppServer(main.app, app_port)
+    await asyncio.to_thread(app_server.start)
+    print(f"App en :{app_port}, servicios falsos en :{fakes_port}, BD {database_url}")
+
+    results = []
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    # Los print de la aplicación (payloads, envíos) se descartan salvo con --verbose
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits, timeout=args.timeout) as client:
+            if args.scenario in ("whatsapp", "both"):
+                results.append(
+                    await run_scenario("whatsapp", lambda r: whatsapp_user(client, fakes, r, args.rounds, args.timeout), args, fakes, db_counter)
+                )
+            if args.scenario in ("chat", "both"):
+                results.append(await run_scenario("chat", lambda r: chat_user(client, r, args.rounds, args.timeout), args, fakes, db_counter))
+
+        await asyncio.to_thread(app_server.stop)
+    fakes_server.should_exit = True
+    await fakes_task
+
+    print()
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([as_dict(r) for r in results], f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga sin red contra servicios falsos locales.")
+    parser.add_argument("--scenario", choices=["whatsapp", "chat", "both"], default="both")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios virtuales concurrentes")
+    parser.add_argument("--rounds", type=int, default=1, help="Conversaciones completas por usuario")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Segundos por respuesta del modelo falso")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Segundos por respuesta de los APIs de clima y predicciones")
+    parser.add_argument("--coalesce", type=float, default=0.0, help="WHATSAPP_COALESCE_SECONDS durante la prueba")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Segundos máximos por turno")
+    parser.add_argument("--database-url", default=None, help="Por defecto, SQLite en un directorio temporal")
+    parser.add_argument("--json", default=None, help="Guarda los resultados en este archivo JSON")
+    parser.add_argument("--verbose", action="store_true", help="Muestra la salida de la aplicación")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
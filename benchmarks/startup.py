@@ -0,0 +1,77 @@
+# benchmarks/startup.py
+"""
+Mide el tiempo de arranque en frío de la aplicación, cada corrida en un proceso nuevo:
+
+- import:   `import main` (lo que paga cada proceso de pruebas que importa la app).
+- ready:    import + lifespan completo (tablas + construcción del agente), como un worker de uvicorn
+            antes de aceptar peticiones.
+- agent:    solo la construcción perezosa del agente (`get_agent()`) tras el import.
+
+Uso (con las mismas variables de entorno / .env que la aplicación):
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+timings = {"import": imported - started}
+
+if MODE == "ready":
+    async def startup():
+        async with main.lifespan(main.app):
+            return time.perf_counter()
+    timings["ready"] = asyncio.run(startup()) - started
+else:
+    from app.agent.agent import get_agent
+    get_agent()
+    timings["agent"] = time.perf_counter() - imported
+
+print(json.dumps(timings))
+"""
+
+
+def run_probe(mode: str) -> dict:
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    output = subprocess.run(
+        [sys.executable, "-c", f"MODE = {mode!r}\n{PROBE}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío (import -> listo).")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples: dict[str, list[float]] = {}
+    for _ in range(args.runs):
+        for mode in ("ready", "agent"):
+            for name, value in run_probe(mode).items():
+                samples.setdefault(name, []).append(value)
+
+    print(f"{'etapa':<8} {'mediana (s)':>12} {'mín (s)':>10} {'máx (s)':>10}")
+    for name in ("import", "agent", "ready"):
+        values = samples.get(name, [])
+        if values:
+            print(f"{name:<8} {statistics.median(values):>12.3f} {min(values):>10.3f} {max(values):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
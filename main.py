@@ -1,18 +1,78 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 from app.api import chat, whatsapp
 from app.core.config import settings
-from app.db.session import engine
+from app.db.migrations import upgrade_schema
+from app.db.session import async_engine, engine
 from app.db.base_class import Base  # Update this import
+import app.models.checkpoint  # noqa: F401 (registra las tablas del agente para create_all)
+import app.models.lease  # noqa: F401
+from app.agent.agent import get_agent, response_cache
+from app.dao.chat import message_buffer
+from app.services.forecast import forecast_service
+from app.services.whatsapp import message_coalescer, session_scheduler
+from app.services.whatsapp_sender import whatsapp_sender
+from app.utils.http import close_async_client
+from app.utils.metrics import StatsPublisher, instrument_engine, multiprocess_enabled, publish_stats, register_stats
 
-app = FastAPI(title=settings.PROJECT_NAME)
 
-# Crear tablas en la base de datos
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear tablas y construir el agente (modelo, herramientas, grafo) una vez por proceso,
+    # fuera del import para que importar la aplicación sea rápido
+    await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    await asyncio.to_thread(upgrade_schema, engine)
+    await asyncio.to_thread(get_agent)
+    # Conexiones salientes que viven lo mismo que la aplicación
+    await whatsapp_sender.start()
+    session_scheduler.start()
+    forecast_service.start()
+    stats_publisher.start()
+    yield
+    # Procesa los mensajes que seguían esperando a ser agrupados antes de cerrar el envío
+    await message_coalescer.close()
+    await session_scheduler.stop()
+    await forecast_service.stop()
+    await stats_publisher.stop()
+    await whatsapp_sender.stop()
+    await close_async_client()
+    # Guarda los mensajes que sigan en la cola de escritura diferida
+    message_buffer.close()
+    await async_engine.dispose()
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
+
+# Métricas: duración de cada consulta SQL y estado del scheduler, de la caché de respuestas y de las predicciones
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+register_stats("chatbot_scheduler", session_scheduler.stats, "Scheduler de conversaciones")
+register_stats("chatbot_response_cache", response_cache.stats, "Caché de respuestas del agente")
+register_stats("chatbot_forecast", forecast_service.stats, "Predicciones precargadas por celda")
+# Con varios workers, cada proceso publica sus stats en los archivos de métricas (etiqueta pid)
+stats_publisher = StatsPublisher(settings.METRICS_STATS_PUBLISH_SECONDS)
 
 # Incluir routers
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(whatsapp.router, prefix="/api/whatsapp", tags=["whatsapp"])
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Métricas en formato de texto de Prometheus. Con varios workers (`PROMETHEUS_MULTIPROC_DIR`),
+    se agregan las de todos los procesos; los stats (scheduler, caché, predicciones) se exponen
+    por worker con la etiqueta `pid`.
+    """
+    if multiprocess_enabled():
+        # Valores al momento para el worker que atiende el scrape; los demás publican cada pocos segundos
+        publish_stats()
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
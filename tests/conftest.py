@@ -0,0 +1,15 @@
+# tests/conftest.py
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Configuración mínima para importar `app.core.config` sin un .env (sin servicios externos)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.gettempdir()) / 'chatbot-tests.db'}")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("WHATSAPP_API_TOKEN", "test")
+os.environ.setdefault("WHATSAPP_PHONE_ID", "0")
+os.environ.setdefault("VERIFY_TOKEN", "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,34 @@
+# tests/test_assistant.py
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.agent.agent import FALLBACK_REPLY, Assistant, primary_assistant_prompt, with_deadline_timeout
+from app.agent.deadline import DEADLINE_KEY, deadline_in
+
+
+class RecordingModel(FakeListChatModel):
+    timeouts: list = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.timeouts.append(kwargs.get("timeout"))
+        return super()._call(messages, stop, run_manager, **kwargs)
+
+
+def test_sync_call_uses_the_remaining_deadline_as_llm_timeout():
+    model = RecordingModel(responses=["¡Hola!"], timeouts=[])
+    assistant = Assistant(primary_assistant_prompt | with_deadline_timeout(model, 30), max_retries=0)
+    result = assistant({"messages": [("user", "hola")]}, {"configurable": {DEADLINE_KEY: deadline_in(2)}})
+    assert result["messages"].content == "¡Hola!"
+    assert 0 < model.timeouts[0] <= 2
+
+    assistant({"messages": [("user", "hola")]}, {"configurable": {}})
+    assert model.timeouts[1] == 30
+
+
+def test_expired_deadline_falls_back_without_calling_the_model():
+    model = RecordingModel(responses=["¡Hola!"], timeouts=[])
+    assistant = Assistant(primary_assistant_prompt | with_deadline_timeout(model, 30), max_retries=0)
+    result = assistant({"messages": [("user", "hola")]}, {"configurable": {DEADLINE_KEY: deadline_in(0)}})
+    assert result["messages"].content == FALLBACK_REPLY
+    assert result["messages"].response_metadata["degraded"] == "deadline"
+    assert model.timeouts == []
@@ -0,0 +1,35 @@
+# tests/test_chat_api.py
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import app.agent.agent as agent
+import main
+from app.db.base_class import Base
+from app.db.session import engine
+
+
+def test_stream_unknown_session_is_a_http_404():
+    Base.metadata.create_all(engine)
+    client = TestClient(main.app)
+    response = client.post("/api/chat/message/stream/", params={"session_id": "nope"}, json={"sender": "user", "content": "hola", "message_type": "user"})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Chat session not found"}
+
+
+def test_stream_known_session_ends_with_done():
+    Base.metadata.create_all(engine)
+    agent.set_agent(agent.build_agent(
+        llm=RunnableLambda(lambda messages: AIMessage(content="Hola, soy el asistente")),
+        summarizer=RunnableLambda(lambda messages: AIMessage(content="resumen")),
+    ))
+    try:
+        client = TestClient(main.app)
+        session_id = client.post("/api/chat/session/").json()["session_id"]
+        response = client.post("/api/chat/message/stream/", params={"session_id": session_id}, json={"sender": "user", "content": "¿qué abono le sirve a la papa?", "message_type": "user"})
+    finally:
+        agent.set_agent(None)
+    assert response.status_code == 200
+    events = [line.removeprefix("event: ") for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events[-1] == "done"
@@ -0,0 +1,160 @@
+# tests/test_checkpointer.py
+
+import asyncio
+import time
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.agent.checkpointer import ZLIB_SUFFIX, SQLCheckpointSaver
+from app.db.base_class import Base
+from app.models.checkpoint import AgentCheckpoint, AgentCheckpointWrite
+
+# Canal de las escrituras de error (especial: la última reemplaza a la anterior)
+ERROR = "__error__"
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'checkpoints.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def checkpoint(payload="hola"):
+    cp = empty_checkpoint()
+    cp["id"] = str(uuid6())
+    cp["channel_values"] = {"messages": payload}
+    return cp
+
+
+def config(thread_id="t1", checkpoint_id=None):
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+def put(saver, thread_id="t1", payload="hola", parent=None, step=0):
+    return saver.put(config(thread_id, parent), checkpoint(payload), {"source": "loop", "step": step}, {})
+
+
+def count(sessions, model, thread_id="t1"):
+    with sessions() as db:
+        return db.execute(select(func.count()).select_from(model).where(model.thread_id == thread_id)).scalar()
+
+
+def test_put_and_get_tuple_from_memory_and_database(sessions):
+    saver = SQLCheckpointSaver(sessions)
+    first = put(saver)
+    second = put(saver, payload="adiós", parent=first["configurable"]["checkpoint_id"], step=1)
+
+    for _ in range(2):
+        found = saver.get_tuple(config())
+        assert found.config == second
+        assert found.checkpoint["channel_values"] == {"messages": "adiós"}
+        assert found.metadata["step"] == 1
+        assert found.parent_config["configurable"]["checkpoint_id"] == first["configurable"]["checkpoint_id"]
+        # La segunda vuelta lee de la base de datos
+        saver.invalidate("t1")
+
+    older = saver.get_tuple(first)
+    assert older.checkpoint["channel_values"] == {"messages": "hola"}
+    assert saver.get_tuple(config("otro")) is None
+
+
+def test_list_filters_and_pages(sessions):
+    saver = SQLCheckpointSaver(sessions, keep_per_thread=10)
+    ids = [put(saver, step=step)["configurable"]["checkpoint_id"] for step in range(3)]
+    put(saver, thread_id="t2")
+
+    listed = [t.config["configurable"]["checkpoint_id"] for t in saver.list(config())]
+    assert listed == ids[::-1]
+    assert [t.metadata["step"] for t in saver.list(config(), filter={"step": 1})] == [1]
+    assert [t.config["configurable"]["checkpoint_id"] for t in saver.list(config(), before=config("t1", ids[2]), limit=1)] == [ids[1]]
+    assert len(list(saver.list(None))) == 4
+
+
+def test_put_prunes_to_keep_per_thread(sessions):
+    saver = SQLCheckpointSaver(sessions, keep_per_thread=2)
+    saved = []
+    for step in range(4):
+        saved.append(put(saver, step=step))
+        saver.put_writes(saved[-1], [("messages", step)], task_id="task")
+
+    assert [t.config for t in saver.list(config())] == saved[:-3:-1]
+    assert count(sessions, AgentCheckpoint) == 2
+    assert count(sessions, AgentCheckpointWrite) == 2
+
+
+def test_put_writes_keeps_normal_writes_and_replaces_special_ones(sessions):
+    saver = SQLCheckpointSaver(sessions)
+    saved = put(saver)
+    saver.put_writes(saved, [("messages", "primera"), ("intake", {})], task_id="task")
+    saver.put_writes(saved, [("messages", "repetida")], task_id="task")
+    saver.put_writes(saved, [(ERROR, "falló")], task_id="task")
+    saver.put_writes(saved, [(ERROR, "falló otra vez")], task_id="task")
+
+    expected = [("task", "messages", "primera"), ("task", "intake", {}), ("task", ERROR, "falló otra vez")]
+    assert sorted(saver.get_tuple(saved).pending_writes, key=str) == sorted(expected, key=str)
+    saver.invalidate("t1")
+    assert sorted(saver.get_tuple(saved).pending_writes, key=str) == sorted(expected, key=str)
+
+
+def test_large_checkpoints_are_compressed(sessions):
+    saver = SQLCheckpointSaver(sessions)
+    payload = "lluvia " * 2000
+    put(saver, payload=payload)
+    with sessions() as db:
+        stored = db.execute(select(AgentCheckpoint)).scalar_one()
+    assert stored.type.endswith(ZLIB_SUFFIX)
+    assert len(stored.checkpoint) < len(payload)
+
+    saver.invalidate("t1")
+    assert saver.get_tuple(config()).checkpoint["channel_values"] == {"messages": payload}
+
+
+def test_idle_threads_leave_the_hot_tier(sessions):
+    saver = SQLCheckpointSaver(sessions, idle_ttl=0.05)
+    saved = put(saver)
+    assert saver._hot_entry("t1", "") is not None
+    time.sleep(0.1)
+    assert saver._hot_entry("t1", "") is None
+    # Sigue disponible en la base de datos y vuelve a la caché al leerse
+    assert saver.get_tuple(config()).config == saved
+    assert saver._hot_entry("t1", "") is not None
+
+
+def test_delete_thread(sessions):
+    saver = SQLCheckpointSaver(sessions)
+    saver.put_writes(put(saver), [("messages", "x")], task_id="task")
+    saver.delete_thread("t1")
+    assert saver.get_tuple(config()) is None
+    assert count(sessions, AgentCheckpoint) == count(sessions, AgentCheckpointWrite) == 0
+
+
+def test_async_variants(sessions):
+    saver = SQLCheckpointSaver(sessions, keep_per_thread=2)
+
+    async def scenario():
+        saved = []
+        for step in range(3):
+            saved.append(await saver.aput(config(), checkpoint("lluvia " * 500), {"source": "loop", "step": step}, {}))
+        await saver.aput_writes(saved[-1], [("messages", "hola")], task_id="task")
+        latest = await saver.aget_tuple(config())
+        saver.invalidate("t1")
+        from_db = await saver.aget_tuple(config())
+        listed = [t.config async for t in saver.alist(config())]
+        await saver.adelete_thread("t1")
+        return saved, latest, from_db, listed, await saver.aget_tuple(config())
+
+    saved, latest, from_db, listed, deleted = asyncio.run(scenario())
+    assert latest.config == from_db.config == saved[-1]
+    assert latest.pending_writes == from_db.pending_writes == [("task", "messages", "hola")]
+    assert from_db.checkpoint["channel_values"] == {"messages": "lluvia " * 500}
+    assert listed == saved[:-3:-1]
+    assert deleted is None
@@ -0,0 +1,97 @@
+# tests/test_coalescer.py
+
+import asyncio
+
+from app.services.coalescer import MessageCoalescer, merge_messages
+
+
+def text(body: str, message_id: str, sender: str = "573001112233") -> dict:
+    return {"from": sender, "id": message_id, "type": "text", "text": {"body": body}}
+
+
+def location(lat: float, lon: float, message_id: str, sender: str = "573001112233") -> dict:
+    return {"from": sender, "id": message_id, "type": "location", "location": {"latitude": lat, "longitude": lon}}
+
+
+def test_merge_single_message_is_unchanged():
+    message = text("hola", "m1")
+    assert merge_messages([message]) is message
+
+
+def test_merge_joins_texts_in_order_and_keeps_last_location():
+    merged = merge_messages([
+        text("hola", "m1"),
+        location(4.6, -74.0, "m2"),
+        text("quiero la predicción", "m3"),
+        location(6.2, -75.5, "m4"),
+    ])
+    assert merged["text"]["body"] == "hola\nquiero la predicción"
+    assert merged["location"] == {"latitude": 6.2, "longitude": -75.5}
+    assert merged["id"] == "m4"
+    assert merged["ids"] == ["m1", "m2", "m3", "m4"]
+
+
+def run_coalescer(coalescer: MessageCoalescer, steps):
+    """
+    Ejecuta `steps` (pares (espera, (clave, mensaje))) y retorna los grupos despachados.
+    """
+    dispatched = []
+
+    async def dispatch(message):
+        dispatched.append(message)
+
+    async def scenario():
+        for delay, (key, message) in steps:
+            await asyncio.sleep(delay)
+            coalescer.add(key, message, dispatch)
+        await coalescer.close()
+
+    asyncio.run(scenario())
+    return dispatched
+
+
+def test_burst_within_window_is_one_turn():
+    coalescer = MessageCoalescer(window=0.05, max_delay=1)
+    dispatched = run_coalescer(coalescer, [
+        (0, ("u1", text("hola", "m1"))),
+        (0.01, ("u1", text("tengo maíz", "m2"))),
+    ])
+    assert [m["text"]["body"] for m in dispatched] == ["hola\ntengo maíz"]
+
+
+def test_messages_after_the_window_are_separate_turns():
+    coalescer = MessageCoalescer(window=0.02, max_delay=1)
+    dispatched = run_coalescer(coalescer, [
+        (0, ("u1", text("hola", "m1"))),
+        (0.1, ("u1", text("gracias", "m2"))),
+    ])
+    assert [m["text"]["body"] for m in dispatched] == ["hola", "gracias"]
+
+
+def test_users_are_coalesced_independently():
+    coalescer = MessageCoalescer(window=0.05, max_delay=1)
+    dispatched = run_coalescer(coalescer, [
+        (0, ("u1", text("hola", "m1", sender="u1"))),
+        (0, ("u2", text("buenas", "m2", sender="u2"))),
+    ])
+    assert sorted(m["text"]["body"] for m in dispatched) == ["buenas", "hola"]
+
+
+def test_max_messages_flushes_immediately():
+    coalescer = MessageCoalescer(window=10, max_delay=10, max_messages=2)
+    dispatched = run_coalescer(coalescer, [
+        (0, ("u1", text("uno", "m1"))),
+        (0, ("u1", text("dos", "m2"))),
+        (0, ("u1", text("tres", "m3"))),
+    ])
+    # El tercero queda pendiente hasta `close`
+    assert [m["text"]["body"] for m in dispatched] == ["uno\ndos", "tres"]
+
+
+def test_zero_window_dispatches_each_message():
+    coalescer = MessageCoalescer(window=0)
+    dispatched = run_coalescer(coalescer, [
+        (0, ("u1", text("uno", "m1"))),
+        (0, ("u1", text("dos", "m2"))),
+    ])
+    assert [m["text"]["body"] for m in dispatched] == ["uno", "dos"]
@@ -0,0 +1,87 @@
+# tests/test_crop_scoring.py
+
+import time
+
+import pytest
+
+from app.agent.response_cache import normalize_text
+from app.services.crop_scoring import CropImpactEngine, CropTable, RISKS, forecast_matrix, parse_crops
+from app.services.forecast import Forecast, Stat
+
+ROWS = [
+    {"crop": "papa", "stage": "vegetativo", "t_min": 5, "t_opt_min": 12, "t_opt_max": 20, "t_max": 26,
+     "rain_min": 2, "rain_max": 35, "wind_max": 10, "rh_min": 60, "rh_max": 90},
+    {"crop": "papa", "stage": "floracion", "t_min": 7, "t_opt_min": 14, "t_opt_max": 20, "t_max": 25,
+     "rain_min": 3, "rain_max": 30, "wind_max": 9, "rh_min": 60, "rh_max": 88},
+    {"crop": "cacao", "stage": "general", "t_min": 18, "t_opt_min": 22, "t_opt_max": 30, "t_max": 33,
+     "rain_min": 3.5, "rain_max": 60, "wind_max": 7, "rh_min": 70, "rh_max": 95},
+]
+
+
+def forecast(t2m=(12, 20, 16), prectot=(2, 10, 5), ws10m=(1, 4, 2), rh2m=(70, 85, 78)) -> Forecast:
+    return Forecast("week", Stat(*t2m), Stat(*prectot), Stat(*ws10m), Stat(*rh2m), time.monotonic())
+
+
+@pytest.fixture
+def engine():
+    return CropImpactEngine(CropTable(ROWS))
+
+
+def by_crop(impacts):
+    return {impact.crop: impact for impact in impacts}
+
+
+def test_forecast_matrix_shape():
+    matrix = forecast_matrix([forecast(), forecast()])
+    assert matrix.shape == (2, 4, 3)
+    assert matrix[0, 0].tolist() == [12, 20, 16]
+
+
+def test_ideal_conditions_score_100_without_flags(engine):
+    papa = by_crop(engine.score(forecast(), crops=["papa"]))["papa"]
+    assert papa.score == 100
+    assert papa.flags == ()
+    assert papa.stage == "todas"
+
+
+def test_frost_and_heat_are_flagged_against_the_worst_stage(engine):
+    papa = by_crop(engine.score(forecast(t2m=(2, 20, 14)), crops=["papa"]))["papa"]
+    (flag,) = [f for f in papa.flags if f.risk == "frio"]
+    # La floración (t_min 7) es la etapa más sensible al frío
+    assert flag.limit == 7
+    assert flag.value == 2
+    assert flag.level == "alto"
+    assert papa.score < 100
+
+
+def test_stage_filter_uses_that_stage_and_general_rows(engine):
+    impacts = by_crop(engine.score(forecast(t2m=(6, 20, 14)), stage="vegetativo"))
+    assert impacts["papa"].stage == "vegetativo"
+    assert not [f for f in impacts["papa"].flags if f.risk == "frio"]
+    assert impacts["cacao"].stage == "general"
+
+
+def test_results_are_sorted_from_best_to_worst(engine):
+    impacts = engine.score(forecast())
+    assert [i.crop for i in impacts] == ["papa", "cacao"]
+    assert impacts[0].score >= impacts[1].score
+    assert {f.risk for f in impacts[1].flags} <= set(RISKS)
+
+
+def test_score_many_matches_score(engine):
+    forecasts = [forecast(), forecast(t2m=(2, 30, 16)), forecast(prectot=(0, 80, 40))]
+    assert engine.score_many(forecasts) == [engine.score(f) for f in forecasts]
+
+
+def test_unknown_crop_returns_no_impacts(engine):
+    assert engine.score(forecast(), crops=["lulo"]) == []
+
+
+def test_bundled_table_loads():
+    table = CropTable.from_csv()
+    assert "maíz" in table.names and "papa" in table.names
+
+
+def test_parse_crops_in_spanish_and_english():
+    assert parse_crops(normalize_text("Tengo maíz, papa y más maíz")) == ["maíz", "papa"]
+    assert parse_crops(normalize_text("I grow coffee and beans")) == ["café", "fríjol"]
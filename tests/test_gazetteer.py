@@ -0,0 +1,70 @@
+# tests/test_gazetteer.py
+
+import random
+
+import pytest
+
+from app.services.gazetteer import Gazetteer, Place, gazetteer, haversine_km
+
+PLACES = [
+    Place("Bogotá", "Bogotá D.C.", 4.7110, -74.0721),
+    Place("Chía", "Cundinamarca", 4.8619, -74.0586),
+    Place("Madrid", "Cundinamarca", 4.7325, -74.2642),
+    Place("Medellín", "Antioquia", 6.2442, -75.5812),
+    Place("Leticia", "Amazonas", -4.2153, -69.9406),
+]
+
+
+def brute_force(places, lat, lon):
+    return min(places, key=lambda p: haversine_km(lat, lon, p.latitude, p.longitude))
+
+
+def test_haversine_known_distance():
+    # Bogotá - Medellín: ~240 km en línea recta
+    assert haversine_km(4.7110, -74.0721, 6.2442, -75.5812) == pytest.approx(240, abs=5)
+
+
+def test_nearest_matches_brute_force_on_the_bundled_list():
+    rng = random.Random(7)
+    for _ in range(2000):
+        lat, lon = rng.uniform(-5, 14), rng.uniform(-82, -66)
+        place, distance = gazetteer.nearest(lat, lon)
+        expected = brute_force(gazetteer.places, lat, lon)
+        assert place == expected
+        assert distance == pytest.approx(haversine_km(lat, lon, expected.latitude, expected.longitude))
+
+
+@pytest.mark.parametrize("cell_degrees", [0.1, 0.5, 2.0])
+def test_nearest_is_exact_for_any_cell_size(cell_degrees):
+    index = Gazetteer(PLACES, cell_degrees=cell_degrees)
+    for lat, lon in [(4.86, -74.06), (4.70, -74.20), (0.0, -72.0), (12.0, -81.0)]:
+        assert index.nearest(lat, lon)[0] == brute_force(PLACES, lat, lon)
+
+
+def test_max_km_cutoff():
+    index = Gazetteer(PLACES)
+    assert index.nearest(4.86, -74.06, max_km=5)[0].name == "Chía"
+    assert index.nearest(3.0, -72.0, max_km=50) is None
+    assert Gazetteer([]).nearest(4.6, -74.0) is None
+
+
+def test_resolve_names_nearby_pins_and_leaves_far_ones_unnamed():
+    near = gazetteer.resolve(4.86, -74.06)
+    assert near.place.name == "Chía"
+    assert near.describe() == "Chía, Cundinamarca"
+    far = gazetteer.resolve(3.0, -72.0)
+    assert far.place is None and far.describe() == ""
+
+
+def test_find_by_name():
+    index = Gazetteer(PLACES)
+    assert index.find("bogota").name == "Bogotá"
+    assert index.find("CHÍA").department == "Cundinamarca"
+    assert index.find("Madrid, Cundinamarca").name == "Madrid"
+    assert index.find("Madrid, Antioquia") is None
+    assert index.find("no sé") is None
+
+
+def test_label_skips_repeated_department():
+    assert PLACES[0].label == "Bogotá D.C."
+    assert PLACES[1].label == "Chía, Cundinamarca"
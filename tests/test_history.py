@@ -0,0 +1,70 @@
+# tests/test_history.py
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.agent.history import HistoryManager, compact_tool_content
+
+
+def summarizer(text: str = "resumen"):
+    return RunnableLambda(lambda messages: AIMessage(content=text))
+
+
+def turn(n: int, words: int = 40) -> list:
+    return [
+        HumanMessage(content=f"pregunta {n} " + "palabra " * words, id=f"h{n}"),
+        AIMessage(content=f"respuesta {n} " + "palabra " * words, id=f"a{n}"),
+    ]
+
+
+def test_compact_tool_content_strips_markdown_and_truncates():
+    content = "Prediction for tomorrow:\n- **T2M**: 18.50°C 🌡️\n- **PRECTOT**: 3.20 mm ☔"
+    assert compact_tool_content(content, 200) == "Prediction for tomorrow:; T2M: 18.50°C; PRECTOT: 3.20 mm"
+    assert compact_tool_content(content, 20).endswith("…")
+    assert len(compact_tool_content(content, 20)) == 20
+
+
+def test_short_history_is_untouched():
+    manager = HistoryManager(summarizer(), token_budget=10_000)
+    assert manager({"messages": turn(1) + [HumanMessage(content="hola", id="h2")]}, {}) == {}
+
+
+def test_old_tool_results_are_compacted_but_not_the_current_turn():
+    manager = HistoryManager(summarizer(), token_budget=10_000, tool_result_chars=30)
+    long_result = "**T2M**: 18°C\n" * 20
+    messages = [
+        HumanMessage(content="predicción", id="h1"),
+        AIMessage(content="", tool_calls=[{"name": "t", "args": {}, "id": "c1"}], id="a1"),
+        ToolMessage(content=long_result, tool_call_id="c1", id="t1"),
+        HumanMessage(content="otra", id="h2"),
+        AIMessage(content="", tool_calls=[{"name": "t", "args": {}, "id": "c2"}], id="a2"),
+        ToolMessage(content=long_result, tool_call_id="c2", id="t2"),
+    ]
+    result = manager({"messages": messages}, {})
+    (updated,) = result["messages"]
+    assert updated.id == "t1"
+    assert len(updated.content) <= 30
+
+
+def test_over_budget_history_is_summarized_at_a_turn_boundary():
+    manager = HistoryManager(summarizer("cultiva papa"), token_budget=200)
+    messages = [m for n in range(6) for m in turn(n)] + [HumanMessage(content="¿y mañana?", id="h6")]
+    result = manager({"messages": messages}, {})
+
+    removed = [m.id for m in result["messages"] if isinstance(m, RemoveMessage)]
+    assert result["summary"] == "cultiva papa"
+    assert removed and removed == [m.id for m in messages[: len(removed)]]
+    # Lo que queda empieza en un mensaje del usuario e incluye el turno actual
+    assert messages[len(removed)].type == "human"
+    assert "h6" not in removed
+
+
+def test_summarizer_failure_keeps_an_excerpt():
+    def fail(messages):
+        raise RuntimeError("down")
+
+    manager = HistoryManager(RunnableLambda(fail), token_budget=200)
+    messages = [m for n in range(6) for m in turn(n)] + [HumanMessage(content="¿y mañana?", id="h6")]
+    result = manager({"messages": messages, "summary": "previo"}, {})
+    assert result["summary"].startswith("previo\n")
+    assert "pregunta 0" in result["summary"]
@@ -0,0 +1,113 @@
+# tests/test_intake.py
+
+from langchain_core.messages import HumanMessage
+from langgraph.constants import END
+
+from app.agent.intake import (
+    Intake,
+    detect_language,
+    is_greeting,
+    parse_free_crops,
+    parse_location,
+    parse_period,
+    parse_weather_city,
+    route_intake,
+)
+from app.agent.profile import PROFILE_KEY
+from app.agent.response_cache import normalize_text
+from app.schemas.chat import UserProfile
+
+
+def test_greetings_and_language():
+    assert is_greeting(normalize_text("¡Hola!"))
+    assert is_greeting(normalize_text("buenas tardes"))
+    assert not is_greeting(normalize_text("hola, quiero saber el clima de mañana en mi finca"))
+    assert detect_language(normalize_text("hello, what is the weather")) == "en"
+    assert detect_language(normalize_text("¿cómo estará el clima?")) == "es"
+
+
+def test_parse_period():
+    assert parse_period(normalize_text("para la próxima semana")) == "week"
+    assert parse_period(normalize_text("mañana")) == "tomorrow"
+    assert parse_period(normalize_text("los próximos 3 meses")) == "quarter"
+    assert parse_period(normalize_text("no sé")) is None
+
+
+def test_parse_free_crops():
+    assert parse_free_crops("lulo, gulupa y chontaduro") == ["lulo", "gulupa", "chontaduro"]
+
+
+def test_parse_location():
+    assert parse_location("4.60, -74.08") == (4.60, -74.08)
+    assert parse_location("Ubicación recibida: latitud 6,25, longitud -75,56") == (6.25, -75.56)
+    assert parse_location("tengo 3 hectáreas") is None
+    assert parse_location("95.1, 10.2") is None
+
+
+def test_parse_weather_city():
+    assert parse_weather_city("¿Cómo está el clima en Bogotá?") == "Bogotá"
+    assert parse_weather_city("weather in Medellín") == "Medellín"
+    assert parse_weather_city("el clima de la región cafetera") is None
+
+
+def run(intake: Intake, text: str, step_state: dict = None, profile: UserProfile = None):
+    config = {"configurable": {PROFILE_KEY: profile}} if profile else {"configurable": {}}
+    return intake({"messages": [HumanMessage(content=text)], "intake": step_state or {}}, config)
+
+
+def test_greeting_replies_with_the_menu():
+    result = run(Intake(), "hola")
+    assert result["intake"]["step"] == "menu"
+    assert result["messages"].response_metadata["intake"] == "menu"
+    assert route_intake({"messages": [result["messages"]]}) == END
+
+
+def test_weather_city_accepts_only_known_municipalities():
+    intake = Intake()
+    state = {"step": "weather_city", "lang": "es"}
+    result = run(intake, "Chía", state)
+    (call,) = result["messages"].tool_calls
+    assert call["name"] == "get_weather"
+    assert round(call["args"]["lat"], 2) == 4.86
+    for answer in ("no sé", "gracias"):
+        assert run(intake, answer, state) == {"intake": {}}
+
+
+def test_prediction_asks_only_what_the_profile_lacks():
+    intake = Intake()
+    profile = UserProfile(crops=["papa"], latitude=4.6, longitude=-74.1)
+    result = run(intake, "quiero una predicción", {"step": "menu", "lang": "es"}, profile)
+    assert result["intake"]["step"] == "period"
+
+    result = run(intake, "2", result["intake"], profile)
+    calls = result["messages"].tool_calls
+    assert [c["name"] for c in calls] == ["get_agriculture_predictions", "score_crop_impact"]
+    assert calls[0]["args"] == {"period": "week", "lat": 4.6, "lon": -74.1, "crops": ["papa"]}
+    assert route_intake({"messages": [result["messages"]]}) == "tools"
+
+
+def test_unclear_answer_retries_then_hands_off_to_the_model():
+    intake = Intake(max_retries=1)
+    result = run(intake, "mmm", {"step": "period", "lang": "es", "crops": ["papa"]})
+    assert result["intake"]["retries"] == 1
+    assert run(intake, "mmm", result["intake"]) == {"intake": {}}
+
+
+def test_questions_go_to_the_model():
+    result = run(Intake(), "¿qué abono le sirve a la papa?", {"step": "menu", "lang": "es"})
+    assert result == {"intake": {}}
+    assert route_intake({"messages": [HumanMessage(content="x")], "intake": {}}) == "agent"
+
+
+def test_crop_mentions_do_not_start_the_prediction_flow():
+    assert run(Intake(), "cuéntame algo sobre el café", {"step": "menu", "lang": "es"}) == {"intake": {}}
+    assert run(Intake(), "cuéntame algo sobre el café") == {"intake": {}}
+
+
+def test_questions_mid_flow_go_to_the_model():
+    intake = Intake()
+    state = {"step": "period", "lang": "es", "crops": ["papa"]}
+    assert run(intake, "y del maíz qué opinas ahora?", state) == {"intake": {}}
+    # Un cultivo fuera del paso de cultivos no se toma como respuesta
+    assert run(intake, "y del maíz", state) == {"intake": {}}
+    assert run(intake, "la próxima semana", state)["intake"]["crops"] == ["papa"]
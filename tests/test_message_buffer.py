@@ -0,0 +1,36 @@
+# tests/test_message_buffer.py
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.dao.chat import MessageWriteBuffer
+from app.db.base_class import Base
+from app.models.chat import ChatMessage, ChatSession
+from app.utils.metrics import CHAT_MESSAGES_DROPPED
+
+
+def message(session_id, content):
+    return ChatMessage(session_id=session_id, sender="user", content=content, message_type="user")
+
+
+def test_flush_drops_only_the_invalid_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'buffer.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(ChatSession(session_id="s1", user_id="573001", channel="whatsapp"))
+        db.commit()
+
+    buffer = MessageWriteBuffer(sessions, batch_size=100, flush_interval=60)
+    good, bad, other = message("s1", "hola"), message(None, "sin sesión"), message("s1", "clima")
+    for item in (good, bad, other):
+        buffer.add(item)
+    dropped = CHAT_MESSAGES_DROPPED._value.get()
+
+    assert buffer.flush() == 2
+    buffer.close()
+    assert good.id is not None and other.id is not None and bad.id is None
+    assert CHAT_MESSAGES_DROPPED._value.get() == dropped + 1
+    with sessions() as db:
+        assert db.execute(select(ChatMessage.content).order_by(ChatMessage.id)).scalars().all() == ["hola", "clima"]
+    engine.dispose()
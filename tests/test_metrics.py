@@ -0,0 +1,30 @@
+# tests/test_metrics.py
+
+import uuid
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk, LLMResult
+
+from app.utils.metrics import LLM_TOKENS, TokenUsageCallback
+
+
+def tokens(model: str, kind: str) -> float:
+    return LLM_TOKENS.labels(model, kind)._value.get()
+
+
+def test_token_usage_from_a_streamed_response():
+    callback = TokenUsageCallback("modelo-por-defecto")
+    run_id = uuid.uuid4()
+    # Mensaje agregado de un stream con stream_usage: sin llm_output, el uso viene en el último chunk
+    message = AIMessageChunk(content="Hola") + AIMessageChunk(
+        content="",
+        usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15},
+        response_metadata={"model_name": "gpt-stream"},
+    )
+    before = tokens("gpt-stream", "prompt"), tokens("gpt-stream", "completion")
+
+    callback.on_chat_model_start({}, [], run_id=run_id)
+    callback.on_llm_end(LLMResult(generations=[[ChatGenerationChunk(message=message)]]), run_id=run_id)
+
+    assert tokens("gpt-stream", "prompt") == before[0] + 12
+    assert tokens("gpt-stream", "completion") == before[1] + 3
@@ -0,0 +1,70 @@
+# tests/test_migrations.py
+
+import asyncio
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.dao.chat import ChatDAO, session_cache
+from app.db.base_class import Base
+from app.db.migrations import SESSION_INDEX, has_session_unique_index, upgrade_schema
+from app.models.chat import ChatMessage, ChatSession, UserProfile
+
+
+def old_schema(path) -> str:
+    """Base como la creaba la versión anterior: sin el índice único (user_id, channel)."""
+    url = f"sqlite:///{path / 'old.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        SESSION_INDEX.drop(connection)
+    engine.dispose()
+    return url
+
+
+def test_upgrade_merges_duplicate_sessions_and_creates_the_index(tmp_path):
+    engine = create_engine(old_schema(tmp_path))
+    with engine.begin() as connection:
+        connection.execute(ChatSession.__table__.insert(), [
+            {"session_id": "a", "user_id": "573001", "channel": "whatsapp"},
+            {"session_id": "b", "user_id": "573001", "channel": "whatsapp"},
+            {"session_id": "c", "user_id": "573001", "channel": "web"},
+        ])
+        connection.execute(ChatMessage.__table__.insert(), [
+            {"session_id": "a", "sender": "user", "content": "hola", "message_type": "user"},
+            {"session_id": "b", "sender": "user", "content": "clima", "message_type": "user"},
+        ])
+        connection.execute(UserProfile.__table__.insert(), [{"session_id": "b", "crops": "papa"}])
+        assert not has_session_unique_index(connection)
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)  # Idempotente
+
+    with engine.connect() as connection:
+        assert has_session_unique_index(connection)
+        assert connection.execute(select(ChatSession.session_id).order_by(ChatSession.session_id)).scalars().all() == ["a", "c"]
+        assert connection.execute(select(func.count()).where(ChatMessage.session_id == "a")).scalar() == 2
+        assert connection.execute(select(UserProfile.session_id, UserProfile.crops)).all() == [("a", "papa")]
+    engine.dispose()
+
+
+def test_get_or_create_session_without_the_index_falls_back_to_select_then_insert(tmp_path):
+    url = old_schema(tmp_path).replace("sqlite://", "sqlite+aiosqlite://")
+
+    async def scenario():
+        engine = create_async_engine(url)
+        sessions = async_sessionmaker(engine)
+        async with sessions() as db:
+            first = await ChatDAO.aget_or_create_session(db, "573002", "whatsapp")
+            session_cache.clear()
+            assert await ChatDAO.aget_or_create_session(db, "573002", "whatsapp") == first
+            count = (await db.execute(select(func.count()).select_from(ChatSession))).scalar()
+        await engine.dispose()
+        return count
+
+    ChatDAO._session_index = None
+    try:
+        assert asyncio.run(scenario()) == 1
+        assert ChatDAO._session_index is False
+    finally:
+        ChatDAO._session_index = None
@@ -0,0 +1,48 @@
+# tests/test_response_cache.py
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agent.response_cache import ResponseCache, normalize_text
+
+
+def test_normalize_text():
+    assert normalize_text("¡Hola!  ") == normalize_text("hola") == "hola"
+    assert normalize_text("Menú") == "menu"
+
+
+def test_key_depends_on_text_history_and_context():
+    cache = ResponseCache()
+    history = {"messages": [HumanMessage(content="hola"), AIMessage(content="¡Hola! ¿Qué necesitas?")]}
+    assert cache.key_for("¡Hola!", None) == cache.key_for("hola", {})
+    assert cache.key_for("hola", None) != cache.key_for("hola", history)
+    assert cache.key_for("hola", None, "papa") != cache.key_for("hola", None, "")
+
+
+def test_long_summarized_or_empty_turns_are_not_cached():
+    cache = ResponseCache(max_messages=2, max_input_chars=20)
+    assert cache.key_for("", None) is None
+    assert cache.key_for("x" * 21, None) is None
+    assert cache.key_for("hola", {"messages": [HumanMessage(content="a")] * 3}) is None
+    assert cache.key_for("hola", {"summary": "resumen"}) is None
+    assert cache.stats()["bypassed"] == 4
+
+
+def test_stores_only_direct_model_replies():
+    cache = ResponseCache()
+    key = cache.key_for("hola", None)
+    human = HumanMessage(content="hola")
+
+    cache.store(key, [human, AIMessage(content="", tool_calls=[{"name": "get_weather", "args": {}, "id": "1"}])])
+    cache.store(key, [human, AIMessage(content="respaldo", response_metadata={"degraded": True})])
+    cache.store(key, [human, AIMessage(content="menú", response_metadata={"intake": "menu"})])
+    assert cache.get(key) is None
+
+    cache.store(key, [human, AIMessage(content="¡Hola!")])
+    assert cache.get(key) == "¡Hola!"
+    assert cache.stats()["stored"] == 1
+
+
+def test_disabled_cache():
+    cache = ResponseCache(maxsize=0)
+    assert cache.key_for("hola", None) is None
+    assert cache.get(None) is None
@@ -0,0 +1,94 @@
+# tests/test_scheduler.py
+
+import asyncio
+
+from app.services.scheduler import SessionScheduler
+
+
+def test_jobs_of_a_session_run_one_at_a_time_in_order():
+    events = []
+
+    async def scenario():
+        scheduler = SessionScheduler(workers=4, max_queue=10)
+
+        def job(n):
+            async def run():
+                events.append(("start", n))
+                await asyncio.sleep(0.01)
+                events.append(("end", n))
+            return run
+
+        for n in range(3):
+            assert scheduler.submit("s1", job(n))
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert events == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+
+
+def test_sessions_run_in_parallel_up_to_workers():
+    running = 0
+    peak = 0
+
+    async def scenario():
+        scheduler = SessionScheduler(workers=2, max_queue=10)
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        for session in ("s1", "s2", "s3", "s4"):
+            scheduler.submit(session, job)
+        await scheduler.stop()
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats["processed"] == 4
+
+
+def test_full_queue_rejects_new_jobs():
+    async def scenario():
+        scheduler = SessionScheduler(workers=1, max_queue=2)
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        accepted = [scheduler.submit(f"s{n}", job) for n in range(3)]
+        saturated = scheduler.is_saturated()
+        release.set()
+        await scheduler.stop()
+        return accepted, saturated, scheduler.stats()
+
+    accepted, saturated, stats = asyncio.run(scenario())
+    assert accepted == [True, True, False]
+    assert saturated
+    assert stats["rejected"] == 1
+    assert stats["processed"] == 2
+
+
+def test_failed_job_does_not_block_the_session():
+    done = []
+
+    async def scenario():
+        scheduler = SessionScheduler(workers=1, max_queue=10)
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        async def ok():
+            done.append("ok")
+
+        scheduler.submit("s1", failing)
+        scheduler.submit("s1", ok)
+        await scheduler.stop()
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert done == ["ok"]
+    assert stats["failed"] == 1
+    assert stats["sessions"] == 0
@@ -0,0 +1,53 @@
+# tests/test_tool_executor.py
+
+import threading
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+
+from app.agent.deadline import remaining_seconds
+from app.agent.tool_executor import ParallelToolNode
+
+
+def make_tool(name: str, release: threading.Event, seen: list):
+    def _tool(config: RunnableConfig) -> str:
+        """Herramienta de prueba."""
+        seen.append(remaining_seconds(config))
+        release.wait(2)
+        return "listo"
+
+    return StructuredTool.from_function(func=_tool, name=name)
+
+
+def state(*names):
+    calls = [{"name": name, "args": {}, "id": f"c{i}", "type": "tool_call"} for i, name in enumerate(names)]
+    return {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+
+def test_sync_timeout_returns_early_and_tracks_the_abandoned_thread():
+    release, seen = threading.Event(), []
+    node = ParallelToolNode(
+        [make_tool("lenta", release, seen)], default_timeout=5, timeouts={"lenta": 0.1}, max_workers=2
+    )
+    started = time.perf_counter()
+    (message,) = node(state("lenta"), {"configurable": {}})["messages"]
+    assert time.perf_counter() - started < 1
+    assert message.status == "error" and '"timeout"' in message.content
+    # La herramienta recibió su propio límite para sus peticiones HTTP
+    assert seen and seen[0] <= 0.1
+    assert node.abandoned == 1
+
+    release.set()
+    for _ in range(100):
+        if node.abandoned == 0:
+            break
+        time.sleep(0.01)
+    assert node.abandoned == 0
+
+
+def test_unknown_tool_gets_a_structured_error():
+    node = ParallelToolNode([], default_timeout=1)
+    (message,) = node(state("nada"), {"configurable": {}})["messages"]
+    assert message.status == "error" and "unknown_tool" in message.content
@@ -0,0 +1,78 @@
+# tests/test_whatsapp_sender.py
+
+import asyncio
+import time
+
+import httpx
+
+from app.services.whatsapp_sender import SenderStopped, TokenBucket, WhatsAppSender
+
+
+def test_token_bucket_allows_a_burst_then_limits_the_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(5):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(scenario())
+    assert burst < 0.05
+    # 5 envíos más a 50/s: al menos ~0.1 s
+    assert total >= 0.08
+
+
+def test_stop_fails_in_flight_and_queued_sends():
+    async def scenario():
+        sender = WhatsAppSender("0", "token", workers=1)
+        await sender.start()
+
+        async def never_returns(payload):
+            await asyncio.sleep(60)
+
+        sender._post = never_returns
+        in_flight = asyncio.create_task(sender.send({"n": 1}))
+        queued = asyncio.create_task(sender.send({"n": 2}))
+        await asyncio.sleep(0.01)
+        await sender.stop(timeout=0.01)
+        return await asyncio.gather(in_flight, queued, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, SenderStopped) for result in results)
+
+
+def post_with_responses(*responses, max_retry_after: float = 30):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses[len(requests) - 1]
+
+    async def scenario():
+        sender = WhatsAppSender("0", "token", max_retries=3, max_retry_after=max_retry_after)
+        sender._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await sender._post({"n": 1})
+        finally:
+            await sender._client.aclose()
+
+    return asyncio.run(scenario()), len(requests)
+
+
+def test_retry_after_within_the_limit_is_honored():
+    result, attempts = post_with_responses(
+        httpx.Response(429, headers={"Retry-After": "0.05"}), httpx.Response(200, json={})
+    )
+    assert result == {"status": "success"}
+    assert attempts == 2
+
+
+def test_retry_after_above_the_limit_fails_the_message():
+    started = time.monotonic()
+    result, attempts = post_with_responses(httpx.Response(429, headers={"Retry-After": "3600"}), max_retry_after=5)
+    assert result["status"] == "error" and "3600" in result["message"]
+    assert attempts == 1
+    assert time.monotonic() - started < 1